@@ -1,5 +1,10 @@
 from django.contrib import admin
-from .models import PerfilUsuario, Monitor, Clase, Reserva, Pago
+from django.contrib.auth.models import User
+from .models import (
+    PerfilUsuario, Monitor, Clase, Reserva, Pago, SesionClase, ListaEspera, ReservaArchivada, EjecucionTarea,
+    ResumenDiarioPagos, Ejercicio
+)
+from .cuotas_service import CuotaService
 
 
 # ===============================
@@ -7,10 +12,11 @@ from .models import PerfilUsuario, Monitor, Clase, Reserva, Pago
 # ===============================
 @admin.register(PerfilUsuario)
 class PerfilUsuarioAdmin(admin.ModelAdmin):
-    list_display = ['user', 'rol', 'telefono', 'activo', 'fecha_registro']
-    list_filter = ['rol', 'activo', 'fecha_registro']
+    list_display = ['user', 'rol', 'telefono', 'activo', 'tiene_pagos_vencidos', 'fecha_registro']
+    list_filter = ['rol', 'activo', 'tiene_pagos_vencidos', 'fecha_registro']
     search_fields = ['user__username', 'user__first_name', 'user__last_name', 'dni', 'telefono']
-    readonly_fields = ['fecha_registro']
+    readonly_fields = ['fecha_registro', 'tiene_pagos_vencidos']
+    actions = ['emitir_cuota_mensual']
 
     fieldsets = (
         ('Usuario', {
@@ -20,10 +26,21 @@ class PerfilUsuarioAdmin(admin.ModelAdmin):
             'fields': ('dni', 'telefono', 'fecha_nacimiento', 'direccion', 'foto')
         }),
         ('Información del Sistema', {
-            'fields': ('fecha_registro',)
+            'fields': ('fecha_registro', 'tiene_pagos_vencidos')
         }),
     )
 
+    @admin.action(description='Emitir la cuota mensual de este mes a los socios seleccionados')
+    def emitir_cuota_mensual(self, request, queryset):
+        socios = User.objects.filter(perfil__in=queryset.filter(rol='socio', activo=True))
+        resultado = CuotaService.emitir(
+            'mensual', CuotaService.importe_por_defecto(), socios=socios, registrado_por=request.user
+        )
+        self.message_user(
+            request,
+            f'Cuota {resultado.periodo}: {resultado.emitidas} emitidas, {resultado.omitidas} ya estaban emitidas.'
+        )
+
 
 # ===============================
 # MONITOR
@@ -79,11 +96,11 @@ class ReservaAdmin(admin.ModelAdmin):
     list_display = ['socio', 'clase', 'fecha', 'asistio', 'cancelada', 'fecha_reserva']
     list_filter = ['asistio', 'cancelada', 'fecha', 'clase']
     search_fields = ['socio__username', 'socio__first_name', 'socio__last_name', 'clase__nombre']
-    readonly_fields = ['fecha_reserva', 'fecha_cancelacion']
+    readonly_fields = ['fecha_reserva', 'fecha_cancelacion', 'sesion']
 
     fieldsets = (
         ('Información de la Reserva', {
-            'fields': ('socio', 'clase', 'fecha')
+            'fields': ('socio', 'clase', 'fecha', 'sesion')
         }),
         ('Estado', {
             'fields': ('asistio', 'cancelada', 'fecha_cancelacion')
@@ -93,6 +110,52 @@ class ReservaAdmin(admin.ModelAdmin):
         }),
     )
 
+    def save_model(self, request, obj, form, change):
+        sesion_anterior = obj.sesion if change else None
+        if {'clase', 'fecha'} & set(form.changed_data):
+            obj.sesion = SesionClase.obtener(obj.clase, obj.fecha)
+        super().save_model(request, obj, form, change)
+        # Desde el admin se puede cambiar cualquier campo: recontar las sesiones
+        obj.sesion.recalcular()
+        if sesion_anterior and sesion_anterior.pk != obj.sesion_id:
+            sesion_anterior.recalcular()
+
+
+# ===============================
+# SESIONES DE CLASE
+# ===============================
+@admin.register(SesionClase)
+class SesionClaseAdmin(admin.ModelAdmin):
+    list_display = ['clase', 'fecha', 'hora_inicio', 'reservas_activas', 'reservadas', 'canceladas', 'asistencias',
+                    'capacidad', 'activa']
+    list_filter = ['activa', 'fecha', 'clase']
+    readonly_fields = ['clase', 'fecha', 'reservas_activas', 'reservadas', 'canceladas', 'asistencias']
+
+
+# ===============================
+# LISTA DE ESPERA
+# ===============================
+@admin.register(ListaEspera)
+class ListaEsperaAdmin(admin.ModelAdmin):
+    list_display = ['socio', 'sesion', 'posicion', 'fecha_alta']
+    list_filter = ['sesion__fecha', 'sesion__clase']
+    search_fields = ['socio__username', 'socio__first_name', 'socio__last_name', 'sesion__clase__nombre']
+    readonly_fields = ['fecha_alta']
+
+
+# ===============================
+# RESERVA ARCHIVADA
+# ===============================
+@admin.register(ReservaArchivada)
+class ReservaArchivadaAdmin(admin.ModelAdmin):
+    list_display = ['socio', 'clase', 'fecha', 'asistio', 'cancelada']
+    list_filter = ['asistio', 'cancelada', 'fecha']
+    search_fields = ['socio__username', 'socio__first_name', 'socio__last_name', 'clase__nombre']
+    readonly_fields = ['reserva_id', 'socio', 'clase', 'fecha', 'fecha_reserva', 'asistio', 'cancelada']
+
+    def has_add_permission(self, request):
+        return False
+
 
 # ===============================
 # PAGO
@@ -123,4 +186,51 @@ class PagoAdmin(admin.ModelAdmin):
     def save_model(self, request, obj, form, change):
         if not obj.pk:
             obj.registrado_por = request.user
-        super().save_model(request, obj, form, change)
\ No newline at end of file
+        super().save_model(request, obj, form, change)
+
+
+# ===============================
+# RESUMEN DIARIO DE PAGOS
+# ===============================
+@admin.register(ResumenDiarioPagos)
+class ResumenDiarioPagosAdmin(admin.ModelAdmin):
+    list_display = ['fecha', 'tipo_pago', 'metodo_pago', 'estado', 'pagos', 'importe']
+    list_filter = ['estado', 'tipo_pago', 'metodo_pago']
+    date_hierarchy = 'fecha'
+
+    # Lo mantiene Pago: aquí solo se consulta
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+# ===============================
+# TAREAS PROGRAMADAS
+# ===============================
+@admin.register(EjecucionTarea)
+class EjecucionTareaAdmin(admin.ModelAdmin):
+    list_display = ['nombre', 'inicio', 'duracion_ms', 'filas_afectadas']
+    list_filter = ['nombre', 'inicio']
+    readonly_fields = ['nombre', 'inicio', 'duracion_ms', 'filas_afectadas', 'detalle']
+
+    def has_add_permission(self, request):
+        return False
+
+
+# ===============================
+# CATÁLOGO DE EJERCICIOS
+# ===============================
+@admin.register(Ejercicio)
+class EjercicioAdmin(admin.ModelAdmin):
+    list_display = ['id', 'nombre', 'categoria', 'imagen_respaldo', 'sincronizado']
+    list_filter = ['categoria', 'imagen_respaldo', 'musculos', 'equipamiento']
+    search_fields = ['nombre']
+
+    # Lo rellena manage.py sync_wger: aquí solo se consulta
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
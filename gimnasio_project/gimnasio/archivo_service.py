@@ -0,0 +1,71 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import Reserva, ReservaArchivada, SesionClase
+from .signals import sin_descontar_reservas
+
+
+class ArchivoService:
+    """
+    Mueve las reservas antiguas a ReservaArchivada para que la tabla Reserva
+    (y sus índices) solo contenga el histórico reciente, y ofrece los agregados
+    del archivo para los informes que lo piden.
+    """
+    DIAS_CONSERVADOS = 180
+    TAMANO_LOTE = 1000
+
+    @classmethod
+    def fecha_corte(cls, dias=DIAS_CONSERVADOS):
+        return timezone.now().date() - timedelta(days=dias)
+
+    @classmethod
+    def archivar(cls, antes_de, lote=TAMANO_LOTE):
+        """
+        Archiva las reservas con fecha anterior a `antes_de` en lotes de
+        `lote` filas, cada uno en su propia transacción corta. Devuelve el
+        total de reservas archivadas.
+        """
+        total = 0
+        while True:
+            with transaction.atomic():
+                reservas = list(Reserva.objects.filter(fecha__lt=antes_de).order_by('id')[:lote])
+                if not reservas:
+                    return total
+
+                ReservaArchivada.objects.bulk_create([
+                    ReservaArchivada(
+                        reserva_id=reserva.id,
+                        socio_id=reserva.socio_id,
+                        clase_id=reserva.clase_id,
+                        fecha=reserva.fecha,
+                        fecha_reserva=reserva.fecha_reserva,
+                        asistio=reserva.asistio,
+                        cancelada=reserva.cancelada,
+                    )
+                    for reserva in reservas
+                ], ignore_conflicts=True)
+
+                # Se libera la ocupación con una UPDATE por sesión (y no fila a fila en la signal
+                # post_delete); los contadores de asistencia de la sesión se conservan para los informes
+                activas = Counter(r.sesion_id for r in reservas if not r.cancelada and r.sesion_id)
+                for sesion_id, cantidad in activas.items():
+                    SesionClase.objects.filter(pk=sesion_id).update(
+                        reservas_activas=F('reservas_activas') - cantidad
+                    )
+                with sin_descontar_reservas():
+                    Reserva.objects.filter(pk__in=[r.id for r in reservas]).delete()
+
+            total += len(reservas)
+
+    # ===== AGREGADOS PARA INFORMES =====
+    @staticmethod
+    def resumen_socio(socio):
+        """Reservas y asistencias archivadas del socio"""
+        return ReservaArchivada.objects.filter(socio=socio).aggregate(
+            total=Count('id'),
+            asistidas=Count('id', filter=Q(asistio=True))
+        )
@@ -0,0 +1,174 @@
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from dataclasses import dataclass, field
+from functools import reduce
+from itertools import islice
+from operator import or_
+
+from .models import Ejercicio, IndiceEjercicios
+
+# Mismos nombres que los parámetros y los campos del JSON de RutinasAPI
+FACETAS = ('category', 'muscle', 'equipment')
+SIN_VALOR = {'category': 'General', 'muscle': 'No especificado', 'equipment': 'Sin equipo'}
+
+
+@dataclass
+class ResultadoBusqueda:
+    ids: list = field(default_factory=list)  # los de la página, en orden
+    total: int = 0
+    siguiente: int = None  # cursor (id del primer ejercicio de la página siguiente)
+    facetas: dict = field(default_factory=dict)
+
+
+def palabras(texto):
+    """Palabras en minúsculas y sin tildes: 'Curl de bíceps' -> ['curl', 'de', 'biceps']"""
+    texto = unicodedata.normalize('NFKD', texto or '').encode('ascii', 'ignore').decode().lower()
+    return re.findall(r'[a-z0-9]+', texto)
+
+
+def _mapa(posiciones):
+    """Posiciones -> entero con esos bits a 1"""
+    mapa = 0
+    for posicion in posiciones:
+        mapa |= 1 << posicion
+    return mapa
+
+
+def _posiciones(mapa, desde=0):
+    """Posiciones de los bits a 1 de `mapa`, de menor a mayor, empezando en `desde`"""
+    mapa = mapa >> desde << desde
+    while mapa:
+        bit = mapa & -mapa
+        yield bit.bit_length() - 1
+        mapa ^= bit
+
+
+class BuscadorEjercicios:
+    """
+    Filtros, búsqueda y paginación del catálogo para RutinasAPI.
+
+    construir() guarda en IndiceEjercicios, al sincronizar, los índices
+    invertidos: valor de faceta (o palabra del nombre) -> ids ordenados. Cada
+    proceso los carga una vez y los pasa a mapas de bits (un int por valor,
+    un bit por ejercicio en orden de id): filtrar es un AND/OR de enteros y
+    los contadores de las facetas son bit_count(). Si el índice se regenera,
+    los procesos lo notan por la fecha de generación.
+    """
+    POR_PAGINA = 24
+    MAXIMO_POR_PAGINA = 100
+
+    _cargado = None  # (generado, índice en memoria)
+    _cerrojo = threading.Lock()
+
+    @classmethod
+    def construir(cls):
+        """Recalcula los índices desde las tablas del catálogo; solo escribe si han cambiado"""
+        orden = []
+        facetas = {faceta: defaultdict(list) for faceta in FACETAS}
+        nombres = {faceta: {'0': sin_valor} for faceta, sin_valor in SIN_VALOR.items()}
+        terminos = defaultdict(list)
+        ejercicios = Ejercicio.objects.select_related('categoria').prefetch_related('musculos', 'equipamiento')
+        for ejercicio in ejercicios.order_by('id'):
+            orden.append(ejercicio.id)
+            valores = {
+                'category': [ejercicio.categoria] if ejercicio.categoria else [],
+                'muscle': list(ejercicio.musculos.all()),
+                'equipment': list(ejercicio.equipamiento.all()),
+            }
+            for faceta, objetos in valores.items():
+                for objeto in objetos:
+                    nombres[faceta][str(objeto.pk)] = objeto.nombre
+                    facetas[faceta][str(objeto.pk)].append(ejercicio.id)
+                if not objetos:
+                    facetas[faceta]['0'].append(ejercicio.id)
+            for palabra in dict.fromkeys(palabras(ejercicio.nombre)):
+                terminos[palabra].append(ejercicio.id)
+
+        datos = {
+            'orden': orden,
+            'facetas': {faceta: dict(valores) for faceta, valores in facetas.items()},
+            'nombres': nombres,
+            'palabras': dict(terminos),
+        }
+        guardado = IndiceEjercicios.objects.filter(pk=1).values_list('datos', flat=True).first()
+        if guardado != datos:
+            IndiceEjercicios.objects.update_or_create(pk=1, defaults={'datos': datos})
+
+    @classmethod
+    def indice(cls):
+        generado = IndiceEjercicios.objects.filter(pk=1).values_list('generado', flat=True).first()
+        if generado is None:
+            # Catálogo sincronizado antes de que existiera el índice
+            cls.construir()
+            generado = IndiceEjercicios.objects.filter(pk=1).values_list('generado', flat=True).first()
+        with cls._cerrojo:
+            if cls._cargado and cls._cargado[0] == generado:
+                return cls._cargado[1]
+
+        datos = IndiceEjercicios.objects.get(pk=1).datos
+        posicion = {ejercicio_id: i for i, ejercicio_id in enumerate(datos['orden'])}
+        indice = {
+            'orden': datos['orden'],
+            'todos': (1 << len(datos['orden'])) - 1,
+            'nombres': datos['nombres'],
+            'facetas': {
+                faceta: {clave: _mapa(posicion[i] for i in ids) for clave, ids in valores.items()}
+                for faceta, valores in datos['facetas'].items()
+            },
+            'palabras': {palabra: _mapa(posicion[i] for i in ids) for palabra, ids in datos['palabras'].items()},
+        }
+        with cls._cerrojo:
+            cls._cargado = (generado, indice)
+        return indice
+
+    @classmethod
+    def buscar(cls, filtros=None, texto='', pagina=1, cursor=None, limite=POR_PAGINA):
+        """
+        `filtros` es {faceta: [claves]}: los valores de una faceta se suman (OR)
+        y las facetas se cruzan (AND). `texto` busca por prefijo cada palabra en
+        el nombre. Se pagina por número de página o, si llega, por `cursor`.
+        """
+        indice = cls.indice()
+        filtros = {faceta: set(claves) for faceta, claves in (filtros or {}).items() if claves}
+
+        base = indice['todos']
+        for termino in palabras(texto):
+            base &= reduce(or_, (
+                mapa for palabra, mapa in indice['palabras'].items() if palabra.startswith(termino)
+            ), 0)
+        por_faceta = {
+            faceta: reduce(or_, (indice['facetas'][faceta].get(clave, 0) for clave in claves), 0)
+            for faceta, claves in filtros.items()
+        }
+        seleccion = reduce(lambda mapa, otro: mapa & otro, por_faceta.values(), base)
+
+        # Cada faceta se cuenta con los demás filtros pero no con el suyo, para
+        # que se vea cuántos ejercicios añadiría marcar otro valor
+        resultado = ResultadoBusqueda(total=seleccion.bit_count())
+        for faceta in FACETAS:
+            resto = reduce(lambda mapa, otro: mapa & otro,
+                           (mapa for otra, mapa in por_faceta.items() if otra != faceta), base)
+            marcados = filtros.get(faceta, set())
+            valores = [
+                {'id': clave, 'name': indice['nombres'][faceta][clave], 'count': (mapa & resto).bit_count(),
+                 'selected': clave in marcados}
+                for clave, mapa in indice['facetas'][faceta].items()
+            ]
+            resultado.facetas[faceta] = sorted(
+                (valor for valor in valores if valor['count'] or valor['selected']),
+                key=lambda valor: (-valor['count'], valor['name']),
+            )
+
+        orden = indice['orden']
+        if cursor is not None:
+            posiciones = islice(_posiciones(seleccion, bisect_left(orden, cursor)), limite + 1)
+        else:
+            saltar = (pagina - 1) * limite
+            posiciones = islice(_posiciones(seleccion), saltar, saltar + limite + 1)
+        ids = [orden[posicion] for posicion in posiciones]
+        resultado.ids = ids[:limite]
+        resultado.siguiente = ids[limite] if len(ids) > limite else None
+        return resultado
@@ -0,0 +1,297 @@
+import csv
+import io
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from functools import partial
+from itertools import chain
+from xml.etree.ElementTree import iterparse
+
+from django.db import transaction
+from django.db.models import Case, TextField, Value, When
+from django.db.models.functions import Concat
+from django.utils import timezone
+
+from . import facturas
+from .estadisticas_service import EstadisticasService
+from .models import Pago, PerfilUsuario, ResumenDiarioPagos
+
+
+@dataclass
+class LineaBanco:
+    numero: int
+    referencia: str
+    importe: Decimal
+    concepto: str
+    resultado: str  # 'pagado' o 'devuelto'
+    fecha: date
+    motivo: str = ''
+
+
+@dataclass
+class Descuadre:
+    numero: int
+    referencia: str
+    importe: str
+    concepto: str
+    motivo: str
+
+
+@dataclass
+class ResultadoConciliacion:
+    lineas: int = 0
+    pagados: int = 0
+    devueltos: int = 0
+    descuadres: list = field(default_factory=list)
+
+    def escribir_informe(self, destino):
+        """Escribe los descuadres en CSV (`destino` es un fichero de texto abierto)"""
+        escritor = csv.writer(destino, delimiter=';')
+        escritor.writerow(['linea', 'referencia', 'importe', 'concepto', 'motivo'])
+        for descuadre in self.descuadres:
+            escritor.writerow([descuadre.numero, descuadre.referencia, descuadre.importe,
+                               descuadre.concepto, descuadre.motivo])
+
+
+class FormatoNoValido(ValueError):
+    pass
+
+
+class ConciliacionService:
+    """
+    Concilia los ficheros de resultados de remesas de domiciliaciones: cada
+    línea del banco (cobrada o devuelta) se cruza con un Pago por la clave
+    (socio, importe, concepto). La referencia del mandato es el nombre de
+    usuario del socio y el concepto es el texto de la remesa.
+
+    Los ficheros se leen en streaming (CSV fila a fila, pain.002 con iterparse)
+    y los pagos candidatos se indexan una vez en un dict, así que cada línea se
+    resuelve sin consultas. Los cambios se aplican por lotes, cada lote en su
+    transacción, con sus filas bloqueadas y unos pocos UPDATE agrupados.
+    """
+    TAMANO_LOTE = 1000
+    # Las devoluciones SEPA pueden llegar hasta 8 semanas después del cargo
+    DIAS_DEVOLUCION = 70
+
+    RESULTADOS = {
+        'pagado': 'pagado', 'cobrado': 'pagado', 'acsc': 'pagado', 'accp': 'pagado',
+        'devuelto': 'devuelto', 'rechazado': 'devuelto', 'rjct': 'devuelto',
+    }
+
+    # ===== LECTURA DE FICHEROS =====
+    @classmethod
+    def leer(cls, fichero, nombre=''):
+        """Líneas del fichero (binario) según su formato: XML pain.002 o CSV"""
+        if nombre.lower().endswith('.xml'):
+            return cls.leer_pain002(fichero)
+        return cls.leer_csv(fichero)
+
+    @classmethod
+    def leer_csv(cls, fichero):
+        """
+        CSV con cabecera referencia;importe;concepto;resultado;fecha[;motivo].
+        Admite ';' o ',' como separador y coma decimal en el importe.
+        """
+        texto = io.TextIOWrapper(fichero, encoding='utf-8-sig', newline='')
+        cabecera = texto.readline()
+        separador = ';' if ';' in cabecera else ','
+        columnas = [columna.strip().lower() for columna in next(csv.reader([cabecera], delimiter=separador))]
+        faltan = {'referencia', 'importe', 'concepto', 'resultado', 'fecha'} - set(columnas)
+        if faltan:
+            raise FormatoNoValido(f'Faltan columnas en el CSV: {", ".join(sorted(faltan))}')
+
+        for numero, fila in enumerate(csv.DictReader(texto, fieldnames=columnas, delimiter=separador), start=2):
+            yield cls._linea(numero, fila['referencia'], fila['importe'], fila['concepto'],
+                             fila['resultado'], fila['fecha'], fila.get('motivo') or '')
+
+    @classmethod
+    def leer_pain002(cls, fichero):
+        """Informe de estado SEPA (pain.002): una línea por TxInfAndSts"""
+        numero = 0
+        for _, elemento in iterparse(fichero):
+            if _etiqueta(elemento) != 'TxInfAndSts':
+                continue
+            numero += 1
+            valores, motivo = {}, ''
+            for hijo in elemento.iter():
+                valores[_etiqueta(hijo)] = (hijo.text or '').strip()
+                if _etiqueta(hijo) == 'StsRsnInf':
+                    # Código de devolución (AM04, MD06...); hay otros <Cd> en el mensaje
+                    motivo = next((c.text for c in hijo.iter() if _etiqueta(c) == 'Cd'), '')
+            yield cls._linea(
+                numero,
+                valores.get('MndtId', ''),
+                valores.get('InstdAmt', ''),
+                valores.get('Ustrd', ''),
+                valores.get('TxSts', ''),
+                valores.get('ReqdColltnDt', ''),
+                motivo,
+            )
+            elemento.clear()  # no acumular el árbol: memoria constante
+
+    @classmethod
+    def _linea(cls, numero, referencia, importe, concepto, resultado, fecha, motivo):
+        importe = (importe or '').strip()
+        if ',' in importe and '.' not in importe:
+            importe = importe.replace(',', '.')
+        try:
+            importe = Decimal(importe).quantize(Decimal('0.01'))
+        except InvalidOperation:
+            importe = None
+        try:
+            fecha = datetime.strptime((fecha or '').strip()[:10], '%Y-%m-%d').date()
+        except ValueError:
+            fecha = None
+        return LineaBanco(
+            numero=numero,
+            referencia=(referencia or '').strip(),
+            importe=importe,
+            concepto=(concepto or '').strip(),
+            resultado=cls.RESULTADOS.get((resultado or '').strip().lower(), ''),
+            fecha=fecha,
+            motivo=(motivo or '').strip(),
+        )
+
+    # ===== CONCILIACIÓN =====
+    @staticmethod
+    def clave(referencia, importe, concepto):
+        return referencia.lower(), importe, ' '.join(concepto.lower().split())
+
+    @classmethod
+    def indexar(cls, hoy=None):
+        """
+        Índice en memoria de los pagos candidatos: clave -> cola de ids (el más
+        antiguo primero). Los pendientes sirven para cobros y devoluciones; los
+        cobrados por domiciliación recientes, solo para devoluciones.
+        """
+        hoy = hoy or timezone.now().date()
+        pendientes, cobrados = defaultdict(deque), defaultdict(deque)
+        campos = ('id', 'socio__username', 'importe', 'concepto')
+        filas = Pago.objects.filter(estado__in=Pago.ESTADOS_PENDIENTES).order_by('fecha_emision', 'id')
+        for pago_id, username, importe, concepto in filas.values_list(*campos).iterator(chunk_size=5000):
+            pendientes[cls.clave(username, importe, concepto)].append(pago_id)
+        filas = Pago.objects.filter(
+            estado='pagado', metodo_pago='domiciliacion', fecha_pago__gte=hoy - timedelta(days=cls.DIAS_DEVOLUCION)
+        ).order_by('fecha_pago', 'id')
+        for pago_id, username, importe, concepto in filas.values_list(*campos).iterator(chunk_size=5000):
+            cobrados[cls.clave(username, importe, concepto)].append(pago_id)
+        return pendientes, cobrados
+
+    @classmethod
+    def conciliar(cls, lineas, lote=TAMANO_LOTE):
+        """Aplica las líneas del banco y devuelve un ResultadoConciliacion con los descuadres"""
+        resultado = ResultadoConciliacion()
+        pendientes, cobrados = cls.indexar()
+        bloque = []
+        for linea in lineas:
+            resultado.lineas += 1
+            if linea.importe is None or linea.fecha is None or not linea.resultado or not linea.referencia:
+                cls._descuadre(resultado, linea, 'línea con formato no válido')
+                continue
+
+            clave = cls.clave(linea.referencia, linea.importe, linea.concepto)
+            candidatos = pendientes.get(clave)
+            if not candidatos and linea.resultado == 'devuelto':
+                candidatos = cobrados.get(clave)
+            if not candidatos:
+                cls._descuadre(resultado, linea, 'sin pago pendiente que coincida')
+                continue
+
+            bloque.append((candidatos.popleft(), linea))
+            if len(bloque) == lote:
+                cls._aplicar(bloque, resultado)
+                bloque = []
+        if bloque:
+            cls._aplicar(bloque, resultado)
+        if resultado.pagados or resultado.devueltos:
+            EstadisticasService.invalidar()
+        return resultado
+
+    @classmethod
+    def _aplicar(cls, bloque, resultado):
+        lineas = dict(bloque)
+        with transaction.atomic():
+            # Se relee el estado con las filas bloqueadas: el índice pudo quedarse viejo
+            actuales = {pago.pk: pago for pago in Pago.objects.select_for_update().filter(pk__in=lineas)}
+            cobros, devoluciones = defaultdict(list), defaultdict(list)
+            socios = set()
+            movimientos = []
+            for pago_id, linea in bloque:
+                pago = actuales.get(pago_id)
+                if pago is None:
+                    cls._descuadre(resultado, linea, 'el pago ya no existe')
+                    continue
+                esperado = Pago.ESTADOS_PENDIENTES + (('pagado',) if linea.resultado == 'devuelto' else ())
+                if pago.estado not in esperado:
+                    cls._descuadre(resultado, linea, f'el pago {pago.pk} ya está {pago.get_estado_display().lower()}')
+                    continue
+
+                anterior = pago.clave_resumen()
+                if linea.resultado == 'pagado':
+                    pago.estado = 'pagado'
+                    pago.fecha_pago = linea.fecha
+                    cobros[linea.fecha].append(pago.pk)
+                    resultado.pagados += 1
+                else:
+                    pago.estado = 'devuelto'
+                    pago.fecha_pago = None
+                    nota = f'Devuelto por el banco el {linea.fecha:%d/%m/%Y}'
+                    if linea.motivo:
+                        nota += f' (motivo {linea.motivo})'
+                    devoluciones[nota].append(pago.pk)
+                    resultado.devueltos += 1
+                pago.metodo_pago = 'domiciliacion'
+                socios.add(pago.socio_id)
+                movimientos.append((anterior, pago.clave_resumen()))
+
+            # Un UPDATE por fecha de cobro y por nota de devolución (casi todo el lote
+            # comparte los mismos valores), en vez de un bulk_update fila a fila
+            for fecha, ids in cobros.items():
+                Pago.objects.filter(pk__in=ids).update(
+                    estado='pagado', fecha_pago=fecha, metodo_pago='domiciliacion'
+                )
+            for nota, ids in devoluciones.items():
+                Pago.objects.filter(pk__in=ids).update(
+                    estado='devuelto', fecha_pago=None, metodo_pago='domiciliacion',
+                    observaciones=Case(
+                        When(observaciones='', then=Value(nota)),
+                        default=Concat('observaciones', Value(f'\n{nota}')),
+                        output_field=TextField(),
+                    ),
+                )
+
+            # update() no pasa por Pago.save ni lanza post_save: las facturas guardadas
+            # se descartan al confirmar y el resumen diario se ajusta aquí, agrupado
+            cambiados = list(chain(*cobros.values(), *devoluciones.values()))
+            if cambiados:
+                transaction.on_commit(partial(facturas.invalidar_pagos, cambiados))
+            deltas = defaultdict(lambda: [0, 0])
+            for anterior, actual in movimientos:
+                deltas[anterior[0]][0] -= 1
+                deltas[anterior[0]][1] -= anterior[1]
+                deltas[actual[0]][0] += 1
+                deltas[actual[0]][1] += actual[1]
+            for clave, (pagos, importe) in deltas.items():
+                if pagos or importe:
+                    ResumenDiarioPagos.sumar(clave, pagos, importe)
+
+            PerfilUsuario.objects.filter(user_id__in=socios).update(tiene_pagos_vencidos=False)
+            PerfilUsuario.objects.filter(
+                user_id__in=Pago.objects.filter(socio_id__in=socios, estado='vencido').values('socio_id')
+            ).update(tiene_pagos_vencidos=True)
+
+    @staticmethod
+    def _descuadre(resultado, linea, motivo):
+        resultado.descuadres.append(Descuadre(
+            numero=linea.numero,
+            referencia=linea.referencia,
+            importe='' if linea.importe is None else str(linea.importe),
+            concepto=linea.concepto,
+            motivo=motivo,
+        ))
+
+
+def _etiqueta(elemento):
+    # Quita el espacio de nombres: '{urn:iso:std:iso:20022:tech:xsd:pain.002.001.03}TxSts' -> 'TxSts'
+    return elemento.tag.rsplit('}', 1)[-1]
@@ -0,0 +1,139 @@
+from dataclasses import dataclass
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .estadisticas_service import EstadisticasService
+from .models import Pago, PerfilUsuario, ResumenDiarioPagos
+
+
+@dataclass
+class ResultadoEmision:
+    periodo: str
+    emitidas: int
+    omitidas: int
+
+
+class CuotaService:
+    """
+    Emisión en bloque de cuotas periódicas. Cada cuota lleva su `periodo`, que
+    junto con socio y tipo de pago forma una clave única: volver a emitir el
+    mismo periodo no duplica cobros.
+    """
+    TIPOS_PERIODICOS = ('mensual', 'trimestral', 'anual')
+    TAMANO_LOTE = 2000
+    DIAS_VENCIMIENTO = 10
+
+    @staticmethod
+    def importe_por_defecto():
+        return Decimal(settings.CUOTA_MENSUAL_IMPORTE)
+
+    @staticmethod
+    def periodo(tipo_pago, fecha):
+        if tipo_pago == 'mensual':
+            return f'{fecha.year}-{fecha.month:02d}'
+        if tipo_pago == 'trimestral':
+            return f'{fecha.year}-T{(fecha.month - 1) // 3 + 1}'
+        if tipo_pago == 'anual':
+            return str(fecha.year)
+        raise ValueError(f'Tipo de pago no periódico: {tipo_pago}')
+
+    @classmethod
+    def emitir(cls, tipo_pago, importe, fecha=None, socios=None, registrado_por=None, lote=TAMANO_LOTE):
+        """
+        Crea la cuota del periodo de `fecha` para los socios activos (o los de
+        `socios`) que aún no la tengan, con bulk_create por lotes. Todo va en
+        una transacción con el recálculo del resumen diario. Las cuotas que otra
+        emisión simultánea ya insertó (ignore_conflicts) no cuentan como
+        emitidas.
+        """
+        fecha = fecha or timezone.now().date()
+        periodo = cls.periodo(tipo_pago, fecha)
+        if socios is None:
+            socios = User.objects.filter(perfil__rol='socio', perfil__activo=True)
+
+        ya_emitidas = Pago.objects.filter(tipo_pago=tipo_pago, periodo=periodo).values('socio_id')
+        pendientes = socios.exclude(pk__in=ya_emitidas).order_by('pk').values_list('pk', flat=True)
+
+        concepto = f'{dict(Pago.TIPOS_PAGO)[tipo_pago]} {periodo}'
+        vencimiento = fecha + timedelta(days=cls.DIAS_VENCIMIENTO)
+        with transaction.atomic():
+            emitidas = 0
+            bloque = []
+            for socio_id in pendientes.iterator(chunk_size=lote):
+                bloque.append(Pago(
+                    socio_id=socio_id,
+                    tipo_pago=tipo_pago,
+                    importe=importe,
+                    fecha_emision=fecha,
+                    fecha_vencimiento=vencimiento,
+                    concepto=concepto,
+                    periodo=periodo,
+                    registrado_por=registrado_por,
+                ))
+                if len(bloque) == lote:
+                    emitidas += cls._insertar(bloque)
+                    bloque = []
+            if bloque:
+                emitidas += cls._insertar(bloque)
+
+            if emitidas:
+                # bulk_create no pasa por Pago.save: todas las cuotas caen en la misma fila del resumen
+                ResumenDiarioPagos.recalcular((fecha, tipo_pago, '', 'pendiente'))
+                EstadisticasService.invalidar_al_confirmar()
+
+        return ResultadoEmision(periodo, emitidas, socios.count() - emitidas)
+
+    @classmethod
+    def marcar_vencidos(cls, hoy=None):
+        """
+        Pasa a 'vencido' los pagos pendientes cuyo vencimiento ya pasó (usa el
+        índice parcial de pendientes), mueve sus importes de 'pendiente' a
+        'vencido' en ResumenDiarioPagos y actualiza el indicador
+        tiene_pagos_vencidos de los socios. Devuelve cuántos pagos cambiaron.
+        """
+        hoy = hoy or timezone.now().date()
+        with transaction.atomic():
+            vencen = Pago.objects.filter(estado='pendiente', fecha_vencimiento__lt=hoy)
+            # Una consulta agrupada para el resumen; la subconsulta lleva el FOR UPDATE
+            # (PostgreSQL), así que el UPDATE de después cambia exactamente estos pagos
+            movidos = list(
+                Pago.objects.filter(pk__in=vencen.select_for_update().values('pk'))
+                .values_list('fecha_emision', 'tipo_pago', 'metodo_pago')
+                .annotate(pagos=Count('id'), total=Sum('importe'))
+                .order_by()
+            )
+            cambiados = vencen.update(estado='vencido')
+
+            for fecha, tipo_pago, metodo_pago, pagos, total in movidos:
+                clave = (fecha, tipo_pago, metodo_pago)
+                ResumenDiarioPagos.sumar(clave + ('pendiente',), -pagos, -total)
+                ResumenDiarioPagos.sumar(clave + ('vencido',), pagos, total)
+
+            con_vencidos = Pago.objects.filter(estado='vencido').values('socio_id')
+            PerfilUsuario.objects.filter(user_id__in=con_vencidos, tiene_pagos_vencidos=False).update(
+                tiene_pagos_vencidos=True
+            )
+            PerfilUsuario.objects.filter(tiene_pagos_vencidos=True).exclude(user_id__in=con_vencidos).update(
+                tiene_pagos_vencidos=False
+            )
+            if cambiados:
+                EstadisticasService.invalidar_al_confirmar()
+        return cambiados
+
+    @staticmethod
+    def _insertar(bloque):
+        """Inserta el lote y devuelve cuántas cuotas eran nuevas"""
+        # ignore_conflicts cubre a otra emisión simultánea del mismo periodo:
+        # las que ya tenga alguno de estos socios no se insertan ni se cuentan
+        ya_emitidas = Pago.objects.filter(
+            tipo_pago=bloque[0].tipo_pago, periodo=bloque[0].periodo,
+            socio_id__in=[pago.socio_id for pago in bloque],
+        ).count()
+        Pago.objects.bulk_create(bloque, ignore_conflicts=True)
+        return len(bloque) - ya_emitidas
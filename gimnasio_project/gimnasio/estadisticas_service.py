@@ -0,0 +1,103 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import Clase, Monitor, Pago, PerfilUsuario, Reserva, ResumenDiarioPagos
+
+
+def rango_mes(fecha):
+    """Primer día del mes de `fecha` y primer día del mes siguiente (para filtros por rango indexables)"""
+    inicio = fecha.replace(day=1)
+    return inicio, (inicio + timedelta(days=32)).replace(day=1)
+
+
+class EstadisticasService:
+    """
+    Indicadores del panel de administración (estadísticas e inicio del admin).
+
+    Se calculan con pocas consultas agregadas (Count/Sum condicionales con
+    filter=, una por tabla) y se guardan en memoria del proceso durante
+    ESTADISTICAS_TTL segundos. Las señales y los servicios que cambian
+    reservas, pagos, socios, monitores o clases llaman a invalidar(); en otros
+    procesos (varios workers) el dato caduca como mucho al pasar el TTL.
+    """
+    CLASES_POPULARES = 5
+
+    _datos = None
+    _caduca = 0.0
+    _version = 0
+    _cerrojo = threading.Lock()
+
+    @classmethod
+    def obtener(cls):
+        hoy = timezone.now().date()
+        with cls._cerrojo:
+            datos, version = cls._datos, cls._version
+            if datos is not None and datos['hoy'] == hoy and time.monotonic() < cls._caduca:
+                return datos
+
+        datos = cls.calcular(hoy)
+        with cls._cerrojo:
+            # Si se invalidó mientras se calculaba, el resultado puede estar viejo: no se guarda
+            if version == cls._version:
+                cls._datos, cls._caduca = datos, time.monotonic() + settings.ESTADISTICAS_TTL
+        return datos
+
+    @classmethod
+    def invalidar(cls):
+        with cls._cerrojo:
+            cls._datos = None
+            cls._version += 1
+
+    @classmethod
+    def invalidar_al_confirmar(cls):
+        """Invalida ya y otra vez tras el commit, para no cachear lo que aún no es visible"""
+        cls.invalidar()
+        transaction.on_commit(cls.invalidar)
+
+    @classmethod
+    def calcular(cls, hoy=None):
+        hoy = hoy or timezone.now().date()
+        inicio_mes, fin_mes = rango_mes(hoy)
+
+        socios = PerfilUsuario.objects.aggregate(
+            total_socios=Count('pk', filter=Q(rol='socio', activo=True)),
+        )
+        monitores = Monitor.objects.aggregate(
+            total_monitores=Count('pk', filter=Q(activo=True)),
+        )
+        reservas = Reserva.objects.filter(
+            cancelada=False, fecha__gte=hoy, fecha__lte=hoy + timedelta(days=7)
+        ).aggregate(
+            reservas_hoy=Count('pk', filter=Q(fecha=hoy)),
+            reservas_semana=Count('pk'),
+        )
+        pagos = ResumenDiarioPagos.objects.aggregate(
+            # Mismos estados que el total pendiente de la gestión de pagos
+            pagos_pendientes=Sum('pagos', filter=Q(estado__in=Pago.ESTADOS_PENDIENTES), default=0),
+            ingresos_mes=Sum(
+                'importe', filter=Q(estado='pagado', fecha__gte=inicio_mes, fecha__lt=fin_mes), default=0
+            ),
+        )
+
+        # Una consulta para las más reservadas; el total de clases activas sale del mismo listado
+        clases = list(
+            Clase.objects.filter(activa=True).select_related('monitor')
+            .annotate(num_reservas=Count('reservas'))
+            .order_by('-num_reservas', 'pk')
+        )
+
+        return {
+            'hoy': hoy,
+            **socios,
+            **monitores,
+            'total_clases': len(clases),
+            **reservas,
+            **pagos,
+            'clases_populares': clases[:cls.CLASES_POPULARES],
+        }
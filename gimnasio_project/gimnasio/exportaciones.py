@@ -0,0 +1,92 @@
+import csv
+import tempfile
+from datetime import datetime
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from openpyxl import Workbook
+
+# Exportación de listados a CSV/XLSX sin cargarlos en memoria: las vistas pasan
+# un iterador de tuplas (values_list(...).iterator()) y aquí se escriben fila a
+# fila. Solo el CSV se envía a medida que se genera. El XLSX no: openpyxl en
+# modo write-only lo escribe entero en un temporal en disco (memoria constante)
+# y no empieza a enviarse hasta que el fichero está completo.
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+FILAS_POR_CONSULTA = 2000  # chunk_size de .iterator()
+FILAS_POR_BLOQUE = 1000
+TAMANO_TROZO = 64 * 1024
+
+
+def _valor(valor):
+    # Excel no admite zona horaria: las fechas con hora se pasan a la hora local
+    if isinstance(valor, datetime) and timezone.is_aware(valor):
+        return timezone.localtime(valor).replace(tzinfo=None, microsecond=0)
+    return valor
+
+
+def etiquetar(filas, opciones):
+    """Cambia los códigos de choices por su texto: `opciones` es {posición: choices}"""
+    nombres = {posicion: dict(choices) for posicion, choices in opciones.items()}
+    for fila in filas:
+        fila = list(fila)
+        for posicion, etiquetas in nombres.items():
+            fila[posicion] = etiquetas.get(fila[posicion], fila[posicion])
+        yield fila
+
+
+class _Eco:
+    """Destino de csv.writer que devuelve la línea en vez de guardarla"""
+
+    def write(self, linea):
+        return linea
+
+
+def generar_csv(cabecera, filas):
+    escritor = csv.writer(_Eco())
+    # BOM para que Excel abra el CSV como UTF-8 (tildes y eñes)
+    yield '\ufeff' + escritor.writerow(cabecera)
+    bloque = []
+    for fila in filas:
+        bloque.append(escritor.writerow([_valor(valor) for valor in fila]))
+        if len(bloque) == FILAS_POR_BLOQUE:
+            yield ''.join(bloque)
+            bloque = []
+    if bloque:
+        yield ''.join(bloque)
+
+
+def generar_xlsx(titulo, cabecera, filas):
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet(titulo)
+    hoja.append(cabecera)
+    for fila in filas:
+        hoja.append([_valor(valor) for valor in fila])
+
+    with tempfile.TemporaryFile() as fichero:
+        libro.save(fichero)
+        fichero.seek(0)
+        while trozo := fichero.read(TAMANO_TROZO):
+            yield trozo
+
+
+def respuesta(formato, nombre, cabecera, filas):
+    """
+    Respuesta con el listado en `formato` ('csv' o 'xlsx'). El CSV sale por
+    bloques mientras se recorre la consulta; el XLSX se genera completo en
+    disco antes del primer byte y luego se envía por trozos.
+    """
+    if formato == 'xlsx':
+        contenido = generar_xlsx(nombre.capitalize(), cabecera, filas)
+    else:
+        formato = 'csv'
+        contenido = generar_csv(cabecera, filas)
+
+    response = StreamingHttpResponse(contenido, content_type=FORMATOS[formato])
+    fecha = timezone.localdate().isoformat()
+    response['Content-Disposition'] = f'attachment; filename="{nombre}_{fecha}.{formato}"'
+    # Que nginx no acumule la respuesta entera antes de enviarla (en el CSV)
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,392 @@
+import hashlib
+import logging
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO, RawIOBase
+from multiprocessing import get_context
+from pathlib import Path
+
+from django.conf import settings
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_RIGHT
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
+
+logger = logging.getLogger(__name__)
+
+# Las facturas de pagos cobrados no cambian: se generan una vez y se guardan en
+# MEDIA_ROOT/facturas/<id>-<huella>.pdf. La huella resume todo lo que aparece en
+# el PDF, así que si el pago (o el socio) se edita, la clave cambia sola.
+DIRECTORIO = 'facturas'
+LOGO = Path(__file__).resolve().parent / 'static' / 'gimnasio' / 'imagenes' / 'logo.png'
+
+
+def datos_factura(pago):
+    """Lo que se imprime en la factura, como dict plano (se puede enviar a otro proceso)"""
+    socio = pago.socio
+    return {
+        'id': pago.id,
+        'estado': pago.estado,
+        'concepto': pago.concepto,
+        'importe': pago.importe,
+        'fecha_emision': pago.fecha_emision,
+        'fecha_pago': pago.fecha_pago,
+        'nombre': socio.get_full_name(),
+        'email': socio.email,
+        'username': socio.username,
+    }
+
+
+def huella(datos):
+    """Hash corto de los datos que se imprimen en la factura"""
+    texto = '|'.join(str(datos[campo]) for campo in (
+        'id', 'estado', 'concepto', 'importe', 'fecha_emision', 'fecha_pago', 'nombre', 'email', 'username',
+    ))
+    return hashlib.sha256(texto.encode()).hexdigest()[:16]
+
+
+def ruta_relativa(datos):
+    return Path(DIRECTORIO) / f'{datos["id"]}-{huella(datos)}.pdf'
+
+
+def obtener(pago):
+    """
+    Devuelve la ruta (relativa a MEDIA_ROOT) del PDF de la factura, generándolo
+    solo si no existe ya para la versión actual del pago.
+    """
+    datos = datos_factura(pago)
+    ruta = ruta_relativa(datos)
+    absoluta = Path(settings.MEDIA_ROOT) / ruta
+    if not absoluta.exists():
+        _guardar(absoluta, construir_pdf(datos))
+        invalidar(pago.id, conservar=absoluta.name)
+    return ruta
+
+
+def invalidar(pago_id, conservar=None):
+    """Borra las versiones guardadas de la factura del pago (salvo `conservar`)"""
+    directorio = Path(settings.MEDIA_ROOT) / DIRECTORIO
+    for fichero in directorio.glob(f'{pago_id}-*.pdf'):
+        if fichero.name != conservar:
+            fichero.unlink(missing_ok=True)
+
+
+def invalidar_pagos(pago_ids):
+    """Como invalidar() para muchos pagos, recorriendo el directorio una sola vez"""
+    pago_ids = {str(pago_id) for pago_id in pago_ids}
+    directorio = Path(settings.MEDIA_ROOT) / DIRECTORIO
+    for fichero in directorio.glob('*-*.pdf'):
+        if fichero.name.split('-', 1)[0] in pago_ids:
+            fichero.unlink(missing_ok=True)
+
+
+def _guardar(absoluta, contenido):
+    absoluta.parent.mkdir(parents=True, exist_ok=True)
+    temporal = absoluta.with_suffix(f'.{os.getpid()}.tmp')
+    temporal.write_bytes(contenido)
+    os.replace(temporal, absoluta)  # atómico: nunca se sirve un PDF a medias
+
+
+# ===============================
+# EXPORTACIÓN EN BLOQUE
+# ===============================
+class _Tubo(RawIOBase):
+    """Destino no posicionable del ZIP: guarda lo escrito hasta que se recoge"""
+
+    def __init__(self):
+        super().__init__()
+        self.partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        return len(datos)
+
+    def recoger(self):
+        contenido = b''.join(self.partes)
+        self.partes = []
+        return contenido
+
+
+def _renderizar(datos, absoluta):
+    """Trabajo de cada proceso del pool: genera el PDF y lo deja en la caché de disco"""
+    _guardar(absoluta, construir_pdf(datos))
+
+
+def exportar_zip(pagos, procesos=None, progreso=None):
+    """
+    Genera, trozo a trozo, un ZIP con las facturas de `pagos`. Las que ya
+    están en la caché de disco se reutilizan y el resto se renderizan en un
+    ProcessPoolExecutor (ReportLab es CPU puro: con hilos no escala por el
+    GIL). Los procesos escriben en la caché y aquí cada PDF se copia del disco
+    al ZIP en cuanto está listo, así que en memoria solo hay uno cada vez.
+    `progreso(hechas, total)` se llama tras añadir cada factura.
+    """
+    raiz = Path(settings.MEDIA_ROOT)
+    lista = []
+    for pago in pagos:
+        datos = datos_factura(pago)
+        lista.append((datos, raiz / ruta_relativa(datos)))
+    pendientes = [(datos, absoluta) for datos, absoluta in lista if not absoluta.exists()]
+    logger.info(f'📦 Exportando {len(lista)} facturas ({len(pendientes)} por generar)')
+
+    pool = None
+    generadas = {}
+    if pendientes:
+        # spawn y no fork: el servidor puede tener hilos en marcha
+        pool = ProcessPoolExecutor(max_workers=procesos, mp_context=get_context('spawn'))
+        generadas = {datos['id']: pool.submit(_renderizar, datos, absoluta) for datos, absoluta in pendientes}
+
+    tubo = _Tubo()
+    try:
+        # Los PDF ya van comprimidos: ZIP_STORED ahorra CPU sin perder tamaño
+        with zipfile.ZipFile(tubo, 'w', compression=zipfile.ZIP_STORED) as archivo:
+            for hechas, (datos, absoluta) in enumerate(lista, start=1):
+                if datos['id'] in generadas:
+                    generadas.pop(datos['id']).result()
+                    invalidar(datos['id'], conservar=absoluta.name)
+                archivo.write(absoluta, arcname=f'Factura_{datos["id"]:05d}_{datos["username"]}.pdf')
+                yield tubo.recoger()
+                if progreso:
+                    progreso(hechas, len(lista))
+        yield tubo.recoger()
+    finally:
+        if pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+# ===============================
+# MAQUETACIÓN DEL PDF
+# ===============================
+# Todo lo que no depende del pago se crea una sola vez: los estilos y TableStyle
+# son de solo lectura y se comparten; los bloques fijos (cabecera con el logo ya
+# decodificado, datos del gimnasio, pie...) guardan estado al maquetarse, así
+# que cada hilo tiene los suyos. Por factura solo se crean las celdas del pago.
+VERDE_OSCURO = colors.HexColor('#004B23')
+VERDE = colors.HexColor('#38B000')
+VERDE_CLARO = colors.HexColor('#9EF01A')
+VERDE_LIMA = colors.HexColor('#70E000')
+
+_ESTILOS = getSampleStyleSheet()
+NORMAL = _ESTILOS['Normal']
+DERECHA = ParagraphStyle('right', alignment=TA_RIGHT, parent=NORMAL)
+
+ESTILO_CAJA_INFO = TableStyle([
+    ('FONTSIZE', (0, 1), (-1, -1), 9),
+    ('TOPPADDING', (0, 0), (-1, -1), 3),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+])
+ESTILO_INFO = TableStyle([
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('LEFTPADDING', (0, 0), (0, 0), 10),
+    ('RIGHTPADDING', (1, 0), (1, 0), 10),
+    ('BACKGROUND', (0, 0), (0, 0), colors.HexColor('#F8FFF8')),
+    ('BACKGROUND', (1, 0), (1, 0), colors.HexColor('#F8FFF8')),
+    ('BOX', (0, 0), (0, 0), 1, VERDE_CLARO),
+    ('BOX', (1, 0), (1, 0), 1, VERDE_CLARO),
+])
+ESTILO_CLIENTE = TableStyle([
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('LEFTPADDING', (0, 0), (-1, -1), 15),
+    ('TOPPADDING', (0, 0), (-1, -1), 5),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+    ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#FAFFFE')),
+    ('BOX', (0, 0), (-1, -1), 1, VERDE_CLARO),
+])
+ESTILO_DETALLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), VERDE_OSCURO),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 11),
+    ('TOPPADDING', (0, 0), (-1, 0), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('LEFTPADDING', (0, 0), (0, -1), 15),
+    ('RIGHTPADDING', (1, 0), (1, -1), 15),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+    ('TOPPADDING', (0, 1), (-1, -1), 15),
+    ('BOTTOMPADDING', (0, 1), (-1, -1), 15),
+    ('GRID', (0, 0), (-1, -1), 1, VERDE_CLARO),
+])
+ESTILO_TOTAL = TableStyle([
+    ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 15),
+    ('TOPPADDING', (0, 0), (-1, -1), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+    ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#F0FFF0')),
+    ('BOX', (0, 0), (-1, -1), 2, VERDE_LIMA),
+])
+
+_por_hilo = threading.local()
+_SIN_LEER = object()
+_logo_leido = _SIN_LEER
+
+
+def _logo():
+    """Logo decodificado una vez por proceso (None si no existe el fichero)"""
+    global _logo_leido
+    if _logo_leido is _SIN_LEER:
+        _logo_leido = ImageReader(str(LOGO)) if LOGO.exists() else None
+    return _logo_leido
+
+
+def _bloques_fijos():
+    """Flowables que son iguales en todas las facturas, creados una vez por hilo"""
+    bloques = getattr(_por_hilo, 'bloques', None)
+    if bloques is not None:
+        return bloques
+
+    # Encabezado con logo y título
+    titulo = Paragraph("<b><font size=28 color='#004B23'>FACTURA</font></b>", DERECHA)
+    logo = _logo()
+    if logo:
+        ancho, alto = logo.getSize()
+        escala = min(2.5 * inch / ancho, 1 * inch / alto)
+        izquierda = Image(logo, width=ancho * escala, height=alto * escala)
+    else:
+        # Fallback si no encuentra el logo
+        izquierda = Paragraph(
+            "<b><font size=18 color='#004B23'>TrainUp Gym</font></b><br/><font size=9 color='#38B000'>Entrena para superarte</font>",
+            NORMAL)
+    cabecera = Table([[izquierda, titulo]], colWidths=[3.5 * inch, 3 * inch])
+    cabecera.setStyle(TableStyle([
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 20),
+    ]))
+
+    # Línea decorativa verde
+    linea = Table([['']], colWidths=[6.5 * inch])
+    linea.setStyle(TableStyle([
+        ('LINEABOVE', (0, 0), (-1, 0), 3, VERDE_LIMA),
+    ]))
+
+    # Datos del gimnasio (columna izquierda de la sección de información)
+    gimnasio = Table([
+        [Paragraph("<b><font color='#004B23'>INFORMACIÓN DEL GIMNASIO</font></b>", NORMAL)],
+        ['TrainUp Gym'],
+        ['Calle Fitness, 123'],
+        ['11403 Jerez de la Frontera'],
+        ['Cádiz, España'],
+        [''],
+        [Paragraph('<b>CIF:</b> B12345678', NORMAL)],
+        [Paragraph('<b>Tel:</b> +34 123 456 789', NORMAL)],
+        [Paragraph('<b>Email:</b> info@trainupgym.es', NORMAL)],
+    ], colWidths=[3 * inch])
+    gimnasio.setStyle(ESTILO_CAJA_INFO)
+
+    cliente = Table([[Paragraph("<b><font color='white' size=11>FACTURADO A</font></b>", NORMAL)]],
+                    colWidths=[6.5 * inch])
+    cliente.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, -1), VERDE),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('LEFTPADDING', (0, 0), (-1, -1), 15),
+        ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ]))
+
+    # Pie de página
+    pie = Paragraph("""
+    <para alignment='center'>
+        <font size=10 color='#38B000'><b>¡Gracias por confiar en TrainUp Gym!</b></font><br/>
+        <font size=8 color='#666666'>
+            Estamos comprometidos con tu salud y bienestar.<br/>
+            Para cualquier consulta, contáctanos en info@trainupgym.es o llama al +34 123 456 789
+        </font>
+    </para>
+    """, NORMAL)
+
+    bloques = _por_hilo.bloques = {
+        'cabecera': cabecera,
+        'linea': linea,
+        'gimnasio': gimnasio,
+        'detalles': Paragraph("<b><font color='#004B23'>DETALLES DE FACTURA</font></b>", NORMAL),
+        'estado': Paragraph("<b>Estado:</b> <font color='#38B000'>PAGADO</font>", NORMAL),
+        'cliente': cliente,
+        'concepto': Paragraph("<b><font color='white'>CONCEPTO</font></b>", NORMAL),
+        'importe': Paragraph("<b><font color='white'>IMPORTE</font></b>", DERECHA),
+        'total': Paragraph("<b><font size=13 color='#004B23'>TOTAL A PAGAR</font></b>", DERECHA),
+        'pie': pie,
+    }
+    return bloques
+
+
+def renderizar_factura(pago):
+    """PDF de la factura del pago, en bytes"""
+    return construir_pdf(datos_factura(pago))
+
+
+def construir_pdf(datos):
+    """Genera el PDF de la factura (a partir de datos_factura) con ReportLab y devuelve sus bytes"""
+    fijos = _bloques_fijos()
+    fecha_pago = datos['fecha_pago'].strftime('%d/%m/%Y') if datos['fecha_pago'] else 'Pendiente'
+
+    # Columna derecha de la sección de información: los datos de esta factura
+    factura = Table([
+        [fijos['detalles']],
+        [''],
+        [Paragraph(f"<b>Nº Factura:</b> FAC-{datos['id']:05d}", NORMAL)],
+        [Paragraph(f"<b>Fecha Emisión:</b> {datos['fecha_emision'].strftime('%d/%m/%Y')}", NORMAL)],
+        [Paragraph(f"<b>Fecha Pago:</b> {fecha_pago}", NORMAL)],
+        [fijos['estado']],
+    ], colWidths=[3 * inch])
+    factura.setStyle(ESTILO_CAJA_INFO)
+
+    informacion = Table([[fijos['gimnasio'], factura]], colWidths=[3.2 * inch, 3.3 * inch])
+    informacion.setStyle(ESTILO_INFO)
+
+    cliente = Table([
+        [Paragraph(f"<b>{datos['nombre'] or datos['username']}</b>", NORMAL)],
+        [Paragraph(f"Email: {datos['email']}", NORMAL)],
+        [Paragraph(f"Usuario: {datos['username']}", NORMAL)],
+    ], colWidths=[6.5 * inch])
+    cliente.setStyle(ESTILO_CLIENTE)
+
+    detalle = Table([
+        [fijos['concepto'], fijos['importe']],
+        [
+            Paragraph(f"<font size=11>{datos['concepto']}</font>", NORMAL),
+            Paragraph(f"<font size=11><b>{datos['importe']:.2f}€</b></font>", DERECHA),
+        ],
+    ], colWidths=[5 * inch, 1.5 * inch])
+    detalle.setStyle(ESTILO_DETALLE)
+
+    total = Table([[
+        fijos['total'],
+        Paragraph(f"<b><font size=16 color='#38B000'>{datos['importe']:.2f}€</font></b>", DERECHA),
+    ]], colWidths=[5 * inch, 1.5 * inch])
+    total.setStyle(ESTILO_TOTAL)
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=letter,
+        rightMargin=40,
+        leftMargin=40,
+        topMargin=40,
+        bottomMargin=40
+    )
+    doc.build([
+        fijos['cabecera'],
+        fijos['linea'],
+        Spacer(1, 0.3 * inch),
+        informacion,
+        Spacer(1, 0.4 * inch),
+        fijos['cliente'],
+        cliente,
+        Spacer(1, 0.4 * inch),
+        detalle,
+        Spacer(1, 0.2 * inch),
+        total,
+        Spacer(1, 0.6 * inch),
+        fijos['pie'],
+    ])
+    return buffer.getvalue()
@@ -0,0 +1,113 @@
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import Clase, Pago, ResumenDiarioPagos, SesionClase
+
+
+def porcentaje(parte, total):
+    return round(100 * parte / total, 1) if total else None
+
+
+def sumar_meses(fecha, meses):
+    """Primer día del mes que está `meses` meses antes (negativo) o después de `fecha`"""
+    indice = fecha.year * 12 + fecha.month - 1 + meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+class InformeService:
+    """Informes agregados para el panel de administración"""
+    RANGOS_MESES = (6, 12, 24, 36)
+    SIN_METODO = 'Sin indicar'
+
+    @staticmethod
+    def ingresos_mensuales(meses, hoy=None):
+        """
+        Ingresos cobrados en los últimos `meses` meses (incluido el actual),
+        desglosados por tipo y método de pago. Es una sola consulta GROUP BY
+        mes/tipo/método sobre ResumenDiarioPagos (unas pocas filas por día, no
+        una por pago); los meses sin cobros se rellenan aquí con ceros.
+        """
+        hoy = hoy or timezone.now().date()
+        inicio = sumar_meses(hoy, -(meses - 1))
+        fin = sumar_meses(hoy, 1)
+
+        filas = (
+            ResumenDiarioPagos.objects.filter(estado='pagado', fecha__gte=inicio, fecha__lt=fin)
+            .annotate(mes=TruncMonth('fecha'))
+            .values('mes', 'tipo_pago', 'metodo_pago')
+            .annotate(total=Sum('importe'))
+            .order_by()
+        )
+
+        por_tipo = defaultdict(lambda: defaultdict(Decimal))
+        por_metodo = defaultdict(lambda: defaultdict(Decimal))
+        for fila in filas:
+            por_tipo[fila['mes']][fila['tipo_pago']] += fila['total']
+            por_metodo[fila['mes']][fila['metodo_pago']] += fila['total']
+
+        # Solo las columnas que tienen algún importe en el rango, en el orden de los choices
+        tipos = [(clave, nombre) for clave, nombre in Pago.TIPOS_PAGO
+                 if any(clave in mes for mes in por_tipo.values())]
+        metodos = [(clave, nombre) for clave, nombre in (('', InformeService.SIN_METODO),) + Pago.METODOS_PAGO
+                   if any(clave in mes for mes in por_metodo.values())]
+
+        # Del mes actual hacia atrás, como se muestra en el informe
+        filas_mes = []
+        for i in reversed(range(meses)):
+            mes = sumar_meses(inicio, i)
+            filas_mes.append({
+                'mes': mes,
+                'total': sum(por_tipo[mes].values(), Decimal('0')),
+                'por_tipo': [por_tipo[mes][clave] for clave, _ in tipos],
+                'por_metodo': [por_metodo[mes][clave] for clave, _ in metodos],
+            })
+
+        return {
+            'meses': filas_mes,
+            'tipos': tipos,
+            'metodos': metodos,
+            'total': sum((fila['total'] for fila in filas_mes), Decimal('0')),
+            'maximo': max(fila['total'] for fila in filas_mes),
+        }
+
+    @staticmethod
+    def asistencia_por_clase(desde=None, hasta=None):
+        """
+        Ocupación, asistencia y cancelaciones de cada clase activa en las
+        sesiones entre `desde` y `hasta` (incluidas; None = sin límite). Suma
+        los contadores de SesionClase con un GROUP BY por clase: una fila por
+        sesión en el rango, sin recorrer la tabla de reservas.
+        """
+        sesiones = SesionClase.objects.all()
+        if desde:
+            sesiones = sesiones.filter(fecha__gte=desde)
+        if hasta:
+            sesiones = sesiones.filter(fecha__lte=hasta)
+        totales = {
+            fila['clase_id']: fila
+            for fila in sesiones.values('clase_id').annotate(
+                sesiones=Count('id'),
+                plazas=Sum('capacidad'),
+                reservas=Sum('reservadas'),
+                canceladas=Sum('canceladas'),
+                asistencias=Sum('asistencias'),
+            ).order_by()
+        }
+
+        clases = list(Clase.objects.filter(activa=True).select_related('monitor'))
+        for clase in clases:
+            fila = totales.get(clase.id, {})
+            clase.total_sesiones = fila.get('sesiones', 0)
+            clase.total_plazas = fila.get('plazas', 0)
+            clase.total_reservas = fila.get('reservas', 0)
+            clase.total_canceladas = fila.get('canceladas', 0)
+            clase.total_asistencias = fila.get('asistencias', 0)
+            clase.ocupacion = porcentaje(clase.total_reservas, clase.total_plazas)
+            clase.tasa_asistencia = porcentaje(clase.total_asistencias, clase.total_reservas)
+            clase.tasa_cancelacion = porcentaje(clase.total_canceladas, clase.total_reservas + clase.total_canceladas)
+        return clases
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from gimnasio.archivo_service import ArchivoService
+
+
+class Command(BaseCommand):
+    help = 'Mueve las reservas antiguas a la tabla de archivo en lotes pequeños'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=ArchivoService.DIAS_CONSERVADOS,
+                            help=f'Conservar en Reserva los últimos N días (por defecto {ArchivoService.DIAS_CONSERVADOS})')
+        parser.add_argument('--lote', type=int, default=ArchivoService.TAMANO_LOTE,
+                            help=f'Reservas por transacción (por defecto {ArchivoService.TAMANO_LOTE})')
+
+    def handle(self, *args, **options):
+        corte = ArchivoService.fecha_corte(options['dias'])
+        inicio = time.perf_counter()
+        archivadas = ArchivoService.archivar(corte, lote=options['lote'])
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {archivadas} reservas anteriores al {corte:%d/%m/%Y} archivadas en {segundos:.2f}s'
+        ))
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gimnasio.conciliacion_service import ConciliacionService, FormatoNoValido
+
+
+class Command(BaseCommand):
+    help = 'Concilia un fichero de resultados de remesa (CSV o SEPA pain.002) con los pagos pendientes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichero', help='Fichero del banco (.csv o .xml)')
+        parser.add_argument('--informe', default=None,
+                            help='CSV donde guardar las líneas que no cuadran (por defecto <fichero>.descuadres.csv)')
+        parser.add_argument('--lote', type=int, default=ConciliacionService.TAMANO_LOTE,
+                            help=f'Pagos bloqueados y actualizados en cada transacción (por defecto {ConciliacionService.TAMANO_LOTE})')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        try:
+            with open(options['fichero'], 'rb') as fichero:
+                lineas = ConciliacionService.leer(fichero, options['fichero'])
+                resultado = ConciliacionService.conciliar(lineas, lote=options['lote'])
+        except FormatoNoValido as error:
+            raise CommandError(str(error))
+        segundos = time.perf_counter() - inicio
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {resultado.lineas} líneas en {segundos:.2f}s: {resultado.pagados} cobrados, '
+            f'{resultado.devueltos} devueltos, {len(resultado.descuadres)} descuadres'
+        ))
+        if resultado.descuadres:
+            informe = options['informe'] or f'{options["fichero"]}.descuadres.csv'
+            with open(informe, 'w', newline='', encoding='utf-8') as destino:
+                resultado.escribir_informe(destino)
+            self.stdout.write(self.style.WARNING(f'⚠️ Descuadres guardados en {informe}'))
@@ -0,0 +1,37 @@
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from gimnasio.cuotas_service import CuotaService
+
+
+class Command(BaseCommand):
+    help = 'Emite en bloque la cuota del periodo para todos los socios activos (idempotente)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tipo', choices=CuotaService.TIPOS_PERIODICOS, default='mensual',
+                            help='Tipo de cuota (por defecto mensual)')
+        parser.add_argument('--importe', type=Decimal, default=None,
+                            help='Importe de la cuota (por defecto CUOTA_MENSUAL_IMPORTE)')
+        parser.add_argument('--fecha', type=lambda valor: datetime.strptime(valor, '%Y-%m-%d').date(),
+                            default=None, help='Fecha de emisión AAAA-MM-DD; fija el periodo (por defecto hoy)')
+        parser.add_argument('--lote', type=int, default=CuotaService.TAMANO_LOTE,
+                            help=f'Filas por INSERT (por defecto {CuotaService.TAMANO_LOTE})')
+
+    def handle(self, *args, **options):
+        importe = options['importe'] if options['importe'] is not None else CuotaService.importe_por_defecto()
+
+        inicio = time.perf_counter()
+        resultado = CuotaService.emitir(
+            options['tipo'], importe, fecha=options['fecha'], lote=options['lote']
+        )
+        segundos = time.perf_counter() - inicio
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Cuota {options["tipo"]} {resultado.periodo}: {resultado.emitidas} emitidas, '
+            f'{resultado.omitidas} ya emitidas en {segundos:.2f}s'
+        ))
+        if resultado.emitidas:
+            self.stdout.write(f'   {resultado.emitidas / segundos:.0f} cuotas/s')
@@ -0,0 +1,46 @@
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from gimnasio import facturas
+from gimnasio.models import Pago
+
+
+def fecha(valor):
+    return datetime.strptime(valor, '%Y-%m-%d').date()
+
+
+class Command(BaseCommand):
+    help = 'Guarda en un ZIP las facturas de los pagos cobrados en un rango de fechas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('desde', type=fecha, help='Fecha de pago inicial AAAA-MM-DD')
+        parser.add_argument('hasta', type=fecha, help='Fecha de pago final AAAA-MM-DD (incluida)')
+        parser.add_argument('--salida', default=None,
+                            help='Fichero ZIP de destino (por defecto Facturas_<desde>_<hasta>.zip)')
+        parser.add_argument('--procesos', type=int, default=settings.FACTURAS_PROCESOS or None,
+                            help='Procesos para renderizar los PDF (por defecto uno por CPU)')
+
+    def handle(self, *args, **options):
+        desde, hasta = options['desde'], options['hasta']
+        salida = options['salida'] or f'Facturas_{desde}_{hasta}.zip'
+        pagos = Pago.objects.select_related('socio').filter(
+            estado='pagado', fecha_pago__range=(desde, hasta)
+        ).order_by('fecha_pago', 'id')
+
+        inicio = time.perf_counter()
+
+        def progreso(hechas, total):
+            self.stdout.write(f'\r   {hechas}/{total} facturas', ending='')
+            self.stdout.flush()
+
+        with open(salida, 'wb') as destino:
+            for trozo in facturas.exportar_zip(pagos, procesos=options['procesos'], progreso=progreso):
+                destino.write(trozo)
+
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Facturas guardadas en {salida} en {time.perf_counter() - inicio:.2f}s'
+        ))
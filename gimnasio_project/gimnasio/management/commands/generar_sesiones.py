@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from gimnasio.models import Clase, SesionClase
+
+
+class Command(BaseCommand):
+    help = 'Genera las sesiones concretas de las clases activas hasta el horizonte indicado'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--semanas', type=int, default=SesionClase.HORIZONTE_SEMANAS,
+                            help=f'Semanas a generar desde hoy (por defecto {SesionClase.HORIZONTE_SEMANAS})')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        creadas = SesionClase.generar(Clase.objects.filter(activa=True), semanas=options['semanas'])
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {creadas} sesiones nuevas ({options["semanas"]} semanas) en {segundos:.2f}s'
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from gimnasio import tareas
+
+
+class Command(BaseCommand):
+    help = 'Marca como vencidos los pagos pendientes fuera de plazo y registra la ejecución'
+
+    def handle(self, *args, **options):
+        ejecucion = tareas.ejecutar('marcar_vencidos')
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {ejecucion.filas_afectadas} pagos marcados como vencidos en {ejecucion.duracion_ms} ms'
+        ))
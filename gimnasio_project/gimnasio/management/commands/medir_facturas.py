@@ -0,0 +1,41 @@
+import resource
+import time
+from datetime import date
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from gimnasio import facturas
+
+
+class Command(BaseCommand):
+    help = 'Mide cuántas facturas por segundo genera este proceso y su memoria máxima (no toca la BD)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--facturas', type=int, default=500, help='Facturas a generar (por defecto 500)')
+
+    def handle(self, *args, **options):
+        total = options['facturas']
+        datos = {
+            'id': 1, 'estado': 'pagado', 'concepto': 'Cuota Mensual 2025-10', 'importe': Decimal('40.00'),
+            'fecha_emision': date(2025, 10, 1), 'fecha_pago': date(2025, 10, 3),
+            'nombre': 'Lucía Pérez', 'email': 'lucia@example.com', 'username': 'lucia',
+        }
+
+        # La primera factura incluye la preparación única (estilos, logo...)
+        inicio = time.perf_counter()
+        facturas.construir_pdf(datos)
+        primera = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        for numero in range(total):
+            datos['id'] = numero + 1
+            facturas.construir_pdf(datos)
+        segundos = time.perf_counter() - inicio
+
+        # ru_maxrss viene en KiB en Linux
+        memoria = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {total} facturas en {segundos:.2f}s: {total / segundos:.1f} facturas/s '
+            f'(primera {primera * 1000:.0f} ms, memoria máxima {memoria:.1f} MiB)'
+        ))
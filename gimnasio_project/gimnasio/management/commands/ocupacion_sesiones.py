@@ -0,0 +1,102 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from gimnasio.models import Clase, Reserva, SesionClase
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye o verifica la ocupación (reservas activas) y los contadores de asistencia de cada sesión'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verificar', action='store_true',
+                            help='Solo compara el índice con la tabla Reserva, sin escribir')
+        parser.add_argument('--benchmark', action='store_true',
+                            help='Compara consultas y tiempo del bucle antiguo frente al índice')
+
+    def handle(self, *args, **options):
+        if options['benchmark']:
+            return self.benchmark()
+
+        reales = self.contar_reservas()
+        if options['verificar']:
+            return self.verificar(reales)
+        self.reconstruir(reales)
+
+    def contar_reservas(self):
+        """Reservas activas por sesión en una sola consulta agrupada"""
+        return dict(
+            Reserva.objects.filter(cancelada=False, sesion__isnull=False)
+            .values_list('sesion_id')
+            .annotate(total=Count('id'))
+            .order_by()
+        )
+
+    def desincronizadas(self, reales):
+        return [
+            sesion for sesion in SesionClase.objects.only('id', 'clase_id', 'fecha', 'reservas_activas')
+            if sesion.reservas_activas != reales.get(sesion.id, 0)
+        ]
+
+    def reconstruir(self, reales):
+        with transaction.atomic():
+            sesiones = self.desincronizadas(reales)
+            for sesion in sesiones:
+                sesion.reservas_activas = reales.get(sesion.id, 0)
+            SesionClase.objects.bulk_update(sesiones, ['reservas_activas'], batch_size=1000)
+        self.stdout.write(self.style.SUCCESS(f'✅ Ocupación reconstruida: {len(sesiones)} sesiones corregidas'))
+
+        corregidas = SesionClase.reconstruir_asistencia()
+        self.stdout.write(self.style.SUCCESS(f'✅ Asistencia reconstruida: {corregidas} sesiones corregidas'))
+
+    def verificar(self, reales):
+        sesiones = self.desincronizadas(reales)
+        for sesion in sesiones:
+            self.stdout.write(
+                f'⚠️ Clase {sesion.clase_id} {sesion.fecha}: índice={sesion.reservas_activas} '
+                f'reservas={reales.get(sesion.id, 0)}'
+            )
+
+        asistencia = SesionClase.asistencia_desincronizada()
+        for sesion, reales in asistencia:
+            self.stdout.write(
+                f'⚠️ Clase {sesion.clase_id} {sesion.fecha}: contadores='
+                f'{(sesion.reservadas, sesion.canceladas, sesion.asistencias)} reservas={reales}'
+            )
+
+        if sesiones or asistencia:
+            total = len({sesion.id for sesion in sesiones} | {sesion.id for sesion, _ in asistencia})
+            self.stdout.write(self.style.ERROR(f'❌ {total} sesiones desincronizadas'))
+        else:
+            self.stdout.write(self.style.SUCCESS('✅ Ocupación correcta'))
+
+    def benchmark(self):
+        hoy = timezone.now().date()
+        clases = list(Clase.objects.filter(activa=True, monitor__activo=True))
+        dias = ['L', 'M', 'X', 'J', 'V', 'S', 'D']
+
+        def bucle_antiguo():
+            for clase in clases:
+                for i in range(28):
+                    fecha = hoy + timedelta(days=i)
+                    if dias[fecha.weekday()] == clase.dia_semana:
+                        Reserva.objects.filter(clase=clase, fecha=fecha, cancelada=False).count()
+
+        def consulta_indice():
+            list(SesionClase.objects.filter(
+                clase__in=[clase.id for clase in clases],
+                fecha__range=(hoy, hoy + timedelta(days=27))
+            ).values_list('clase_id', 'fecha', 'reservas_activas'))
+
+        self.stdout.write(f'📊 {len(clases)} clases activas, ventana de 28 días')
+        for nombre, funcion in (('Bucle COUNT por fecha', bucle_antiguo), ('Sesiones materializadas', consulta_indice)):
+            with CaptureQueriesContext(connection) as consultas:
+                inicio = time.perf_counter()
+                funcion()
+                ms = (time.perf_counter() - inicio) * 1000
+            self.stdout.write(f'   {nombre}: {len(consultas)} consultas, {ms:.1f} ms')
@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from gimnasio.models import ResumenDiarioPagos
+
+
+class Command(BaseCommand):
+    help = 'Rehace ResumenDiarioPagos desde la tabla Pago (carga inicial o reparación)'
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        filas = ResumenDiarioPagos.reconstruir()
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Resumen diario reconstruido: {filas} filas en {time.perf_counter() - inicio:.2f}s'
+        ))
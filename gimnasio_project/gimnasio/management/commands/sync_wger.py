@@ -0,0 +1,60 @@
+import time
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from gimnasio.wger_service import Descargador, WgerService
+
+
+class Command(BaseCommand):
+    help = 'Descarga el catálogo de ejercicios de wger.de y lo guarda en las tablas locales'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=Descargador.HILOS,
+                            help=f'Páginas descargadas a la vez (por defecto {Descargador.HILOS})')
+        parser.add_argument('--por-host', type=int, default=Descargador.POR_HOST,
+                            help=f'Máximo de peticiones simultáneas a wger.de (por defecto {Descargador.POR_HOST})')
+        parser.add_argument('--procesos', type=int, default=settings.IMAGENES_PROCESOS or None,
+                            help='Procesos para convertir las imágenes a WebP (por defecto uno por CPU)')
+        parser.add_argument('--sin-imagenes', action='store_true',
+                            help='No copiar las imágenes de los ejercicios a MEDIA_ROOT')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        descargador = Descargador(hilos=options['hilos'], por_host=options['por_host'])
+        try:
+            resultado = WgerService.sincronizar(descargador)
+        except requests.RequestException as error:
+            raise CommandError(f'❌ No se pudo descargar el catálogo de wger (se conserva el actual): {error}')
+        segundos = time.perf_counter() - inicio
+
+        total = resultado.ejercicios or 1
+        origen = resultado.origen
+        for dato in ('nombre', 'descripcion', 'imagen'):
+            self.stdout.write(
+                f'   {dato}: {origen[f"{dato}_api"]} de la API ({origen[f"{dato}_api"] / total * 100:.1f}%), '
+                f'{origen[f"{dato}_respaldo"]} del respaldo ({origen[f"{dato}_respaldo"] / total * 100:.1f}%)'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Catálogo sincronizado en {segundos:.1f}s: {resultado.ejercicios} ejercicios, '
+            f'{resultado.categorias} categorías, {resultado.musculos} músculos, {resultado.equipos} equipos, '
+            f'{resultado.imagenes} imágenes ({resultado.paginas} páginas, {resultado.no_modificadas} sin cambios en '
+            f'wger, {resultado.paginas_por_segundo:.1f} páginas/s)'
+        ))
+        self.stdout.write(
+            f'   ejercicios: {resultado.anadidos} añadidos, {resultado.cambiados} cambiados, '
+            f'{resultado.eliminados} eliminados'
+        )
+
+        if options['sin_imagenes']:
+            return
+        espejo = WgerService.espejar_imagenes(descargador, procesos=options['procesos'])
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Imágenes copiadas: {espejo.imagenes} en el catálogo, {espejo.descargadas} descargadas, '
+            f'{espejo.generadas} convertidas a WebP'
+        ))
+        if espejo.fallidas:
+            self.stdout.write(self.style.WARNING(
+                f'⚠️ {espejo.fallidas} imágenes con error: se siguen sirviendo desde wger.de'
+            ))
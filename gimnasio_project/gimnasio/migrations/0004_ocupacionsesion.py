@@ -0,0 +1,57 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def poblar_ocupacion(apps, schema_editor):
+    Reserva = apps.get_model('gimnasio', 'Reserva')
+    OcupacionSesion = apps.get_model('gimnasio', 'OcupacionSesion')
+    filas = (
+        Reserva.objects.filter(cancelada=False)
+        .values('clase_id', 'fecha', 'clase__capacidad_maxima')
+        .annotate(total=models.Count('id'))
+        .order_by()
+    )
+    OcupacionSesion.objects.bulk_create([
+        OcupacionSesion(
+            clase_id=fila['clase_id'],
+            fecha=fila['fecha'],
+            reservas_activas=fila['total'],
+            capacidad=fila['clase__capacidad_maxima'],
+        )
+        for fila in filas
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0003_remove_monitor_biografia'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='perfilusuario',
+            name='rol',
+            field=models.CharField(choices=[('admin', 'Administrador'), ('monitor', 'Monitor'), ('socio', 'Socio')], default='socio', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='OcupacionSesion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('reservas_activas', models.PositiveIntegerField(default=0)),
+                ('capacidad', models.PositiveIntegerField()),
+                ('clase', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ocupaciones', to='gimnasio.clase')),
+            ],
+            options={
+                'verbose_name': 'Ocupación de Sesión',
+                'verbose_name_plural': 'Ocupación de Sesiones',
+                'ordering': ['fecha', 'clase'],
+                'indexes': [models.Index(fields=['fecha', 'clase'], name='ocupacion_fecha_clase_idx')],
+                'unique_together': {('clase', 'fecha')},
+            },
+        ),
+        migrations.RunPython(poblar_ocupacion, migrations.RunPython.noop),
+    ]
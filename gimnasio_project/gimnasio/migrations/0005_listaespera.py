@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0004_ocupacionsesion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListaEspera',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('posicion', models.PositiveIntegerField()),
+                ('fecha_alta', models.DateTimeField(auto_now_add=True)),
+                ('clase', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lista_espera', to='gimnasio.clase')),
+                ('socio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='listas_espera', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Lista de Espera',
+                'verbose_name_plural': 'Listas de Espera',
+                'ordering': ['fecha', 'clase', 'posicion'],
+                'indexes': [models.Index(fields=['clase', 'fecha', 'posicion'], name='espera_sesion_pos_idx'), models.Index(fields=['socio', 'fecha'], name='espera_socio_fecha_idx')],
+                'unique_together': {('clase', 'fecha', 'socio')},
+            },
+        ),
+    ]
@@ -0,0 +1,159 @@
+import datetime
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+DIAS_SEMANA = ['L', 'M', 'X', 'J', 'V', 'S', 'D']
+HORIZONTE_SEMANAS = 8
+
+
+def materializar_sesiones(apps, schema_editor):
+    Clase = apps.get_model('gimnasio', 'Clase')
+    Reserva = apps.get_model('gimnasio', 'Reserva')
+    SesionClase = apps.get_model('gimnasio', 'SesionClase')
+
+    # Hora de las filas que venían del índice de ocupación
+    SesionClase.objects.update(
+        hora_inicio=Subquery(Clase.objects.filter(pk=OuterRef('clase_id')).values('hora_inicio')[:1])
+    )
+
+    # Sesiones de reservas que solo tenían filas canceladas
+    existentes = set(SesionClase.objects.values_list('clase_id', 'fecha'))
+    pendientes = (
+        Reserva.objects.values('clase_id', 'fecha', 'clase__hora_inicio', 'clase__capacidad_maxima')
+        .distinct()
+        .order_by()
+    )
+    SesionClase.objects.bulk_create([
+        SesionClase(
+            clase_id=fila['clase_id'],
+            fecha=fila['fecha'],
+            hora_inicio=fila['clase__hora_inicio'],
+            capacidad=fila['clase__capacidad_maxima'],
+        )
+        for fila in pendientes
+        if (fila['clase_id'], fila['fecha']) not in existentes
+    ], batch_size=1000)
+
+    # Horizonte inicial para las clases activas
+    hoy = datetime.date.today()
+    hasta = hoy + datetime.timedelta(weeks=HORIZONTE_SEMANAS, days=-1)
+    existentes = set(SesionClase.objects.filter(fecha__gte=hoy).values_list('clase_id', 'fecha'))
+    nuevas = []
+    for clase in Clase.objects.filter(activa=True):
+        fecha = hoy + datetime.timedelta(days=(DIAS_SEMANA.index(clase.dia_semana) - hoy.weekday()) % 7)
+        while fecha <= hasta:
+            if (clase.id, fecha) not in existentes:
+                nuevas.append(SesionClase(
+                    clase_id=clase.id, fecha=fecha, hora_inicio=clase.hora_inicio, capacidad=clase.capacidad_maxima
+                ))
+            fecha += datetime.timedelta(weeks=1)
+    SesionClase.objects.bulk_create(nuevas, batch_size=1000)
+
+
+def enlazar_sesiones(apps, schema_editor):
+    Reserva = apps.get_model('gimnasio', 'Reserva')
+    ListaEspera = apps.get_model('gimnasio', 'ListaEspera')
+    SesionClase = apps.get_model('gimnasio', 'SesionClase')
+
+    sesion = SesionClase.objects.filter(clase_id=OuterRef('clase_id'), fecha=OuterRef('fecha')).values('pk')[:1]
+    Reserva.objects.update(sesion=Subquery(sesion))
+    ListaEspera.objects.update(sesion=Subquery(sesion))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0005_listaespera'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # ===== OcupacionSesion pasa a ser la tabla de sesiones concretas =====
+        migrations.RenameModel(
+            old_name='OcupacionSesion',
+            new_name='SesionClase',
+        ),
+        migrations.AlterModelOptions(
+            name='sesionclase',
+            options={'ordering': ['fecha', 'hora_inicio'], 'verbose_name': 'Sesión de Clase', 'verbose_name_plural': 'Sesiones de Clases'},
+        ),
+        migrations.RenameIndex(
+            model_name='sesionclase',
+            new_name='sesion_fecha_clase_idx',
+            old_name='ocupacion_fecha_clase_idx',
+        ),
+        migrations.AlterField(
+            model_name='sesionclase',
+            name='clase',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sesiones', to='gimnasio.clase'),
+        ),
+        migrations.AddField(
+            model_name='sesionclase',
+            name='hora_inicio',
+            field=models.TimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='sesionclase',
+            name='activa',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.RunPython(materializar_sesiones, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='sesionclase',
+            name='hora_inicio',
+            field=models.TimeField(),
+        ),
+
+        # ===== Reservas y listas de espera apuntan a la sesión =====
+        migrations.AddField(
+            model_name='reserva',
+            name='sesion',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='gimnasio.sesionclase'),
+        ),
+        migrations.AddField(
+            model_name='listaespera',
+            name='sesion',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='lista_espera', to='gimnasio.sesionclase'),
+        ),
+        migrations.RunPython(enlazar_sesiones, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='listaespera',
+            unique_together=set(),
+        ),
+        migrations.RemoveIndex(
+            model_name='listaespera',
+            name='espera_sesion_pos_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='listaespera',
+            name='espera_socio_fecha_idx',
+        ),
+        migrations.RemoveField(
+            model_name='listaespera',
+            name='clase',
+        ),
+        migrations.RemoveField(
+            model_name='listaespera',
+            name='fecha',
+        ),
+        migrations.AlterField(
+            model_name='listaespera',
+            name='sesion',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lista_espera', to='gimnasio.sesionclase'),
+        ),
+        migrations.AlterModelOptions(
+            name='listaespera',
+            options={'ordering': ['sesion', 'posicion'], 'verbose_name': 'Lista de Espera', 'verbose_name_plural': 'Listas de Espera'},
+        ),
+        migrations.AlterUniqueTogether(
+            name='listaespera',
+            unique_together={('sesion', 'socio')},
+        ),
+        migrations.AddIndex(
+            model_name='listaespera',
+            index=models.Index(fields=['sesion', 'posicion'], name='espera_sesion_pos_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0006_sesionclase'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='clase',
+            index=models.Index(fields=['activa', 'dia_semana', 'hora_inicio'], name='clase_activa_horario_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['estado', 'fecha_pago'], name='pago_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['socio', 'estado'], name='pago_socio_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(condition=models.Q(('estado', 'pendiente')), fields=['fecha_vencimiento'], name='pago_pendiente_venc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='perfilusuario',
+            index=models.Index(fields=['rol', 'activo'], name='perfil_rol_activo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['clase', 'fecha', 'cancelada'], name='reserva_clase_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['socio', 'cancelada', 'fecha'], name='reserva_socio_activa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(condition=models.Q(('cancelada', False)), fields=['fecha'], name='reserva_fecha_activa_idx'),
+        ),
+    ]
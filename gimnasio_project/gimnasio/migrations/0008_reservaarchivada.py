@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0007_indices_consultas'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservaArchivada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reserva_id', models.PositiveIntegerField(unique=True)),
+                ('fecha', models.DateField()),
+                ('fecha_reserva', models.DateTimeField()),
+                ('asistio', models.BooleanField(default=False)),
+                ('cancelada', models.BooleanField(default=False)),
+                ('clase', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reservas_archivadas', to='gimnasio.clase')),
+                ('socio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas_archivadas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Reserva Archivada',
+                'verbose_name_plural': 'Reservas Archivadas',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['socio', 'fecha'], name='archivo_socio_fecha_idx'), models.Index(fields=['clase', 'fecha'], name='archivo_clase_fecha_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0008_reservaarchivada'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pago',
+            name='periodo',
+            field=models.CharField(blank=True, default='', max_length=7),
+        ),
+        migrations.AddConstraint(
+            model_name='pago',
+            constraint=models.UniqueConstraint(condition=models.Q(('periodo', ''), _negated=True), fields=('socio', 'tipo_pago', 'periodo'), name='pago_cuota_periodo_unica'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:05
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0009_pago_periodo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EjecucionTarea',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50)),
+                ('inicio', models.DateTimeField(default=django.utils.timezone.now)),
+                ('duracion_ms', models.PositiveIntegerField(default=0)),
+                ('filas_afectadas', models.PositiveIntegerField(default=0)),
+                ('detalle', models.CharField(blank=True, max_length=200)),
+            ],
+            options={
+                'verbose_name': 'Ejecución de Tarea',
+                'verbose_name_plural': 'Ejecuciones de Tareas',
+                'ordering': ['-inicio'],
+            },
+        ),
+        migrations.AddField(
+            model_name='perfilusuario',
+            name='tiene_pagos_vencidos',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(condition=models.Q(('estado', 'vencido')), fields=['-fecha_emision'], name='pago_vencido_emision_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ejecuciontarea',
+            index=models.Index(fields=['nombre', 'inicio'], name='tarea_nombre_inicio_idx'),
+        ),
+    ]
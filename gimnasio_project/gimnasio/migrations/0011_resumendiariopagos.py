@@ -0,0 +1,54 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:15
+
+from django.db import migrations, models
+from django.db.models import Case, Count, F, Sum, When
+
+
+def poblar_resumen(apps, schema_editor):
+    """Carga inicial del resumen con los pagos existentes (misma lógica que ResumenDiarioPagos.reconstruir)"""
+    Pago = apps.get_model('gimnasio', 'Pago')
+    ResumenDiarioPagos = apps.get_model('gimnasio', 'ResumenDiarioPagos')
+    filas = (
+        Pago.objects.annotate(fecha_resumen=Case(
+            When(estado='pagado', fecha_pago__isnull=False, then=F('fecha_pago')),
+            default=F('fecha_emision'),
+        ))
+        .values('fecha_resumen', 'tipo_pago', 'metodo_pago', 'estado')
+        .annotate(pagos=Count('id'), total=Sum('importe'))
+        .order_by()
+    )
+    ResumenDiarioPagos.objects.bulk_create([
+        ResumenDiarioPagos(fecha=fila['fecha_resumen'], tipo_pago=fila['tipo_pago'],
+                           metodo_pago=fila['metodo_pago'], estado=fila['estado'],
+                           pagos=fila['pagos'], importe=fila['total'])
+        for fila in filas.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0010_pagos_vencidos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDiarioPagos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('tipo_pago', models.CharField(choices=[('mensual', 'Cuota Mensual'), ('trimestral', 'Cuota Trimestral'), ('anual', 'Cuota Anual'), ('matricula', 'Matrícula'), ('clase_extra', 'Clase Extra'), ('otro', 'Otro')], max_length=15)),
+                ('metodo_pago', models.CharField(blank=True, choices=[('efectivo', 'Efectivo'), ('tarjeta', 'Tarjeta'), ('transferencia', 'Transferencia'), ('domiciliacion', 'Domiciliación')], max_length=15)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('pagado', 'Pagado'), ('vencido', 'Vencido'), ('cancelado', 'Cancelado')], max_length=10)),
+                ('pagos', models.IntegerField(default=0)),
+                ('importe', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+            options={
+                'verbose_name': 'Resumen diario de pagos',
+                'verbose_name_plural': 'Resúmenes diarios de pagos',
+                'indexes': [models.Index(fields=['estado', 'fecha'], name='resumen_pagos_estado_idx')],
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'tipo_pago', 'metodo_pago', 'estado'), name='resumen_pagos_clave_unica')],
+            },
+        ),
+        migrations.RunPython(poblar_resumen, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0011_resumendiariopagos'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pago',
+            name='estado',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('pagado', 'Pagado'), ('vencido', 'Vencido'), ('devuelto', 'Devuelto'), ('cancelado', 'Cancelado')], default='pendiente', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='resumendiariopagos',
+            name='estado',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('pagado', 'Pagado'), ('vencido', 'Vencido'), ('devuelto', 'Devuelto'), ('cancelado', 'Cancelado')], max_length=10),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:44
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def poblar_asistencia(apps, schema_editor):
+    """Carga inicial de los contadores (misma lógica que SesionClase.reconstruir_asistencia)"""
+    SesionClase = apps.get_model('gimnasio', 'SesionClase')
+    conteos = {}
+    for nombre in ('Reserva', 'ReservaArchivada'):
+        filas = (
+            apps.get_model('gimnasio', nombre).objects.filter(clase__isnull=False)
+            .values_list('clase_id', 'fecha')
+            .annotate(
+                reservadas=Count('id', filter=Q(cancelada=False)),
+                canceladas=Count('id', filter=Q(cancelada=True)),
+                asistencias=Count('id', filter=Q(asistio=True)),
+            )
+            .order_by()
+        )
+        for clase_id, fecha, *valores in filas.iterator():
+            anteriores = conteos.get((clase_id, fecha), (0, 0, 0))
+            conteos[(clase_id, fecha)] = tuple(a + v for a, v in zip(anteriores, valores))
+
+    sesiones = []
+    for sesion in SesionClase.objects.only('id', 'clase_id', 'fecha').iterator():
+        if (sesion.clase_id, sesion.fecha) in conteos:
+            sesion.reservadas, sesion.canceladas, sesion.asistencias = conteos[(sesion.clase_id, sesion.fecha)]
+            sesiones.append(sesion)
+    SesionClase.objects.bulk_update(sesiones, ['reservadas', 'canceladas', 'asistencias'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0012_pago_devuelto'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sesionclase',
+            name='asistencias',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='sesionclase',
+            name='canceladas',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='sesionclase',
+            name='reservadas',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(poblar_asistencia, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0013_asistencia_sesiones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoriaEjercicio',
+            fields=[
+                ('id', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('nombre', models.CharField(max_length=100)),
+            ],
+            options={
+                'verbose_name': 'Categoría de Ejercicio',
+                'verbose_name_plural': 'Categorías de Ejercicios',
+                'ordering': ['nombre'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Equipamiento',
+            fields=[
+                ('id', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('nombre', models.CharField(max_length=100)),
+            ],
+            options={
+                'verbose_name': 'Equipamiento',
+                'verbose_name_plural': 'Equipamiento',
+                'ordering': ['nombre'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ImagenEjercicio',
+            fields=[
+                ('id', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('exercise_base', models.PositiveIntegerField(db_index=True)),
+                ('url', models.URLField(max_length=500)),
+                ('es_principal', models.BooleanField(default=False)),
+            ],
+            options={
+                'verbose_name': 'Imagen de Ejercicio',
+                'verbose_name_plural': 'Imágenes de Ejercicios',
+                'ordering': ['exercise_base', 'id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Musculo',
+            fields=[
+                ('id', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('nombre', models.CharField(max_length=100)),
+            ],
+            options={
+                'verbose_name': 'Músculo',
+                'verbose_name_plural': 'Músculos',
+                'ordering': ['nombre'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Ejercicio',
+            fields=[
+                ('id', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('exercise_base', models.PositiveIntegerField(blank=True, null=True)),
+                ('nombre', models.CharField(max_length=200)),
+                ('descripcion', models.TextField(blank=True)),
+                ('imagen', models.CharField(max_length=500)),
+                ('imagen_respaldo', models.BooleanField(default=False)),
+                ('sincronizado', models.DateTimeField(auto_now=True)),
+                ('categoria', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ejercicios', to='gimnasio.categoriaejercicio')),
+                ('equipamiento', models.ManyToManyField(blank=True, related_name='ejercicios', to='gimnasio.equipamiento')),
+                ('musculos', models.ManyToManyField(blank=True, related_name='ejercicios', to='gimnasio.musculo')),
+            ],
+            options={
+                'verbose_name': 'Ejercicio',
+                'verbose_name_plural': 'Ejercicios',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0014_catalogo_ejercicios'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaginaWger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.CharField(max_length=500, unique=True)),
+                ('etag', models.CharField(blank=True, max_length=200)),
+                ('ultima_modificacion', models.CharField(blank=True, max_length=100)),
+                ('datos', models.JSONField()),
+                ('descargada', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Página de wger',
+                'verbose_name_plural': 'Páginas de wger',
+            },
+        ),
+        migrations.AddField(
+            model_name='ejercicio',
+            name='huella',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
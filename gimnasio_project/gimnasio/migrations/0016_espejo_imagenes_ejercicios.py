@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0015_sincronizacion_incremental_wger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagenejercicio',
+            name='huella',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
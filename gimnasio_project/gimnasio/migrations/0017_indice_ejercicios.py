@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0016_espejo_imagenes_ejercicios'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndiceEjercicios',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('datos', models.JSONField()),
+                ('generado', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Índice de ejercicios',
+                'verbose_name_plural': 'Índices de ejercicios',
+            },
+        ),
+    ]
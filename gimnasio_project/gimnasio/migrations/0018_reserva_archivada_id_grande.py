@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 00:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gimnasio', '0017_indice_ejercicios'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reservaarchivada',
+            name='reserva_id',
+            field=models.PositiveBigIntegerField(unique=True),
+        ),
+    ]
@@ -0,0 +1,64 @@
+import hashlib
+import os
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from PIL import Image, ImageOps
+
+# Copia local de las imágenes de los ejercicios (WgerService.espejar_imagenes).
+# Cada imagen se guarda en MEDIA_ROOT/ejercicios con el nombre de la huella de
+# su contenido: una versión completa y miniaturas de tamaño fijo en WebP. Como
+# el nombre cambia si cambia la imagen, nginx puede servirlas con caché larga.
+# Este módulo no importa modelos: generar() se ejecuta en procesos del pool.
+DIRECTORIO = 'ejercicios'
+MINIATURAS = ((320, 200), (640, 400))  # ancho x alto, recortadas como la tarjeta (object-fit: cover)
+LADO_COMPLETA = 1200
+CALIDAD = 80
+
+
+def huella(contenido):
+    """sha256 del fichero original: identifica la imagen aunque cambie de URL"""
+    return hashlib.sha256(contenido).hexdigest()
+
+
+def rutas(huella_imagen):
+    """{ancho (None = completa): ruta relativa a MEDIA_ROOT}"""
+    nombre = huella_imagen[:16]
+    return {
+        None: Path(DIRECTORIO) / f'{nombre}.webp',
+        **{ancho: Path(DIRECTORIO) / f'{nombre}-{ancho}.webp' for ancho, _ in MINIATURAS},
+    }
+
+
+def existen(raiz, huella_imagen):
+    return all((Path(raiz) / ruta).exists() for ruta in rutas(huella_imagen).values())
+
+
+def url(huella_imagen, ancho=None):
+    return f'{settings.MEDIA_URL}{rutas(huella_imagen)[ancho].as_posix()}'
+
+
+def srcset(huella_imagen):
+    return ', '.join(f'{url(huella_imagen, ancho)} {ancho}w' for ancho, _ in MINIATURAS)
+
+
+def generar(contenido, raiz, huella_imagen):
+    """Trabajo de cada proceso del pool: escribe la versión completa y las miniaturas"""
+    with Image.open(BytesIO(contenido)) as original:
+        imagen = ImageOps.exif_transpose(original)
+        imagen = imagen.convert('RGBA' if 'A' in imagen.getbands() or 'transparency' in imagen.info else 'RGB')
+
+    destino = rutas(huella_imagen)
+    completa = imagen.copy()
+    completa.thumbnail((LADO_COMPLETA, LADO_COMPLETA), Image.LANCZOS)
+    _guardar(Path(raiz) / destino[None], completa)
+    for ancho, alto in MINIATURAS:
+        _guardar(Path(raiz) / destino[ancho], ImageOps.fit(imagen, (ancho, alto), Image.LANCZOS))
+
+
+def _guardar(absoluta, imagen):
+    absoluta.parent.mkdir(parents=True, exist_ok=True)
+    temporal = absoluta.with_suffix(f'.{os.getpid()}.tmp')
+    imagen.save(temporal, 'WEBP', quality=CALIDAD, method=4)
+    os.replace(temporal, absoluta)  # atómico: nginx nunca sirve una imagen a medias
@@ -1,10 +1,13 @@
 from django.db import models
 
 # Create your models here.
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.core.validators import MinValueValidator
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from datetime import timedelta
 
 
 # ===============================
@@ -26,6 +29,8 @@ class PerfilUsuario(models.Model):
     rol = models.CharField(max_length=20, choices=ROLES, default='socio')
     activo = models.BooleanField(default=True)
     fecha_registro = models.DateTimeField(auto_now_add=True)
+    # Lo mantiene la tarea diaria marcar_vencidos
+    tiene_pagos_vencidos = models.BooleanField(default=False)
 
     def __str__(self):
         return f"{self.user.get_full_name() or self.user.username} - {self.get_rol_display()}"
@@ -33,6 +38,9 @@ class PerfilUsuario(models.Model):
     class Meta:
         verbose_name = "Perfil de Usuario"
         verbose_name_plural = "Perfiles de Usuarios"
+        indexes = [
+            models.Index(fields=['rol', 'activo'], name='perfil_rol_activo_idx'),
+        ]
 
 
 # ===============================
@@ -78,6 +86,39 @@ class Monitor(models.Model):
 # ===============================
 # CLASE
 # ===============================
+class ClaseQuerySet(models.QuerySet):
+
+    def with_availability(self, fecha_range=None):
+        """
+        Anota en la misma consulta los datos de la próxima sesión activa de cada
+        clase dentro de `fecha_range` (por defecto, los próximos 7 días):
+        `proxima_sesion`, `proxima_sesion_id`, `reservas_proxima` y
+        `plazas_libres`. Sin sesión en el rango, las plazas libres son la
+        capacidad máxima de la clase.
+        """
+        if fecha_range is None:
+            hoy = timezone.now().date()
+            fecha_range = (hoy, hoy + timedelta(days=6))
+
+        proxima = SesionClase.objects.filter(
+            clase=OuterRef('pk'),
+            activa=True,
+            fecha__range=fecha_range
+        ).order_by('fecha', 'hora_inicio')[:1]
+        libres = proxima.annotate(
+            libres=Greatest(F('capacidad') - F('reservas_activas'), Value(0))
+        ).values('libres')
+
+        return self.annotate(
+            proxima_sesion=Subquery(proxima.values('fecha')),
+            proxima_sesion_id=Subquery(proxima.values('pk')),
+            reservas_proxima=Coalesce(
+                Subquery(proxima.values('reservas_activas')), Value(0), output_field=models.IntegerField()
+            ),
+            plazas_libres=Coalesce(Subquery(libres), F('capacidad_maxima'), output_field=models.IntegerField()),
+        )
+
+
 class Clase(models.Model):
     DIAS_SEMANA = (
         ('L', 'Lunes'),
@@ -107,16 +148,21 @@ class Clase(models.Model):
     activa = models.BooleanField(default=True)
     sala = models.CharField(max_length=50, blank=True)
 
+    objects = ClaseQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.nombre} - {self.get_dia_semana_display()} {self.hora_inicio.strftime('%H:%M')}"
 
     def plazas_disponibles(self):
         """Calcula las plazas disponibles para la próxima sesión"""
-        reservas_activas = self.reservas.filter(
-            cancelada=False,
+        if hasattr(self, 'plazas_libres'):
+            # Ya anotado por Clase.objects.with_availability()
+            return self.plazas_libres
+        sesion = self.sesiones.filter(
+            activa=True,
             fecha__gte=timezone.now().date()
-        ).count()
-        return self.capacidad_maxima - reservas_activas
+        ).order_by('fecha').first()
+        return sesion.plazas_libres if sesion else self.capacidad_maxima
 
     def esta_completa(self):
         """Verifica si la clase está completa"""
@@ -126,6 +172,172 @@ class Clase(models.Model):
         verbose_name = "Clase"
         verbose_name_plural = "Clases"
         ordering = ['dia_semana', 'hora_inicio']
+        indexes = [
+            models.Index(fields=['activa', 'dia_semana', 'hora_inicio'], name='clase_activa_horario_idx'),
+        ]
+
+
+# ===============================
+# SESIÓN (clase + fecha concreta)
+# ===============================
+class SesionClase(models.Model):
+    """
+    Sesión concreta generada a partir de la plantilla semanal de Clase. Guarda
+    también su ocupación (reservas activas y capacidad) y sus contadores de
+    reservas, cancelaciones y asistencias, que se mantienen al reservar,
+    cancelar, reactivar y pasar lista. El horizonte se amplía cada día
+    (tareas.TAREAS_DIARIAS o `manage.py generar_sesiones`) y los contadores se reconstruyen con
+    `manage.py ocupacion_sesiones`.
+    """
+    HORIZONTE_SEMANAS = 8
+
+    clase = models.ForeignKey(Clase, on_delete=models.CASCADE, related_name='sesiones')
+    fecha = models.DateField()
+    hora_inicio = models.TimeField()
+    capacidad = models.PositiveIntegerField()
+    reservas_activas = models.PositiveIntegerField(default=0)
+    activa = models.BooleanField(default=True)
+    # Hechos de asistencia para los informes. A diferencia de reservas_activas,
+    # no se descuentan al archivar las reservas antiguas de la sesión.
+    reservadas = models.PositiveIntegerField(default=0)
+    canceladas = models.PositiveIntegerField(default=0)
+    asistencias = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.clase.nombre} ({self.fecha}) - {self.reservas_activas}/{self.capacidad}"
+
+    @property
+    def plazas_libres(self):
+        return max(self.capacidad - self.reservas_activas, 0)
+
+    def recalcular(self):
+        """
+        Vuelve a contar la ocupación (tabla Reserva) y los contadores de
+        asistencia (Reserva y ReservaArchivada) de la sesión
+        """
+        self.reservas_activas = self.reservas.filter(cancelada=False).count()
+        self.reservadas, self.canceladas, self.asistencias = self.contar_asistencia(
+            clase_id=self.clase_id, fecha=self.fecha
+        ).get((self.clase_id, self.fecha), (0, 0, 0))
+        self.save(update_fields=['reservas_activas', 'reservadas', 'canceladas', 'asistencias'])
+
+    @staticmethod
+    def contar_asistencia(**filtros):
+        """
+        {(clase_id, fecha): (reservadas, canceladas, asistencias)} contando
+        Reserva y ReservaArchivada, con una consulta agrupada por tabla.
+        `filtros` (p. ej. clase_id y fecha) limita las reservas que se cuentan.
+        """
+        conteos = {}
+        for modelo in (Reserva, ReservaArchivada):
+            filas = (
+                modelo.objects.filter(clase__isnull=False, **filtros)
+                .values_list('clase_id', 'fecha')
+                .annotate(
+                    reservadas=Count('id', filter=Q(cancelada=False)),
+                    canceladas=Count('id', filter=Q(cancelada=True)),
+                    asistencias=Count('id', filter=Q(asistio=True)),
+                )
+                .order_by()
+            )
+            for clase_id, fecha, *valores in filas.iterator():
+                anteriores = conteos.get((clase_id, fecha), (0, 0, 0))
+                conteos[(clase_id, fecha)] = tuple(a + v for a, v in zip(anteriores, valores))
+        return conteos
+
+    @classmethod
+    def asistencia_desincronizada(cls):
+        """[(sesión, contadores reales)] de las sesiones cuyos contadores no cuadran"""
+        conteos = cls.contar_asistencia()
+        return [
+            (sesion, conteos.get((sesion.clase_id, sesion.fecha), (0, 0, 0)))
+            for sesion in cls.objects.only('id', 'clase_id', 'fecha', 'reservadas', 'canceladas', 'asistencias')
+            if (sesion.reservadas, sesion.canceladas, sesion.asistencias)
+            != conteos.get((sesion.clase_id, sesion.fecha), (0, 0, 0))
+        ]
+
+    @classmethod
+    def reconstruir_asistencia(cls):
+        """Corrige los contadores de asistencia que no cuadran. Devuelve cuántas sesiones"""
+        with transaction.atomic():
+            sesiones = []
+            for sesion, reales in cls.asistencia_desincronizada():
+                sesion.reservadas, sesion.canceladas, sesion.asistencias = reales
+                sesiones.append(sesion)
+            cls.objects.bulk_update(sesiones, ['reservadas', 'canceladas', 'asistencias'], batch_size=1000)
+        return len(sesiones)
+
+    @staticmethod
+    def fechas_de(clase, desde, hasta):
+        """Fechas entre `desde` y `hasta` (incluidas) que caen en el día de la clase"""
+        dia = [codigo for codigo, _ in Clase.DIAS_SEMANA].index(clase.dia_semana)
+        fecha = desde + timedelta(days=(dia - desde.weekday()) % 7)
+        fechas = []
+        while fecha <= hasta:
+            fechas.append(fecha)
+            fecha += timedelta(weeks=1)
+        return fechas
+
+    @classmethod
+    def obtener(cls, clase, fecha):
+        """Devuelve la sesión de la clase en esa fecha, creándola si aún no existe"""
+        sesion, _ = cls.objects.get_or_create(
+            clase=clase,
+            fecha=fecha,
+            defaults={'hora_inicio': clase.hora_inicio, 'capacidad': clase.capacidad_maxima}
+        )
+        return sesion
+
+    @classmethod
+    def generar(cls, clases, desde=None, semanas=HORIZONTE_SEMANAS):
+        """Crea en bloque las sesiones que falten en el horizonte. Devuelve cuántas"""
+        desde = desde or timezone.now().date()
+        hasta = desde + timedelta(weeks=semanas, days=-1)
+        clases = list(clases)
+        existentes = set(
+            cls.objects.filter(clase__in=clases, fecha__range=(desde, hasta)).values_list('clase_id', 'fecha')
+        )
+        nuevas = [
+            cls(clase=clase, fecha=fecha, hora_inicio=clase.hora_inicio, capacidad=clase.capacidad_maxima)
+            for clase in clases
+            for fecha in cls.fechas_de(clase, desde, hasta)
+            if (clase.id, fecha) not in existentes
+        ]
+        cls.objects.bulk_create(nuevas, batch_size=1000, ignore_conflicts=True)
+        return len(nuevas)
+
+    @classmethod
+    def regenerar(cls, clase):
+        """
+        Ajusta solo las sesiones futuras de la clase tras editar su plantilla:
+        las que ya no caen en su día se borran (o se desactivan si tienen
+        reservas), las demás toman la hora y capacidad nuevas.
+        """
+        futuras = cls.objects.filter(clase=clase, fecha__gte=timezone.now().date())
+        if not clase.activa:
+            futuras.update(activa=False)
+            return
+
+        dia = [codigo for codigo, _ in Clase.DIAS_SEMANA].index(clase.dia_semana)
+        dia_django = (dia + 1) % 7 + 1  # __week_day: 1 = domingo ... 7 = sábado
+        obsoletas = futuras.exclude(fecha__week_day=dia_django)
+        obsoletas.filter(reservas__isnull=True).delete()
+        obsoletas.update(activa=False)
+        futuras.filter(fecha__week_day=dia_django).update(
+            hora_inicio=clase.hora_inicio,
+            capacidad=clase.capacidad_maxima,
+            activa=True
+        )
+        cls.generar([clase])
+
+    class Meta:
+        verbose_name = "Sesión de Clase"
+        verbose_name_plural = "Sesiones de Clases"
+        ordering = ['fecha', 'hora_inicio']
+        unique_together = ['clase', 'fecha']
+        indexes = [
+            models.Index(fields=['fecha', 'clase'], name='sesion_fecha_clase_idx'),
+        ]
 
 
 # ===============================
@@ -134,6 +346,7 @@ class Clase(models.Model):
 class Reserva(models.Model):
     socio = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reservas')
     clase = models.ForeignKey(Clase, on_delete=models.CASCADE, related_name='reservas')
+    sesion = models.ForeignKey(SesionClase, on_delete=models.CASCADE, null=True, blank=True, related_name='reservas')
     fecha = models.DateField()
     fecha_reserva = models.DateTimeField(auto_now_add=True)
     asistio = models.BooleanField(default=False)
@@ -144,17 +357,82 @@ class Reserva(models.Model):
         estado = "Cancelada" if self.cancelada else ("Asistió" if self.asistio else "Pendiente")
         return f"{self.socio.username} - {self.clase.nombre} ({self.fecha}) - {estado}"
 
+    def save(self, *args, **kwargs):
+        if self.sesion_id is None:
+            self.sesion = SesionClase.obtener(self.clase, self.fecha)
+        super().save(*args, **kwargs)
+
     def cancelar(self):
-        """Cancela la reserva"""
-        self.cancelada = True
-        self.fecha_cancelacion = timezone.now()
-        self.save()
+        """Cancela la reserva y libera la plaza"""
+        from .reservas_service import ReservaService
+        ReservaService.cancelar(self)
 
     class Meta:
         verbose_name = "Reserva"
         verbose_name_plural = "Reservas"
         ordering = ['-fecha', '-fecha_reserva']
         unique_together = ['socio', 'clase', 'fecha']
+        indexes = [
+            models.Index(fields=['clase', 'fecha', 'cancelada'], name='reserva_clase_fecha_idx'),
+            models.Index(fields=['socio', 'cancelada', 'fecha'], name='reserva_socio_activa_idx'),
+            # Parcial: la mayoría de consultas solo miran reservas no canceladas
+            models.Index(fields=['fecha'], condition=Q(cancelada=False), name='reserva_fecha_activa_idx'),
+        ]
+
+
+# ===============================
+# LISTA DE ESPERA (por sesión)
+# ===============================
+class ListaEspera(models.Model):
+    """
+    Cola FIFO de socios esperando plaza en una sesión completa. Al cancelarse
+    una reserva se promociona automáticamente al primero de la cola.
+    """
+    sesion = models.ForeignKey(SesionClase, on_delete=models.CASCADE, related_name='lista_espera')
+    socio = models.ForeignKey(User, on_delete=models.CASCADE, related_name='listas_espera')
+    posicion = models.PositiveIntegerField()
+    fecha_alta = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.socio.username} - {self.sesion} - posición {self.posicion}"
+
+    class Meta:
+        verbose_name = "Lista de Espera"
+        verbose_name_plural = "Listas de Espera"
+        ordering = ['sesion', 'posicion']
+        unique_together = ['sesion', 'socio']
+        indexes = [
+            models.Index(fields=['sesion', 'posicion'], name='espera_sesion_pos_idx'),
+        ]
+
+
+# ===============================
+# RESERVA ARCHIVADA (histórico frío)
+# ===============================
+class ReservaArchivada(models.Model):
+    """
+    Copia compacta de las reservas antiguas que `manage.py archivar_reservas`
+    saca de la tabla Reserva. Solo se consulta para informes históricos.
+    """
+    reserva_id = models.PositiveBigIntegerField(unique=True)  # id original: reintentar un lote no duplica
+    socio = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reservas_archivadas')
+    clase = models.ForeignKey(Clase, on_delete=models.SET_NULL, null=True, related_name='reservas_archivadas')
+    fecha = models.DateField()
+    fecha_reserva = models.DateTimeField()
+    asistio = models.BooleanField(default=False)
+    cancelada = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"{self.socio_id} - {self.clase_id} ({self.fecha})"
+
+    class Meta:
+        verbose_name = "Reserva Archivada"
+        verbose_name_plural = "Reservas Archivadas"
+        ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['socio', 'fecha'], name='archivo_socio_fecha_idx'),
+            models.Index(fields=['clase', 'fecha'], name='archivo_clase_fecha_idx'),
+        ]
 
 
 # ===============================
@@ -181,8 +459,11 @@ class Pago(models.Model):
         ('pendiente', 'Pendiente'),
         ('pagado', 'Pagado'),
         ('vencido', 'Vencido'),
+        ('devuelto', 'Devuelto'),
         ('cancelado', 'Cancelado'),
     )
+    # Estados que cuentan como deuda del socio
+    ESTADOS_PENDIENTES = ('pendiente', 'vencido', 'devuelto')
 
     socio = models.ForeignKey(User, on_delete=models.CASCADE, related_name='pagos')
     tipo_pago = models.CharField(max_length=15, choices=TIPOS_PAGO)
@@ -194,6 +475,8 @@ class Pago(models.Model):
     estado = models.CharField(max_length=10, choices=ESTADOS, default='pendiente')
     concepto = models.CharField(max_length=200)
     observaciones = models.TextField(blank=True)
+    # Cuotas periódicas: '2026-10' (mensual), '2026-T4' (trimestral), '2026' (anual). Vacío en pagos sueltos
+    periodo = models.CharField(max_length=7, blank=True, default='')
     registrado_por = models.ForeignKey(
         User,
         on_delete=models.SET_NULL,
@@ -204,6 +487,35 @@ class Pago(models.Model):
     def __str__(self):
         return f"{self.socio.username} - {self.concepto} ({self.importe}€) - {self.get_estado_display()}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        pago = super().from_db(db, field_names, values)
+        pago._resumen_guardado = pago.clave_resumen()
+        return pago
+
+    def clave_resumen(self):
+        """(fecha, tipo, método, estado) e importe con que el pago cuenta en ResumenDiarioPagos"""
+        if not {'fecha_emision', 'fecha_pago', 'tipo_pago', 'metodo_pago', 'estado', 'importe'} <= self.__dict__.keys():
+            return None  # cargado con only()/defer(): se consulta al guardar
+        fecha = self.fecha_pago if self.estado == 'pagado' and self.fecha_pago else self.fecha_emision
+        return (
+            (self._meta.get_field('fecha_emision').to_python(fecha), self.tipo_pago, self.metodo_pago, self.estado),
+            self._meta.get_field('importe').to_python(self.importe),
+        )
+
+    def save(self, *args, **kwargs):
+        # El pago y su reflejo en el resumen diario se guardan en la misma transacción
+        with transaction.atomic():
+            anterior = getattr(self, '_resumen_guardado', None)
+            if anterior is None and not self._state.adding:
+                guardado = Pago.objects.filter(pk=self.pk).first()
+                anterior = guardado.clave_resumen() if guardado else None
+            super().save(*args, **kwargs)
+            actual = self.clave_resumen() or Pago.objects.get(pk=self.pk).clave_resumen()
+            if actual != anterior:
+                ResumenDiarioPagos.mover(anterior, actual)
+        self._resumen_guardado = actual
+
     def marcar_pagado(self, metodo):
         """Marca el pago como pagado"""
         self.estado = 'pagado'
@@ -212,10 +524,293 @@ class Pago(models.Model):
         self.save()
 
     def esta_vencido(self):
-        """Verifica si el pago está vencido"""
+        """Verifica si el pago está vencido (aunque la tarea diaria aún no lo haya marcado)"""
+        if self.estado == 'vencido':
+            return True
         return self.estado == 'pendiente' and self.fecha_vencimiento < timezone.now().date()
 
     class Meta:
         verbose_name = "Pago"
         verbose_name_plural = "Pagos"
         ordering = ['-fecha_emision']
+        indexes = [
+            models.Index(fields=['estado', 'fecha_pago'], name='pago_estado_fecha_idx'),
+            models.Index(fields=['socio', 'estado'], name='pago_socio_estado_idx'),
+            # Parcial: los pendientes son pocos y se consultan en cada dashboard
+            models.Index(fields=['fecha_vencimiento'], condition=Q(estado='pendiente'), name='pago_pendiente_venc_idx'),
+            # Listado de vencidos de GestionPagosView, ya en su orden
+            models.Index(fields=['-fecha_emision'], condition=Q(estado='vencido'), name='pago_vencido_emision_idx'),
+        ]
+        constraints = [
+            # Clave de idempotencia: una cuota por socio, tipo y periodo
+            models.UniqueConstraint(
+                fields=['socio', 'tipo_pago', 'periodo'],
+                condition=~Q(periodo=''),
+                name='pago_cuota_periodo_unica'
+            ),
+        ]
+
+
+# ===============================
+# RESUMEN DIARIO DE PAGOS
+# ===============================
+def fecha_resumen():
+    """Fecha con la que un pago cuenta en el resumen: la de cobro si está pagado, si no la de emisión"""
+    return Case(
+        When(estado='pagado', fecha_pago__isnull=False, then=F('fecha_pago')),
+        default=F('fecha_emision'),
+    )
+
+
+class ResumenDiarioPagos(models.Model):
+    """
+    Número e importe de los pagos de cada día por tipo, método y estado. Los
+    totales de ingresos y pendientes se leen de aquí (unas pocas filas por
+    día) en lugar de sumar toda la tabla Pago. Se mantiene en la misma
+    transacción que cada cambio de Pago: en Pago.save, en la signal
+    post_delete y en las operaciones en bloque de CuotaService.
+    """
+    fecha = models.DateField()
+    tipo_pago = models.CharField(max_length=15, choices=Pago.TIPOS_PAGO)
+    metodo_pago = models.CharField(max_length=15, choices=Pago.METODOS_PAGO, blank=True)
+    estado = models.CharField(max_length=10, choices=Pago.ESTADOS)
+    pagos = models.IntegerField(default=0)
+    importe = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.fecha} {self.tipo_pago}/{self.metodo_pago or '-'} {self.estado}: {self.pagos} ({self.importe}€)"
+
+    @classmethod
+    def total(cls, **filtros):
+        """Suma de importes de las filas que cumplen los filtros"""
+        return cls.objects.filter(**filtros).aggregate(total=Sum('importe'))['total'] or 0
+
+    @classmethod
+    def sumar(cls, clave, pagos, importe):
+        """Suma `pagos` e `importe` (pueden ser negativos) a la fila de la clave"""
+        fecha, tipo_pago, metodo_pago, estado = clave
+        fila = cls.objects.filter(fecha=fecha, tipo_pago=tipo_pago, metodo_pago=metodo_pago, estado=estado)
+        cambios = {'pagos': F('pagos') + pagos, 'importe': F('importe') + importe}
+        if fila.update(**cambios):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(fecha=fecha, tipo_pago=tipo_pago, metodo_pago=metodo_pago, estado=estado,
+                                   pagos=pagos, importe=importe)
+        except IntegrityError:
+            # Otra transacción creó la fila entre medias
+            fila.update(**cambios)
+
+    @classmethod
+    def mover(cls, anterior, actual):
+        """Aplica el cambio de un pago: (clave, importe) antes y después (None si no existía / ya no existe)"""
+        if anterior is not None:
+            cls.sumar(anterior[0], -1, -anterior[1])
+        if actual is not None:
+            cls.sumar(actual[0], 1, actual[1])
+
+    @classmethod
+    def recalcular(cls, clave):
+        """
+        Vuelve a contar una fila desde la tabla Pago. La fila se bloquea antes
+        de contar, así que los cambios concurrentes se suman después encima.
+        """
+        fecha, tipo_pago, metodo_pago, estado = clave
+        with transaction.atomic():
+            fila, _ = cls.objects.select_for_update().get_or_create(
+                fecha=fecha, tipo_pago=tipo_pago, metodo_pago=metodo_pago, estado=estado
+            )
+            totales = Pago.objects.annotate(fecha_resumen=fecha_resumen()).filter(
+                fecha_resumen=fecha, tipo_pago=tipo_pago, metodo_pago=metodo_pago, estado=estado
+            ).aggregate(pagos=Count('id'), importe=Sum('importe'))
+            fila.pagos = totales['pagos']
+            fila.importe = totales['importe'] or 0
+            fila.save(update_fields=['pagos', 'importe'])
+
+    @classmethod
+    def reconstruir(cls):
+        """Rehace el resumen completo desde Pago (carga inicial o reparación). Devuelve las filas creadas"""
+        filas = (
+            Pago.objects.annotate(fecha_resumen=fecha_resumen())
+            .values('fecha_resumen', 'tipo_pago', 'metodo_pago', 'estado')
+            .annotate(pagos=Count('id'), total=Sum('importe'))
+            .order_by()
+        )
+        with transaction.atomic():
+            cls.objects.all().delete()
+            creadas = cls.objects.bulk_create([
+                cls(fecha=fila['fecha_resumen'], tipo_pago=fila['tipo_pago'], metodo_pago=fila['metodo_pago'],
+                    estado=fila['estado'], pagos=fila['pagos'], importe=fila['total'])
+                for fila in filas.iterator()
+            ], batch_size=1000)
+        return len(creadas)
+
+    class Meta:
+        verbose_name = "Resumen diario de pagos"
+        verbose_name_plural = "Resúmenes diarios de pagos"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['fecha', 'tipo_pago', 'metodo_pago', 'estado'], name='resumen_pagos_clave_unica'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['estado', 'fecha'], name='resumen_pagos_estado_idx'),
+        ]
+
+
+# ===============================
+# EJECUCIÓN DE TAREAS PROGRAMADAS
+# ===============================
+class EjecucionTarea(models.Model):
+    """Registro de cada ejecución de una tarea diaria (ver gimnasio/tareas.py)"""
+    nombre = models.CharField(max_length=50)
+    inicio = models.DateTimeField(default=timezone.now)
+    duracion_ms = models.PositiveIntegerField(default=0)
+    filas_afectadas = models.PositiveIntegerField(default=0)
+    detalle = models.CharField(max_length=200, blank=True)
+
+    def __str__(self):
+        return f"{self.nombre} {self.inicio:%d/%m/%Y %H:%M} - {self.filas_afectadas} filas"
+
+    class Meta:
+        verbose_name = "Ejecución de Tarea"
+        verbose_name_plural = "Ejecuciones de Tareas"
+        ordering = ['-inicio']
+        indexes = [
+            models.Index(fields=['nombre', 'inicio'], name='tarea_nombre_inicio_idx'),
+        ]
+
+
+# ===============================
+# CATÁLOGO DE EJERCICIOS (copia local de wger)
+# ===============================
+# Lo rellena `manage.py sync_wger`; las rutinas se sirven desde aquí, sin
+# llamar a wger.de en cada petición. Los ids son los de wger.
+class CategoriaEjercicio(models.Model):
+    id = models.PositiveIntegerField(primary_key=True)
+    nombre = models.CharField(max_length=100)
+
+    def __str__(self):
+        return self.nombre
+
+    class Meta:
+        verbose_name = "Categoría de Ejercicio"
+        verbose_name_plural = "Categorías de Ejercicios"
+        ordering = ['nombre']
+
+
+class Musculo(models.Model):
+    id = models.PositiveIntegerField(primary_key=True)
+    nombre = models.CharField(max_length=100)
+
+    def __str__(self):
+        return self.nombre
+
+    class Meta:
+        verbose_name = "Músculo"
+        verbose_name_plural = "Músculos"
+        ordering = ['nombre']
+
+
+class Equipamiento(models.Model):
+    id = models.PositiveIntegerField(primary_key=True)
+    nombre = models.CharField(max_length=100)
+
+    def __str__(self):
+        return self.nombre
+
+    class Meta:
+        verbose_name = "Equipamiento"
+        verbose_name_plural = "Equipamiento"
+        ordering = ['nombre']
+
+
+class Ejercicio(models.Model):
+    """
+    Ejercicio del catálogo ya fusionado con CATEGORIAS_RESPALDO: nombre,
+    descripción e imagen son los definitivos que se muestran al socio.
+    """
+    id = models.PositiveIntegerField(primary_key=True)
+    exercise_base = models.PositiveIntegerField(null=True, blank=True)
+    nombre = models.CharField(max_length=200)
+    descripcion = models.TextField(blank=True)
+    categoria = models.ForeignKey(
+        CategoriaEjercicio, on_delete=models.SET_NULL, null=True, blank=True, related_name='ejercicios'
+    )
+    musculos = models.ManyToManyField(Musculo, blank=True, related_name='ejercicios')
+    equipamiento = models.ManyToManyField(Equipamiento, blank=True, related_name='ejercicios')
+    imagen = models.CharField(max_length=500)
+    imagen_respaldo = models.BooleanField(default=False)
+    huella = models.CharField(max_length=64, blank=True)  # sha256 del registro: si no cambia, no se reescribe
+    sincronizado = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.nombre
+
+    class Meta:
+        verbose_name = "Ejercicio"
+        verbose_name_plural = "Ejercicios"
+        ordering = ['id']
+
+
+class ImagenEjercicio(models.Model):
+    """Imágenes de wger tal cual; la principal de cada exercise_base se copia a Ejercicio.imagen"""
+    id = models.PositiveIntegerField(primary_key=True)
+    exercise_base = models.PositiveIntegerField(db_index=True)
+    url = models.URLField(max_length=500)
+    es_principal = models.BooleanField(default=False)
+    # sha256 del fichero copiado a MEDIA_ROOT/ejercicios (vacío = aún sin copia local)
+    huella = models.CharField(max_length=64, blank=True)
+
+    def __str__(self):
+        return self.url
+
+    class Meta:
+        verbose_name = "Imagen de Ejercicio"
+        verbose_name_plural = "Imágenes de Ejercicios"
+        ordering = ['exercise_base', 'id']
+
+
+class PaginaWger(models.Model):
+    """
+    Última respuesta de cada página de la API de wger, con sus validadores
+    (ETag / Last-Modified) para que la siguiente sincronización haga
+    peticiones condicionales y reutilice el contenido si recibe un 304.
+    """
+    url = models.CharField(max_length=500, unique=True)
+    etag = models.CharField(max_length=200, blank=True)
+    ultima_modificacion = models.CharField(max_length=100, blank=True)
+    datos = models.JSONField()
+    descargada = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.url
+
+    @classmethod
+    def guardadas(cls):
+        """{url: (etag, ultima_modificacion, datos)} para Descargador.cache"""
+        return {
+            pagina.url: (pagina.etag, pagina.ultima_modificacion, pagina.datos)
+            for pagina in cls.objects.all()
+        }
+
+    class Meta:
+        verbose_name = "Página de wger"
+        verbose_name_plural = "Páginas de wger"
+
+
+class IndiceEjercicios(models.Model):
+    """
+    Índices invertidos del catálogo para la búsqueda de rutinas, generados al
+    sincronizar (una sola fila): cada valor de faceta y cada palabra del
+    nombre apunta a la lista ordenada de ids de ejercicio que lo tienen.
+    """
+    datos = models.JSONField()
+    generado = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Índice del catálogo ({self.generado:%d/%m/%Y %H:%M})"
+
+    class Meta:
+        verbose_name = "Índice de ejercicios"
+        verbose_name_plural = "Índices de ejercicios"
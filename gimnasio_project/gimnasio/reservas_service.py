@@ -0,0 +1,272 @@
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date, timedelta
+from enum import Enum
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from .estadisticas_service import EstadisticasService
+from .models import Reserva, SesionClase, ListaEspera
+
+
+class EstadoAdmision(Enum):
+    RESERVADA = 'reservada'
+    COMPLETA = 'completa'
+    DUPLICADA = 'duplicada'
+    EN_ESPERA = 'en_espera'
+
+
+@dataclass
+class ResultadoReserva:
+    estado: EstadoAdmision
+    fecha: date
+    reserva: Reserva | None = None
+    reactivada: bool = False
+    espera: ListaEspera | None = None
+
+    @property
+    def reservada(self):
+        return self.estado is EstadoAdmision.RESERVADA
+
+
+class _ReservaDuplicada(Exception):
+    """Otra petición del mismo socio ganó la carrera: deshace la admisión"""
+
+
+# SQLite no tiene bloqueo de fila; dentro del proceso serializamos las admisiones
+_bloqueo_sqlite = threading.Lock()
+
+
+@contextmanager
+def seccion_critica():
+    if connection.vendor == 'sqlite':
+        with _bloqueo_sqlite, transaction.atomic():
+            yield
+    else:
+        with transaction.atomic():
+            yield
+
+
+class ReservaService:
+    """
+    Punto único para crear, reactivar y cancelar reservas. La admisión es un
+    UPDATE condicional sobre SesionClase (reservas_activas < capacidad): en
+    PostgreSQL el propio UPDATE bloquea la fila hasta el commit, así que las
+    peticiones concurrentes de la misma sesión se atienden de una en una.
+    """
+
+    @classmethod
+    def reservar(cls, socio, sesion):
+        """Intenta reservar una plaza en la sesión y devuelve un ResultadoReserva"""
+        try:
+            with seccion_critica():
+                existente = Reserva.objects.filter(socio=socio, clase_id=sesion.clase_id, fecha=sesion.fecha).first()
+                if existente and not existente.cancelada:
+                    return ResultadoReserva(EstadoAdmision.DUPLICADA, sesion.fecha, existente)
+
+                admitida = SesionClase.objects.filter(
+                    pk=sesion.pk,
+                    activa=True,
+                    reservas_activas__lt=F('capacidad')
+                ).update(reservas_activas=F('reservas_activas') + 1, reservadas=F('reservadas') + 1)
+                if not admitida:
+                    return ResultadoReserva(EstadoAdmision.COMPLETA, sesion.fecha)
+
+                if existente:
+                    reactivadas = Reserva.objects.filter(pk=existente.pk, cancelada=True).update(
+                        cancelada=False, fecha_cancelacion=None, sesion=sesion
+                    )
+                    if not reactivadas:
+                        raise _ReservaDuplicada
+                    SesionClase.objects.filter(pk=sesion.pk).update(canceladas=F('canceladas') - 1)
+                    existente.cancelada = False
+                    existente.fecha_cancelacion = None
+                    cls._salir_lista_espera(socio, sesion.pk)
+                    EstadisticasService.invalidar_al_confirmar()
+                    return ResultadoReserva(EstadoAdmision.RESERVADA, sesion.fecha, existente, reactivada=True)
+
+                try:
+                    with transaction.atomic():
+                        reserva = Reserva.objects.create(
+                            socio=socio, clase_id=sesion.clase_id, sesion=sesion, fecha=sesion.fecha
+                        )
+                except IntegrityError:
+                    raise _ReservaDuplicada
+                cls._salir_lista_espera(socio, sesion.pk)
+                return ResultadoReserva(EstadoAdmision.RESERVADA, sesion.fecha, reserva)
+        except _ReservaDuplicada:
+            existente = Reserva.objects.filter(socio=socio, clase_id=sesion.clase_id, fecha=sesion.fecha).first()
+            return ResultadoReserva(EstadoAdmision.DUPLICADA, sesion.fecha, existente)
+
+    @classmethod
+    def reservar_serie(cls, socio, sesion, semanas):
+        """
+        Reserva la misma clase `semanas` semanas seguidas desde `sesion`.
+        La capacidad de todas las sesiones se comprueba en una consulta (con
+        SELECT ... FOR UPDATE en PostgreSQL) y las reservas nuevas se insertan
+        con un único bulk_create. Devuelve un ResultadoReserva por fecha.
+        """
+        clase = sesion.clase
+        fechas = [sesion.fecha + timedelta(weeks=i) for i in range(semanas)]
+
+        with seccion_critica():
+            # Las semanas más allá del horizonte generado se materializan aquí
+            SesionClase.generar([clase], desde=sesion.fecha, semanas=semanas)
+
+            sesiones = {
+                s.fecha: s
+                for s in SesionClase.objects.select_for_update().filter(clase=clase, fecha__in=fechas)
+            }
+            reservas_socio = {
+                reserva.fecha: reserva
+                for reserva in Reserva.objects.filter(socio=socio, clase=clase, fecha__in=fechas)
+            }
+
+            resultados = []
+            nuevas, reactivadas, admitidas, reabiertas = [], [], [], []
+            for fecha in fechas:
+                sesion_fecha = sesiones[fecha]
+                existente = reservas_socio.get(fecha)
+                if existente and not existente.cancelada:
+                    resultados.append(ResultadoReserva(EstadoAdmision.DUPLICADA, fecha, existente))
+                elif not sesion_fecha.activa or sesion_fecha.reservas_activas >= sesion_fecha.capacidad:
+                    resultados.append(ResultadoReserva(EstadoAdmision.COMPLETA, fecha))
+                elif existente:
+                    existente.cancelada = False
+                    existente.fecha_cancelacion = None
+                    reactivadas.append(existente)
+                    admitidas.append(sesion_fecha.pk)
+                    reabiertas.append(sesion_fecha.pk)
+                    resultados.append(ResultadoReserva(EstadoAdmision.RESERVADA, fecha, existente, reactivada=True))
+                else:
+                    reserva = Reserva(socio=socio, clase=clase, sesion=sesion_fecha, fecha=fecha)
+                    nuevas.append(reserva)
+                    admitidas.append(sesion_fecha.pk)
+                    resultados.append(ResultadoReserva(EstadoAdmision.RESERVADA, fecha, reserva))
+
+            if nuevas:
+                Reserva.objects.bulk_create(nuevas)
+            if reactivadas:
+                Reserva.objects.filter(pk__in=[r.pk for r in reactivadas]).update(
+                    cancelada=False, fecha_cancelacion=None
+                )
+                SesionClase.objects.filter(pk__in=reabiertas).update(canceladas=F('canceladas') - 1)
+            if admitidas:
+                SesionClase.objects.filter(pk__in=admitidas).update(
+                    reservas_activas=F('reservas_activas') + 1, reservadas=F('reservadas') + 1
+                )
+                # Como en reservar(): quien entra en la sesión deja su sitio en la cola
+                en_espera = ListaEspera.objects.filter(socio=socio, sesion_id__in=admitidas)
+                for sesion_id in en_espera.values_list('sesion_id', flat=True):
+                    cls._salir_lista_espera(socio, sesion_id)
+                EstadisticasService.invalidar_al_confirmar()
+
+        return resultados
+
+    @classmethod
+    def cancelar(cls, reserva):
+        """
+        Cancela la reserva y, en la misma transacción, cede la plaza al primero
+        de la lista de espera. Devuelve False si ya estaba cancelada.
+        """
+        ahora = timezone.now()
+        with seccion_critica():
+            canceladas = Reserva.objects.filter(pk=reserva.pk, cancelada=False).update(
+                cancelada=True, fecha_cancelacion=ahora
+            )
+            if canceladas:
+                cambios = {'reservadas': F('reservadas') - 1, 'canceladas': F('canceladas') + 1}
+                # Si alguien de la lista de espera ocupa la plaza, la ocupación no cambia
+                if not cls._promocionar_lista_espera(reserva.sesion_id):
+                    cambios['reservas_activas'] = F('reservas_activas') - 1
+                SesionClase.objects.filter(pk=reserva.sesion_id).update(**cambios)
+                EstadisticasService.invalidar_al_confirmar()
+
+        reserva.cancelada = True
+        if canceladas:
+            reserva.fecha_cancelacion = ahora
+        return bool(canceladas)
+
+    # ===== ASISTENCIA =====
+    @staticmethod
+    def registrar_asistencia(sesion, asistentes):
+        """
+        Deja la asistencia de la sesión igual a `asistentes` (ids de reserva):
+        un UPDATE ... WHERE id IN para los presentes y otro para el resto.
+        Solo toca filas cuyo valor cambia, así que reenviar la misma lista no
+        escribe nada. Devuelve (marcadas, desmarcadas).
+        """
+        activas = Reserva.objects.filter(sesion=sesion, cancelada=False)
+        with transaction.atomic():
+            marcadas = activas.filter(id__in=asistentes).exclude(asistio=True).update(asistio=True)
+            desmarcadas = activas.exclude(id__in=asistentes).filter(asistio=True).update(asistio=False)
+            if marcadas != desmarcadas:
+                SesionClase.objects.filter(pk=sesion.pk).update(
+                    asistencias=F('asistencias') + marcadas - desmarcadas
+                )
+        return marcadas, desmarcadas
+
+    # ===== LISTA DE ESPERA =====
+    @classmethod
+    def apuntar_lista_espera(cls, socio, sesion):
+        """Añade al socio al final de la cola de la sesión (o devuelve su entrada actual)"""
+        with seccion_critica():
+            # Bloquear la sesión serializa las altas y evita posiciones repetidas
+            list(SesionClase.objects.select_for_update().filter(pk=sesion.pk))
+
+            espera = ListaEspera.objects.filter(sesion=sesion, socio=socio).first()
+            if espera is None:
+                ultima = ListaEspera.objects.filter(sesion=sesion).aggregate(
+                    ultima=Max('posicion')
+                )['ultima'] or 0
+                espera = ListaEspera.objects.create(sesion=sesion, socio=socio, posicion=ultima + 1)
+        return ResultadoReserva(EstadoAdmision.EN_ESPERA, sesion.fecha, espera=espera)
+
+    @classmethod
+    def salir_lista_espera(cls, espera):
+        with seccion_critica():
+            cls._salir_lista_espera(espera.socio_id, espera.sesion_id)
+
+    @staticmethod
+    def _salir_lista_espera(socio, sesion_id):
+        espera = ListaEspera.objects.filter(sesion_id=sesion_id, socio=socio).first()
+        if espera is None:
+            return
+        espera.delete()
+        ListaEspera.objects.filter(
+            sesion_id=sesion_id, posicion__gt=espera.posicion
+        ).update(posicion=F('posicion') - 1)
+
+    @classmethod
+    def _promocionar_lista_espera(cls, sesion_id):
+        """
+        Da la plaza liberada al primero de la cola. Se salta a quien ya tenga
+        una reserva activa para la sesión. Devuelve la reserva promocionada.
+        """
+        cola = list(ListaEspera.objects.select_for_update().filter(sesion_id=sesion_id).order_by('posicion'))
+        if not cola:
+            return None
+
+        sesion = SesionClase.objects.get(pk=sesion_id)
+        for espera in cola:
+            reserva = Reserva.objects.filter(
+                socio_id=espera.socio_id, clase_id=sesion.clase_id, fecha=sesion.fecha
+            ).first()
+            cls._salir_lista_espera(espera.socio_id, sesion_id)
+            if reserva is None:
+                SesionClase.objects.filter(pk=sesion_id).update(reservadas=F('reservadas') + 1)
+                return Reserva.objects.create(
+                    socio_id=espera.socio_id, clase_id=sesion.clase_id, sesion=sesion, fecha=sesion.fecha
+                )
+            if reserva.cancelada:
+                reserva.cancelada = False
+                reserva.fecha_cancelacion = None
+                reserva.save(update_fields=['cancelada', 'fecha_cancelacion'])
+                SesionClase.objects.filter(pk=sesion_id).update(
+                    reservadas=F('reservadas') + 1, canceladas=F('canceladas') - 1
+                )
+                return reserva
+        return None
@@ -1,9 +1,28 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import PerfilUsuario
+from django.db.models import F
+from .models import PerfilUsuario, Monitor, Clase, Reserva, SesionClase, Pago, ResumenDiarioPagos
+from .estadisticas_service import EstadisticasService
 from .email_service import EmailService
+from . import facturas
 import random, string
+import threading
+from contextlib import contextmanager
+
+# Borrados en bloque que ajustan ellos mismos los contadores de SesionClase (ArchivoService)
+_sin_descontar = threading.local()
+
+
+@contextmanager
+def sin_descontar_reservas():
+    """Dentro del bloque, borrar reservas no toca los contadores de sus sesiones"""
+    _sin_descontar.activo = True
+    try:
+        yield
+    finally:
+        _sin_descontar.activo = False
+
 
 @receiver(post_save, sender=User)
 def crear_perfil_y_enviar_email(sender, instance, created, **kwargs):
@@ -38,4 +57,55 @@ def crear_perfil_y_enviar_email(sender, instance, created, **kwargs):
     instance.save(update_fields=['password'])
 
     # Enviar email de bienvenida
-    EmailService.enviar_bienvenida_socio(instance, password_generada)
\ No newline at end of file
+    EmailService.enviar_bienvenida_socio(instance, password_generada)
+
+
+@receiver(post_save, sender=Clase)
+def regenerar_sesiones_clase(sender, instance, created, **kwargs):
+    """Materializa las sesiones de una clase nueva o ajusta las futuras si se edita"""
+    if created:
+        SesionClase.generar([instance])
+    else:
+        SesionClase.regenerar(instance)
+
+
+@receiver(post_delete, sender=Reserva)
+def descontar_reserva_borrada(sender, instance, **kwargs):
+    """Libera la plaza de la sesión si se borra una reserva activa y la quita de sus contadores"""
+    if not instance.sesion_id or getattr(_sin_descontar, 'activo', False):
+        return
+    if instance.cancelada:
+        cambios = {'canceladas': F('canceladas') - 1}
+    else:
+        cambios = {'reservas_activas': F('reservas_activas') - 1, 'reservadas': F('reservadas') - 1}
+    if instance.asistio:
+        cambios['asistencias'] = F('asistencias') - 1
+    SesionClase.objects.filter(pk=instance.sesion_id).update(**cambios)
+
+
+@receiver(post_save, sender=Pago)
+def invalidar_factura_editada(sender, instance, created, **kwargs):
+    """Descarta los PDF guardados de un pago que se edita (se regeneran al descargar)"""
+    if not created:
+        facturas.invalidar(instance.pk)
+
+
+@receiver(post_delete, sender=Pago)
+def borrar_factura(sender, instance, **kwargs):
+    facturas.invalidar(instance.pk)
+
+
+@receiver(post_delete, sender=Pago)
+def descontar_pago_borrado(sender, instance, **kwargs):
+    """Quita el pago del resumen diario (el borrado ya va dentro de una transacción)"""
+    ResumenDiarioPagos.mover(getattr(instance, '_resumen_guardado', None) or instance.clave_resumen(), None)
+
+
+@receiver([post_save, post_delete], sender=PerfilUsuario)
+@receiver([post_save, post_delete], sender=Monitor)
+@receiver([post_save, post_delete], sender=Clase)
+@receiver([post_save, post_delete], sender=Reserva)
+@receiver([post_save, post_delete], sender=Pago)
+def invalidar_estadisticas(sender, **kwargs):
+    """Los cambios en bloque (update/bulk_create) invalidan desde sus servicios"""
+    EstadisticasService.invalidar_al_confirmar()
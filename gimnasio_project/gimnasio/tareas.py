@@ -0,0 +1,64 @@
+import logging
+import threading
+import time
+
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .cuotas_service import CuotaService
+from .models import Clase, EjecucionTarea, SesionClase
+
+logger = logging.getLogger(__name__)
+
+# Tareas que se ejecutan una vez al día: nombre -> función que devuelve las filas afectadas
+TAREAS_DIARIAS = {
+    'marcar_vencidos': CuotaService.marcar_vencidos,
+    # Mantiene el horizonte de sesiones reservables aunque nadie edite las clases
+    'generar_sesiones': lambda: SesionClase.generar(Clase.objects.filter(activa=True)),
+}
+
+INTERVALO_COMPROBACION = 3600  # segundos entre comprobaciones del programador
+
+
+def ejecutar(nombre):
+    """Ejecuta la tarea y deja constancia en EjecucionTarea"""
+    inicio = timezone.now()
+    reloj = time.perf_counter()
+    filas = TAREAS_DIARIAS[nombre]()
+    return EjecucionTarea.objects.create(
+        nombre=nombre,
+        inicio=inicio,
+        duracion_ms=int((time.perf_counter() - reloj) * 1000),
+        filas_afectadas=filas,
+    )
+
+
+def ejecutar_pendientes():
+    """Ejecuta las tareas diarias que aún no han corrido hoy"""
+    hoy = timezone.localdate()
+    for nombre in TAREAS_DIARIAS:
+        if not EjecucionTarea.objects.filter(nombre=nombre, inicio__date=hoy).exists():
+            ejecucion = ejecutar(nombre)
+            logger.info(f'⏰ {nombre}: {ejecucion.filas_afectadas} filas en {ejecucion.duracion_ms} ms')
+
+
+def _bucle():
+    while True:
+        try:
+            ejecutar_pendientes()
+        except Exception:
+            logger.exception('❌ Error en las tareas programadas')
+        finally:
+            close_old_connections()
+        time.sleep(INTERVALO_COMPROBACION)
+
+
+def iniciar_programador():
+    """
+    Arranca en segundo plano la comprobación periódica. Si hay varios procesos
+    (workers), el registro de EjecucionTarea evita repetir la tarea en el día,
+    y aunque coincidan dos, el UPDATE es idempotente.
+    """
+    hilo = threading.Thread(target=_bucle, name='tareas-gimnasio', daemon=True)
+    hilo.start()
+    return hilo
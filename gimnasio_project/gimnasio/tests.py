@@ -1,8 +1,48 @@
-from django.test import TestCase
+from django.apps import apps
+from django.conf import settings
+from django.test import TestCase, TransactionTestCase, override_settings, tag
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.urls import reverse
 from django.utils import timezone
-from .models import PerfilUsuario, Monitor, Clase, Reserva, Pago
+from .models import (
+    PerfilUsuario, Monitor, Clase, Reserva, Pago, SesionClase, ListaEspera, ReservaArchivada, EjecucionTarea,
+    ResumenDiarioPagos, Ejercicio, ImagenEjercicio, PaginaWger
+)
+from .reservas_service import ReservaService, EstadoAdmision
+from .cuotas_service import CuotaService
+from .informes_service import InformeService, sumar_meses
+from .conciliacion_service import ConciliacionService
+from .estadisticas_service import EstadisticasService
+from .archivo_service import ArchivoService
+from .wger_service import Descargador, WgerService
+from .buscador_service import BuscadorEjercicios
+from . import tareas, facturas, miniaturas
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
+import time
+from io import BytesIO, StringIO
+import csv
+import importlib
+import sys
+import hashlib
+import json
+import logging
+from pathlib import Path
+import tempfile
+import zipfile
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import requests
+from openpyxl import load_workbook
+from PIL import Image
+
+logger = logging.getLogger(__name__)
 
 class GimnasioTestCase(TestCase):
 
@@ -102,3 +142,1689 @@ class GimnasioTestCase(TestCase):
 from django.test import TestCase
 
 # Create your tests here.
+
+
+# ===============================
+# UTILIDADES PARA LOS TESTS
+# ===============================
+def crear_socio(username, **extra):
+    """Crea un socio sin enviar el email de bienvenida (la signal crea el perfil)"""
+    with mock.patch('gimnasio.signals.EmailService.enviar_bienvenida_socio'):
+        return User.objects.create_user(username=username, password="test1234", **extra)
+
+
+def proxima_fecha(dia_semana):
+    """Próxima fecha (hoy incluido) que cae en el día de la semana dado ('L'...'D')"""
+    hoy = timezone.now().date()
+    objetivo = ['L', 'M', 'X', 'J', 'V', 'S', 'D'].index(dia_semana)
+    return hoy + timedelta(days=(objetivo - hoy.weekday()) % 7)
+
+
+class BaseReservasTestCase(TestCase):
+
+    def setUp(self):
+        self.monitor = Monitor.objects.create(
+            nombre="Carlos", apellidos="Lopez", dni="12345678A",
+            telefono="987654321", email="carlos@example.com", especialidad="yoga"
+        )
+        self.clase = Clase.objects.create(
+            nombre="Spinning", descripcion="Ciclo indoor", monitor=self.monitor,
+            dia_semana="L", hora_inicio="10:00", duracion_minutos=60, capacidad_maxima=3
+        )
+        self.socio = crear_socio("socio.test")
+        self.fecha = proxima_fecha("L")
+        self.sesion = SesionClase.obtener(self.clase, self.fecha)
+
+
+# ===============================
+# SESIONES Y OCUPACIÓN
+# ===============================
+class SesionClaseTestCase(BaseReservasTestCase):
+
+    def ocupacion(self):
+        self.sesion.refresh_from_db()
+        return self.sesion
+
+    def test_reservar_cancelar_y_reactivar_actualizan_ocupacion(self):
+        self.client.force_login(self.socio)
+        self.client.post(reverse('gimnasio:mis_reservas'), {'sesion_id': self.sesion.id})
+        self.assertEqual(self.ocupacion().reservas_activas, 1)
+
+        reserva = Reserva.objects.get(socio=self.socio)
+        reserva.cancelar()
+        self.assertEqual(self.ocupacion().reservas_activas, 0)
+
+        reserva = ReservaService.reservar(self.socio, self.sesion).reserva
+        self.assertEqual(self.ocupacion().reservas_activas, 1)
+
+        reserva.delete()
+        self.assertEqual(self.ocupacion().reservas_activas, 0)
+
+    def test_la_tarea_diaria_amplia_el_horizonte(self):
+        lejana = self.fecha + timedelta(weeks=SesionClase.HORIZONTE_SEMANAS + 2)
+        self.assertFalse(SesionClase.objects.filter(clase=self.clase, fecha=lejana).exists())
+
+        # Tres semanas después, sin que nadie haya tocado la clase
+        dentro_de_tres_semanas = timezone.now() + timedelta(weeks=3)
+        with mock.patch('django.utils.timezone.now', return_value=dentro_de_tres_semanas):
+            tareas.ejecutar_pendientes()
+
+        sesion = SesionClase.objects.get(clase=self.clase, fecha=lejana)
+        resultado = ReservaService.reservar(self.socio, sesion)
+        self.assertEqual(resultado.estado, EstadoAdmision.RESERVADA)
+        self.assertTrue(EjecucionTarea.objects.filter(nombre='generar_sesiones').exists())
+
+    def test_cambio_de_capacidad_se_propaga(self):
+        self.sesion.recalcular()
+        self.clase.capacidad_maxima = 10
+        self.clase.save()
+        self.assertEqual(self.ocupacion().capacidad, 10)
+
+    def test_alta_de_clase_genera_horizonte(self):
+        sesiones = SesionClase.objects.filter(clase=self.clase)
+        self.assertEqual(sesiones.count(), SesionClase.HORIZONTE_SEMANAS)
+        self.assertTrue(all(s.fecha.weekday() == 0 for s in sesiones))
+
+    def test_cambio_de_dia_regenera_sesiones_futuras(self):
+        reservada = SesionClase.obtener(self.clase, self.fecha + timedelta(weeks=1))
+        ReservaService.reservar(self.socio, reservada)
+
+        self.clase.dia_semana = "X"
+        self.clase.hora_inicio = "18:30"
+        self.clase.save()
+
+        sesiones = SesionClase.objects.filter(clase=self.clase)
+        # Solo sobrevive, desactivada, la sesión del lunes que tenía una reserva
+        self.assertEqual(list(sesiones.filter(activa=False)), [reservada])
+        nuevas = sesiones.filter(activa=True)
+        self.assertEqual(nuevas.count(), SesionClase.HORIZONTE_SEMANAS)
+        self.assertTrue(all(s.fecha.weekday() == 2 and str(s.hora_inicio) == "18:30:00" for s in nuevas))
+
+    def test_comando_generar_sesiones(self):
+        SesionClase.objects.all().delete()
+        call_command('generar_sesiones', '--semanas', 2, stdout=StringIO())
+        self.assertEqual(SesionClase.objects.filter(clase=self.clase).count(), 2)
+
+    def test_mis_reservas_no_cuenta_por_fecha(self):
+        for i in range(5):
+            Clase.objects.create(
+                nombre=f"Clase {i}", descripcion="-", monitor=self.monitor,
+                dia_semana="LMXJV"[i], hora_inicio="18:00", duracion_minutos=45, capacidad_maxima=10
+            )
+        self.client.force_login(self.socio)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('gimnasio:mis_reservas'))
+        self.assertEqual(response.status_code, 200)
+        conteos = [q for q in consultas.captured_queries if 'COUNT(' in q['sql'] and 'gimnasio_reserva' in q['sql']]
+        self.assertEqual(conteos, [])
+
+    def test_comando_verifica_y_reconstruye(self):
+        Reserva.objects.create(socio=self.socio, clase=self.clase, fecha=self.fecha)
+        salida = StringIO()
+        call_command('ocupacion_sesiones', '--verificar', stdout=salida)
+        self.assertIn('desincronizadas', salida.getvalue())
+
+        call_command('ocupacion_sesiones', stdout=StringIO())
+        self.assertEqual(self.ocupacion().reservas_activas, 1)
+
+
+# ===============================
+# SERVICIO DE RESERVAS
+# ===============================
+class ReservaServiceTestCase(BaseReservasTestCase):
+
+    def test_resultados_tipados(self):
+        resultado = ReservaService.reservar(self.socio, self.sesion)
+        self.assertIs(resultado.estado, EstadoAdmision.RESERVADA)
+
+        resultado = ReservaService.reservar(self.socio, self.sesion)
+        self.assertIs(resultado.estado, EstadoAdmision.DUPLICADA)
+
+        for i in range(2):
+            ReservaService.reservar(crear_socio(f"otro{i}"), self.sesion)
+        resultado = ReservaService.reservar(crear_socio("tarde"), self.sesion)
+        self.assertIs(resultado.estado, EstadoAdmision.COMPLETA)
+
+    def test_cancelar_y_reactivar_reutilizan_la_fila(self):
+        reserva = ReservaService.reservar(self.socio, self.sesion).reserva
+        self.assertTrue(ReservaService.cancelar(reserva))
+        self.assertFalse(ReservaService.cancelar(reserva))
+
+        resultado = ReservaService.reservar(self.socio, self.sesion)
+        self.assertTrue(resultado.reactivada)
+        self.assertEqual(resultado.reserva.pk, reserva.pk)
+        self.assertEqual(Reserva.objects.count(), 1)
+
+
+class ReservasConcurrentesTestCase(TransactionTestCase):
+    """Cientos de intentos simultáneos no pueden sobrepasar la capacidad"""
+
+    INTENTOS = 300
+    CAPACIDAD = 25
+
+    @tag('lento')
+    def test_sin_overbooking(self):
+        clase = Clase.objects.create(
+            nombre="Spinning", descripcion="-", dia_semana="L", hora_inicio="19:00",
+            duracion_minutos=45, capacidad_maxima=self.CAPACIDAD
+        )
+        fecha = proxima_fecha("L")
+        sesion = SesionClase.obtener(clase, fecha)
+        socios = User.objects.bulk_create([User(username=f"c{i}") for i in range(self.INTENTOS // 2)])
+        # Cada socio lo intenta dos veces: se mezclan plazas llenas y duplicados
+        intentos = socios + socios
+
+        def intentar(socio):
+            try:
+                return ReservaService.reservar(socio, sesion).estado
+            finally:
+                connection.close()
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            estados = list(pool.map(intentar, intentos))
+        segundos = time.perf_counter() - inicio
+
+        self.assertEqual(estados.count(EstadoAdmision.RESERVADA), self.CAPACIDAD)
+        self.assertEqual(Reserva.objects.filter(clase=clase, fecha=fecha, cancelada=False).count(), self.CAPACIDAD)
+        self.assertEqual(SesionClase.objects.get(clase=clase, fecha=fecha).reservas_activas, self.CAPACIDAD)
+        logger.info("%d intentos concurrentes en %.2fs (%.0f reservas/s)",
+                    len(intentos), segundos, len(intentos) / segundos)
+
+
+class ReservaSerieTestCase(BaseReservasTestCase):
+
+    def test_resultado_por_fecha_en_una_transaccion(self):
+        fechas = [self.fecha + timedelta(weeks=i) for i in range(4)]
+        # Semana 2 ya reservada por el socio, semana 3 completa
+        ReservaService.reservar(self.socio, SesionClase.obtener(self.clase, fechas[1]))
+        for i in range(self.clase.capacidad_maxima):
+            ReservaService.reservar(crear_socio(f"lleno{i}"), SesionClase.obtener(self.clase, fechas[2]))
+
+        with CaptureQueriesContext(connection) as consultas:
+            resultados = ReservaService.reservar_serie(self.socio, self.sesion, 4)
+
+        self.assertEqual([r.fecha for r in resultados], fechas)
+        self.assertEqual(
+            [r.estado for r in resultados],
+            [EstadoAdmision.RESERVADA, EstadoAdmision.DUPLICADA, EstadoAdmision.COMPLETA, EstadoAdmision.RESERVADA]
+        )
+        inserts = [q for q in consultas.captured_queries if q['sql'].startswith('INSERT INTO "gimnasio_reserva"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(SesionClase.objects.get(clase=self.clase, fecha=fechas[3]).reservas_activas, 1)
+
+    def test_la_serie_saca_al_socio_de_las_listas_de_espera(self):
+        fechas = [self.fecha + timedelta(weeks=i) for i in range(3)]
+        sesiones = [SesionClase.obtener(self.clase, fecha) for fecha in fechas]
+        # Semana 1 con una reserva cancelada que se reactiva, semana 2 nueva
+        ReservaService.cancelar(ReservaService.reservar(self.socio, sesiones[0]).reserva)
+        otro = crear_socio("detras")
+        for sesion in sesiones[:2]:
+            ReservaService.apuntar_lista_espera(self.socio, sesion)
+            ReservaService.apuntar_lista_espera(otro, sesion)
+
+        ReservaService.reservar_serie(self.socio, self.sesion, 3)
+
+        self.assertFalse(ListaEspera.objects.filter(socio=self.socio).exists())
+        self.assertEqual(
+            sorted(ListaEspera.objects.filter(socio=otro).values_list('sesion_id', 'posicion')),
+            [(sesiones[0].pk, 1), (sesiones[1].pk, 1)]
+        )
+
+    def test_vista_reserva_serie(self):
+        self.client.force_login(self.socio)
+        self.client.post(reverse('gimnasio:mis_reservas'), {'sesion_id': self.sesion.id, 'semanas': 3})
+        self.assertEqual(Reserva.objects.filter(socio=self.socio, cancelada=False).count(), 3)
+
+
+# ===============================
+# LISTA DE ESPERA
+# ===============================
+class ListaEsperaTestCase(BaseReservasTestCase):
+
+    def llenar_clase(self):
+        return [
+            ReservaService.reservar(crear_socio(f"lleno{i}"), self.sesion).reserva
+            for i in range(self.clase.capacidad_maxima)
+        ]
+
+    def test_posiciones_fifo(self):
+        self.llenar_clase()
+        primero = ReservaService.apuntar_lista_espera(crear_socio("espera1"), self.sesion).espera
+        segundo = ReservaService.apuntar_lista_espera(crear_socio("espera2"), self.sesion).espera
+        self.assertEqual((primero.posicion, segundo.posicion), (1, 2))
+
+        ReservaService.salir_lista_espera(primero)
+        segundo.refresh_from_db()
+        self.assertEqual(segundo.posicion, 1)
+
+    def test_cancelar_promociona_al_primero(self):
+        reservas = self.llenar_clase()
+        en_espera = crear_socio("espera1")
+        ReservaService.apuntar_lista_espera(en_espera, self.sesion)
+        ReservaService.apuntar_lista_espera(crear_socio("espera2"), self.sesion)
+
+        reservas[0].cancelar()
+
+        self.assertTrue(Reserva.objects.filter(socio=en_espera, clase=self.clase, fecha=self.fecha,
+                                               cancelada=False).exists())
+        self.assertEqual(list(ListaEspera.objects.values_list('posicion', flat=True)), [1])
+        self.sesion.refresh_from_db()
+        self.assertEqual(self.sesion.reservas_activas, self.sesion.capacidad)
+
+    def test_vista_apunta_a_lista_si_completa(self):
+        self.llenar_clase()
+        self.client.force_login(self.socio)
+        self.client.post(reverse('gimnasio:mis_reservas'), {'sesion_id': self.sesion.id})
+        response = self.client.get(reverse('gimnasio:mis_reservas'))
+        self.assertContains(response, 'Posición 1')
+
+
+# ===============================
+# DISPONIBILIDAD EN LISTADOS
+# ===============================
+class DisponibilidadClasesTestCase(BaseReservasTestCase):
+
+    def crear_clases(self, total):
+        for i in range(total):
+            Clase.objects.create(
+                nombre=f"Clase {i}", descripcion="-", monitor=self.monitor,
+                dia_semana="LMXJVSD"[i % 7], hora_inicio="18:00", duracion_minutos=45, capacidad_maxima=10
+            )
+
+    def consultas_listado(self):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('gimnasio:listado_clases'))
+        self.assertEqual(response.status_code, 200)
+        return len(consultas)
+
+    def test_anota_la_proxima_sesion(self):
+        ReservaService.reservar(self.socio, self.sesion)
+        sin_sesiones = Clase.objects.create(
+            nombre="Yoga", descripcion="-", monitor=self.monitor,
+            dia_semana="M", hora_inicio="09:00", duracion_minutos=60, capacidad_maxima=8
+        )
+        SesionClase.objects.filter(clase=sin_sesiones).delete()
+
+        clases = {clase.pk: clase for clase in Clase.objects.with_availability()}
+        self.assertEqual(clases[self.clase.pk].proxima_sesion, self.fecha)
+        self.assertEqual(clases[self.clase.pk].reservas_proxima, 1)
+        self.assertEqual(clases[self.clase.pk].plazas_disponibles(), 2)
+        self.assertEqual(clases[sin_sesiones.pk].plazas_libres, 8)
+
+    def test_listado_sin_consultas_por_fila(self):
+        self.crear_clases(2)
+        pocas = self.consultas_listado()
+        self.crear_clases(12)
+        self.assertEqual(self.consultas_listado(), pocas)
+
+    def test_mis_clases_monitor_sin_consultas_por_fila(self):
+        # Los usuarios de monitores no reciben perfil automático
+        usuario = User.objects.create_user(username="monitor.test", email=self.monitor.email)
+        PerfilUsuario.objects.create(user=usuario, rol='monitor')
+        self.client.force_login(usuario)
+        self.crear_clases(3)
+        with CaptureQueriesContext(connection) as pocas:
+            self.client.get(reverse('gimnasio:mis_clases_monitor'))
+        self.crear_clases(9)
+        with CaptureQueriesContext(connection) as muchas:
+            response = self.client.get(reverse('gimnasio:mis_clases_monitor'))
+        self.assertEqual(len(muchas), len(pocas))
+        self.assertContains(response, "Clase 8")
+
+
+# ===============================
+# ÍNDICES (EXPLAIN)
+# ===============================
+class PlanesConsultaTestCase(TestCase):
+    """
+    Pasa por EXPLAIN las consultas calientes de views.py contra un conjunto de
+    datos sembrado y falla si alguna recorre entera una tabla grande.
+    """
+
+    TABLAS_GRANDES = ['gimnasio_reserva', 'gimnasio_pago', 'gimnasio_sesionclase']
+
+    @classmethod
+    def setUpTestData(cls):
+        monitor = Monitor.objects.create(
+            nombre="Ana", apellidos="Ruiz", dni="00000000T",
+            telefono="600000000", email="ana@example.com", especialidad="yoga"
+        )
+        cls.clases = [
+            Clase.objects.create(
+                nombre=f"Clase {i}", descripcion="-", monitor=monitor, dia_semana="LMXJVSD"[i % 7],
+                hora_inicio="18:00", duracion_minutos=45, capacidad_maxima=30
+            )
+            for i in range(14)
+        ]
+        cls.socios = User.objects.bulk_create([User(username=f"semilla{i}") for i in range(200)])
+        hoy = timezone.now().date()
+        Reserva.objects.bulk_create([
+            Reserva(
+                socio=socio, clase=cls.clases[(i + j) % len(cls.clases)],
+                fecha=hoy + timedelta(days=j * 7 - 84), cancelada=(i + j) % 9 == 0
+            )
+            for i, socio in enumerate(cls.socios)
+            for j in range(25)
+        ], batch_size=1000)
+        Pago.objects.bulk_create([
+            Pago(
+                socio=socio, tipo_pago='mensual', importe=40, concepto="Cuota",
+                fecha_vencimiento=hoy - timedelta(days=30 * j),
+                fecha_pago=None if j == 0 else hoy - timedelta(days=30 * j),
+                estado='pendiente' if j == 0 else 'pagado'
+            )
+            for socio in cls.socios
+            for j in range(15)
+        ], batch_size=1000)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # Con pocas filas el planificador elige Seq Scan aunque exista índice
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+
+    def recorridos_completos(self, queryset):
+        plan = queryset.explain()
+        if connection.vendor == 'postgresql':
+            patrones = [f'Seq Scan on {tabla}' for tabla in self.TABLAS_GRANDES]
+            return [linea for linea in plan.splitlines() if any(p in linea for p in patrones)]
+
+        # En SQLite, recorrer entero un índice parcial solo lee las filas que cumplen su condición
+        parciales = {
+            indice.name
+            for modelo in (Reserva, Pago, SesionClase)
+            for indice in modelo._meta.indexes
+            if indice.condition is not None
+        }
+        patrones = [f'SCAN {tabla}' for tabla in self.TABLAS_GRANDES]
+        return [
+            linea for linea in plan.splitlines()
+            if any(p in linea for p in patrones) and not any(f'INDEX {nombre}' in linea for nombre in parciales)
+        ]
+
+    def consultas_calientes(self):
+        hoy = timezone.now().date()
+        socio = self.socios[0]
+        return {
+            'inicio: mis reservas': Reserva.objects.filter(
+                socio=socio, cancelada=False, fecha__gte=hoy
+            ).order_by('fecha')[:5],
+            'inicio: pagos pendientes del socio': Pago.objects.filter(socio=socio, estado='pendiente'),
+            'estadísticas: reservas de hoy': Reserva.objects.filter(fecha=hoy, cancelada=False),
+            'estadísticas: reservas de la semana': Reserva.objects.filter(
+                fecha__gte=hoy, fecha__lte=hoy + timedelta(days=7), cancelada=False
+            ),
+            'estadísticas: pagos pendientes': Pago.objects.filter(estado='pendiente'),
+            'gestión pagos: vencidos': Pago.objects.filter(estado='vencido').order_by('-fecha_emision'),
+            'tarea: marcar vencidos': Pago.objects.filter(estado='pendiente', fecha_vencimiento__lt=hoy),
+            'estadísticas: ingresos del mes': Pago.objects.filter(
+                estado='pagado', fecha_pago__gte=hoy.replace(day=1), fecha_pago__lte=hoy
+            ),
+            'admin: clases reservadas': Reserva.objects.filter(
+                cancelada=False, fecha__gte=hoy
+            ).select_related('socio', 'clase', 'clase__monitor').order_by('fecha', 'clase__hora_inicio'),
+            'monitor: socios apuntados': Reserva.objects.filter(
+                clase__in=self.clases[:2], cancelada=False, fecha__gte=hoy
+            ),
+            'socio: mis pagos': Pago.objects.filter(socio=socio).order_by('-fecha_emision'),
+            'socio: sesiones próximas': SesionClase.objects.filter(
+                activa=True, fecha__range=(hoy, hoy + timedelta(days=27))
+            ),
+        }
+
+    def test_sin_recorridos_completos_en_tablas_grandes(self):
+        for nombre, queryset in self.consultas_calientes().items():
+            with self.subTest(consulta=nombre):
+                self.assertEqual(self.recorridos_completos(queryset), [])
+
+
+# ===============================
+# PASAR LISTA (MONITOR)
+# ===============================
+class PasarListaTestCase(BaseReservasTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.hoy = timezone.now().date()
+        self.sesion_hoy = SesionClase.obtener(self.clase, self.hoy)
+        self.reservas = [
+            ReservaService.reservar(crear_socio(f"alumno{i}"), self.sesion_hoy).reserva for i in range(3)
+        ]
+        usuario = User.objects.create_user(username="monitor.test", email=self.monitor.email)
+        PerfilUsuario.objects.create(user=usuario, rol='monitor')
+        self.client.force_login(usuario)
+        self.url = reverse('gimnasio:pasar_lista', args=[self.sesion_hoy.pk])
+
+    def pasar_lista(self, reservas):
+        return self.client.post(
+            self.url, {'asistentes': [r.pk for r in reservas]}, HTTP_ACCEPT='application/json'
+        ).json()
+
+    def asistentes(self):
+        return set(Reserva.objects.filter(asistio=True).values_list('pk', flat=True))
+
+    def test_un_update_por_grupo_e_idempotente(self):
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.pasar_lista(self.reservas[:2]), {'marcadas': 2, 'desmarcadas': 0})
+        updates = [q for q in consultas.captured_queries if q['sql'].startswith('UPDATE "gimnasio_reserva"')]
+        self.assertEqual(len(updates), 2)
+
+        # Reenvío (reintento desde la tablet): no cambia nada
+        self.assertEqual(self.pasar_lista(self.reservas[:2]), {'marcadas': 0, 'desmarcadas': 0})
+
+        self.assertEqual(self.pasar_lista(self.reservas[1:]), {'marcadas': 1, 'desmarcadas': 1})
+        self.assertEqual(self.asistentes(), {r.pk for r in self.reservas[1:]})
+
+    def test_formulario_sin_js_redirige(self):
+        response = self.client.post(self.url, {'asistentes': [self.reservas[0].pk]})
+        self.assertRedirects(response, self.url)
+        self.assertEqual(self.asistentes(), {self.reservas[0].pk})
+
+    def test_sesion_futura_o_de_otro_monitor(self):
+        futura = SesionClase.obtener(self.clase, self.hoy + timedelta(days=7))
+        response = self.client.post(reverse('gimnasio:pasar_lista', args=[futura.pk]), HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        Clase.objects.filter(pk=self.clase.pk).update(monitor=None)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_usuario_sin_perfil_no_puede_pasar_lista(self):
+        # bulk_create no lanza post_save: el usuario se queda sin PerfilUsuario
+        sin_perfil, = User.objects.bulk_create([
+            User(username="sin.perfil", email=self.monitor.email, is_superuser=True, is_staff=True)
+        ])
+        self.client.force_login(sin_perfil)
+        self.assertRedirects(self.client.get(self.url), reverse('gimnasio:inicio'), fetch_redirect_response=False)
+        response = self.client.post(self.url, {'asistentes': [self.reservas[0].pk]}, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.asistentes(), set())
+
+
+# ===============================
+# ARCHIVO DE RESERVAS
+# ===============================
+class ArchivoReservasTestCase(BaseReservasTestCase):
+
+    def setUp(self):
+        super().setUp()
+        hace_un_ano = self.fecha - timedelta(weeks=52)
+        self.antiguas = []
+        for semana in range(5):
+            sesion = SesionClase.obtener(self.clase, hace_un_ano + timedelta(weeks=semana))
+            self.antiguas.append(ReservaService.reservar(self.socio, sesion).reserva)
+        for reserva in self.antiguas[:2]:
+            ReservaService.registrar_asistencia(reserva.sesion, [reserva.pk])
+        self.antiguas[4].cancelar()
+        self.reciente = ReservaService.reservar(self.socio, self.sesion).reserva
+
+    def test_archiva_por_lotes_y_mantiene_la_ocupacion(self):
+        salida = StringIO()
+        call_command('archivar_reservas', '--lote', 2, stdout=salida)
+        self.assertIn('5 reservas', salida.getvalue())
+        self.assertEqual(list(Reserva.objects.values_list('pk', flat=True)), [self.reciente.pk])
+        self.assertEqual(ReservaArchivada.objects.count(), 5)
+
+        # Reejecutar no duplica nada y la ocupación sigue cuadrando con Reserva
+        call_command('archivar_reservas', stdout=StringIO())
+        self.assertEqual(ReservaArchivada.objects.count(), 5)
+        verificacion = StringIO()
+        call_command('ocupacion_sesiones', '--verificar', stdout=verificacion)
+        self.assertIn('Ocupación correcta', verificacion.getvalue())
+
+    def test_ids_de_reserva_mayores_de_32_bits(self):
+        reserva = ReservaService.reservar(crear_socio("socio.grande"), self.antiguas[0].sesion).reserva
+        Reserva.objects.filter(pk=reserva.pk).update(id=2 ** 31 + 5)
+        ArchivoService.archivar(ArchivoService.fecha_corte())
+        self.assertTrue(ReservaArchivada.objects.filter(reserva_id=2 ** 31 + 5).exists())
+        self.assertEqual(ReservaArchivada._meta.get_field('reserva_id').get_internal_type(),
+                         'PositiveBigIntegerField')
+
+    def test_informes_suman_el_archivo_si_se_pide(self):
+        call_command('archivar_reservas', stdout=StringIO())
+        admin = User.objects.create_superuser(username="admin.test", password="test1234")
+        self.client.force_login(admin)
+
+        url = reverse('gimnasio:reporte_asistencia')
+        clase = self.client.get(url).context['clases_con_asistencia'][0]
+        self.assertEqual((clase.total_reservas, clase.total_asistencias), (1, 0))
+        clase = self.client.get(url, {'historico': 1}).context['clases_con_asistencia'][0]
+        self.assertEqual((clase.total_reservas, clase.total_asistencias), (5, 2))
+
+        self.client.force_login(self.socio)
+        response = self.client.get(reverse('gimnasio:perfil'), {'historico': 1})
+        self.assertEqual((response.context['total_reservas'], response.context['reservas_asistidas']), (6, 2))
+
+
+# ===============================
+# EMISIÓN DE CUOTAS
+# ===============================
+class EmisionCuotasTestCase(TestCase):
+
+    def setUp(self):
+        socios = User.objects.bulk_create([User(username=f"cuota{i}") for i in range(30)])
+        PerfilUsuario.objects.bulk_create([
+            PerfilUsuario(user=socio, rol='socio', activo=i < 25) for i, socio in enumerate(socios)
+        ])
+        self.socios = socios
+
+    def test_comando_idempotente_por_periodo(self):
+        salida = StringIO()
+        call_command('emitir_cuotas', '--fecha', '2026-10-01', '--importe', '35', '--lote', 10, stdout=salida)
+        self.assertIn('25 emitidas', salida.getvalue())
+        pago = Pago.objects.first()
+        self.assertEqual((pago.periodo, pago.importe, pago.estado), ('2026-10', 35, 'pendiente'))
+
+        salida = StringIO()
+        call_command('emitir_cuotas', '--fecha', '2026-10-20', stdout=salida)
+        self.assertIn('0 emitidas, 25 ya emitidas', salida.getvalue())
+
+        call_command('emitir_cuotas', '--fecha', '2026-11-01', stdout=StringIO())
+        self.assertEqual(Pago.objects.filter(periodo='2026-11').count(), 25)
+
+    def test_un_insert_por_lote(self):
+        with CaptureQueriesContext(connection) as consultas:
+            CuotaService.emitir('trimestral', 90, fecha=timezone.now().date(), lote=10)
+        # SQLite escribe INSERT OR IGNORE, PostgreSQL INSERT ... ON CONFLICT DO NOTHING
+        inserts = [q for q in consultas.captured_queries
+                   if q['sql'].startswith('INSERT') and 'INTO "gimnasio_pago"' in q['sql']]
+        self.assertEqual(len(inserts), 3)
+
+    def test_no_cuenta_las_que_inserto_otra_emision(self):
+        hoy = timezone.now().date()
+        insertar = CuotaService._insertar
+
+        def con_otra_emision(bloque):
+            # Otra emisión del mismo periodo se adelanta con el primer socio del lote
+            if not Pago.objects.exists():
+                Pago.objects.create(socio_id=bloque[0].socio_id, tipo_pago='mensual', importe=40,
+                                    concepto="Cuota", fecha_vencimiento=hoy, periodo=bloque[0].periodo)
+            return insertar(bloque)
+
+        with mock.patch.object(CuotaService, "_insertar", con_otra_emision):
+            resultado = CuotaService.emitir('mensual', 40, fecha=hoy, lote=10)
+        self.assertEqual((resultado.emitidas, resultado.omitidas), (24, 1))
+        self.assertEqual(Pago.objects.count(), 25)
+        self.assertEqual(ResumenDiarioPagos.objects.get(fecha=hoy, tipo_pago='mensual').pagos, 25)
+
+    def test_accion_admin_solo_socios_seleccionados(self):
+        admin = User.objects.create_superuser(username="admin.test", password="test1234")
+        self.client.force_login(admin)
+        seleccion = PerfilUsuario.objects.filter(user__in=self.socios[:3]).values_list('pk', flat=True)
+        self.client.post(reverse('admin:gimnasio_perfilusuario_changelist'), {
+            'action': 'emitir_cuota_mensual', '_selected_action': list(seleccion)
+        })
+        self.assertEqual(set(Pago.objects.values_list('socio_id', flat=True)), {s.pk for s in self.socios[:3]})
+
+
+# ===============================
+# TAREA DIARIA: PAGOS VENCIDOS
+# ===============================
+class MarcarVencidosTestCase(TestCase):
+
+    def setUp(self):
+        self.moroso, self.al_dia = User.objects.bulk_create([User(username="moroso"), User(username="al.dia")])
+        PerfilUsuario.objects.bulk_create([
+            PerfilUsuario(user=self.moroso, rol='socio'),
+            PerfilUsuario(user=self.al_dia, rol='socio', tiene_pagos_vencidos=True),
+        ])
+        hoy = timezone.now().date()
+        self.vencido, self.en_plazo = Pago.objects.bulk_create([
+            Pago(socio=self.moroso, tipo_pago='mensual', importe=40, concepto="Cuota",
+                 fecha_vencimiento=hoy - timedelta(days=1)),
+            Pago(socio=self.al_dia, tipo_pago='mensual', importe=40, concepto="Cuota",
+                 fecha_vencimiento=hoy),
+        ])
+
+    def test_un_update_marca_vencidos_y_socios(self):
+        with CaptureQueriesContext(connection) as consultas:
+            call_command('marcar_vencidos', stdout=StringIO())
+        updates = [q for q in consultas.captured_queries if q['sql'].startswith('UPDATE "gimnasio_pago"')]
+        self.assertEqual(len(updates), 1)
+
+        self.assertEqual(
+            dict(Pago.objects.values_list('pk', 'estado')),
+            {self.vencido.pk: 'vencido', self.en_plazo.pk: 'pendiente'}
+        )
+        self.assertEqual(
+            dict(PerfilUsuario.objects.values_list('user_id', 'tiene_pagos_vencidos')),
+            {self.moroso.pk: True, self.al_dia.pk: False}
+        )
+        ejecucion = EjecucionTarea.objects.get()
+        self.assertEqual((ejecucion.nombre, ejecucion.filas_afectadas), ('marcar_vencidos', 1))
+
+    def test_muchos_vencidos_en_una_consulta_agrupada_y_un_update(self):
+        hoy = timezone.now().date()
+        total = CuotaService.TAMANO_LOTE + 500
+        Pago.objects.bulk_create([
+            Pago(socio=self.moroso, tipo_pago=('mensual', 'trimestral')[i % 2], importe=40 + i % 3,
+                 concepto=f"Cuota {i}", fecha_emision=hoy - timedelta(days=30 + i % 4),
+                 fecha_vencimiento=hoy - timedelta(days=1 + i % 5))
+            for i in range(total)
+        ])
+        ResumenDiarioPagos.reconstruir()
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(CuotaService.marcar_vencidos(), total + 1)
+        pagos = [q['sql'] for q in consultas.captured_queries if '"gimnasio_pago"' in q['sql'].split(' WHERE ')[0]]
+        self.assertEqual(len([sql for sql in pagos if sql.startswith('UPDATE "gimnasio_pago"')]), 1)
+        # Ninguna consulta trae los ids a Python: la agrupada, el UPDATE y nada más
+        self.assertEqual(len(pagos), 2)
+
+        self.assertEqual(Pago.objects.filter(estado='vencido').count(), total + 1)
+        resumen = ResumenDiarioPagos.objects.exclude(pagos=0).values_list(
+            'fecha', 'tipo_pago', 'metodo_pago', 'estado', 'pagos', 'importe'
+        )
+        incremental = sorted(resumen)
+        ResumenDiarioPagos.reconstruir()
+        self.assertEqual(incremental, sorted(resumen.all()))
+
+    @override_settings(PROGRAMAR_TAREAS=True)
+    def test_el_programador_solo_arranca_en_el_proceso_web(self):
+        with mock.patch.object(tareas, 'iniciar_programador') as iniciar:
+            apps.get_app_config('gimnasio').ready()  # migrate, test, shell...
+            iniciar.assert_not_called()
+            sys.modules.pop('gimnasio_config.wsgi', None)
+            importlib.import_module('gimnasio_config.wsgi')  # gunicorn / runserver
+            iniciar.assert_called_once()
+
+    def test_programador_solo_una_vez_al_dia(self):
+        tareas.ejecutar_pendientes()
+        tareas.ejecutar_pendientes()
+        self.assertEqual(
+            sorted(EjecucionTarea.objects.values_list('nombre', flat=True)), sorted(tareas.TAREAS_DIARIAS)
+        )
+
+
+# ===============================
+# CACHÉ DE FACTURAS
+# ===============================
+class FacturasTestCase(TestCase):
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(MEDIA_ROOT=Path(directorio.name))
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        self.socio = crear_socio("socio.factura", first_name="Lucía", email="lucia@example.com")
+        self.admin = User.objects.create_superuser(username="admin.test", password="test1234")
+        self.pago = Pago.objects.create(
+            socio=self.socio, tipo_pago='mensual', importe=40, concepto="Cuota octubre",
+            fecha_vencimiento=timezone.now().date()
+        )
+        self.url = reverse('gimnasio:generar_factura', args=[self.pago.pk])
+
+    def guardadas(self):
+        return sorted(p.name for p in (Path(facturas.settings.MEDIA_ROOT) / facturas.DIRECTORIO).glob('*.pdf'))
+
+    def marcar_pagado(self):
+        self.client.force_login(self.admin)
+        self.client.post(reverse('gimnasio:marcar_pagado', args=[self.pago.pk]), {'metodo_pago': 'tarjeta'})
+        self.client.force_login(self.socio)
+
+    def test_renderizar_reutiliza_los_bloques_fijos(self):
+        primera = facturas.renderizar_factura(self.pago)
+        fijos = facturas._bloques_fijos()
+
+        self.pago.concepto = "Cuota noviembre"
+        segunda = facturas.renderizar_factura(self.pago)
+
+        self.assertIs(facturas._bloques_fijos(), fijos)
+        self.assertTrue(primera.startswith(b'%PDF') and segunda.startswith(b'%PDF'))
+        self.assertNotEqual(primera, segunda)
+
+    def test_se_genera_al_cobrar_y_no_se_repite(self):
+        self.marcar_pagado()
+        self.assertEqual(len(self.guardadas()), 1)
+
+        with mock.patch('gimnasio.facturas.construir_pdf') as construir:
+            for _ in range(3):
+                response = self.client.get(self.url)
+                self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+        construir.assert_not_called()
+
+    @override_settings(FACTURAS_X_ACCEL=True)
+    def test_x_accel_redirect(self):
+        self.marcar_pagado()
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], f'/facturas-internas/{self.guardadas()[0]}')
+        self.assertEqual(response.content, b'')
+
+    def test_editar_el_pago_invalida_la_factura(self):
+        self.marcar_pagado()
+        anterior = self.guardadas()
+
+        pago = Pago.objects.get(pk=self.pago.pk)
+        pago.concepto = "Cuota octubre (corregida)"
+        pago.save()
+        self.assertEqual(self.guardadas(), [])
+
+        self.client.get(self.url)
+        self.assertEqual(len(self.guardadas()), 1)
+        self.assertNotEqual(self.guardadas(), anterior)
+
+    def test_exportar_zip(self):
+        self.marcar_pagado()
+        otros = [
+            Pago.objects.create(
+                socio=self.socio, tipo_pago='mensual', importe=40, concepto=f"Cuota {mes}",
+                fecha_vencimiento=timezone.now().date(), estado='pagado', fecha_pago=timezone.now().date()
+            )
+            for mes in ("agosto", "septiembre")
+        ]
+        Pago.objects.create(socio=self.socio, tipo_pago='mensual', importe=40, concepto="Sin cobrar",
+                            fecha_vencimiento=timezone.now().date())
+        hoy = timezone.now().date().isoformat()
+
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('gimnasio:exportar_facturas'), {'desde': hoy, 'hasta': hoy})
+        archivo = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+
+        self.assertEqual(
+            sorted(archivo.namelist()),
+            sorted(f'Factura_{pago.id:05d}_socio.factura.pdf' for pago in [self.pago] + otros)
+        )
+        self.assertTrue(all(archivo.read(nombre).startswith(b'%PDF') for nombre in archivo.namelist()))
+        # Las que faltaban quedan en la caché para la siguiente vez
+        self.assertEqual(len(self.guardadas()), 3)
+
+        with mock.patch('gimnasio.facturas.ProcessPoolExecutor') as pool:
+            response = self.client.get(reverse('gimnasio:exportar_facturas'), {'desde': hoy, 'hasta': hoy})
+            self.assertEqual(len(zipfile.ZipFile(BytesIO(b''.join(response.streaming_content))).namelist()), 3)
+        pool.assert_not_called()
+
+
+# ===============================
+# INFORME DE INGRESOS
+# ===============================
+class InformeIngresosTestCase(TestCase):
+
+    def setUp(self):
+        self.socio = crear_socio("socio.ingresos")
+        self.hoy = timezone.now().date().replace(day=15)
+
+    def cobrar(self, fecha_pago, importe, tipo_pago='mensual', metodo_pago='tarjeta'):
+        return Pago.objects.create(
+            socio=self.socio, tipo_pago=tipo_pago, importe=importe, concepto="Cuota",
+            fecha_vencimiento=fecha_pago, fecha_pago=fecha_pago, estado='pagado', metodo_pago=metodo_pago
+        )
+
+    def test_una_consulta_y_meses_consecutivos(self):
+        # Fin de mes: el paso de 30 días del informe antiguo se saltaba o repetía estos meses
+        self.cobrar(sumar_meses(self.hoy, -1) - timedelta(days=1), 10)  # último día de hace dos meses
+        self.cobrar(sumar_meses(self.hoy, -1), 20, tipo_pago='matricula', metodo_pago='efectivo')
+        self.cobrar(self.hoy, 30)
+        self.cobrar(self.hoy, 5, metodo_pago='')
+        self.cobrar(sumar_meses(self.hoy, -24), 99)  # fuera del rango de 12 meses
+
+        with self.assertNumQueries(1):
+            informe = InformeService.ingresos_mensuales(12, hoy=self.hoy)
+
+        meses = [fila['mes'] for fila in informe['meses']]
+        self.assertEqual(meses, [sumar_meses(self.hoy, -i) for i in range(12)])
+        self.assertEqual([fila['total'] for fila in informe['meses'][:3]], [35, 20, 10])
+        self.assertEqual(informe['total'], 65)
+
+        self.assertEqual([clave for clave, _ in informe['tipos']], ['mensual', 'matricula'])
+        self.assertEqual([clave for clave, _ in informe['metodos']], ['', 'efectivo', 'tarjeta'])
+        self.assertEqual(informe['meses'][0]['por_tipo'], [35, 0])
+        self.assertEqual(informe['meses'][0]['por_metodo'], [5, 0, 30])
+
+    def test_vista_con_rango(self):
+        admin = User.objects.create_superuser(username="admin.ingresos", password="test1234")
+        self.client.force_login(admin)
+        self.cobrar(self.hoy, 40)
+
+        response = self.client.get(reverse('gimnasio:reporte_ingresos'), {'meses': 24})
+        self.assertEqual(response.context['meses'], 24)
+        self.assertEqual(len(response.context['ingresos_por_mes']), 24)
+
+        response = self.client.get(reverse('gimnasio:reporte_ingresos'), {'meses': 1000})
+        self.assertEqual(len(response.context['ingresos_por_mes']), 6)
+
+
+# ===============================
+# RESUMEN DIARIO DE PAGOS
+# ===============================
+class ResumenDiarioPagosTestCase(TestCase):
+
+    def setUp(self):
+        self.socios = [crear_socio(f"socio.resumen{i}") for i in range(3)]
+        self.hoy = timezone.now().date()
+
+    def resumen(self):
+        return {
+            (fila.fecha, fila.tipo_pago, fila.metodo_pago, fila.estado): (fila.pagos, fila.importe)
+            for fila in ResumenDiarioPagos.objects.exclude(pagos=0)
+        }
+
+    def assertCoincideConReconstruido(self):
+        incremental = self.resumen()
+        ResumenDiarioPagos.reconstruir()
+        self.assertEqual(incremental, self.resumen())
+
+    def test_alta_cobro_edicion_y_borrado(self):
+        pago = Pago.objects.create(socio=self.socios[0], tipo_pago='matricula', importe=30, concepto="Matrícula",
+                                   fecha_emision=self.hoy - timedelta(days=3), fecha_vencimiento=self.hoy)
+        self.assertEqual(self.resumen(), {(self.hoy - timedelta(days=3), 'matricula', '', 'pendiente'): (1, 30)})
+
+        pago.marcar_pagado('tarjeta')
+        self.assertEqual(self.resumen(), {(self.hoy, 'matricula', 'tarjeta', 'pagado'): (1, 30)})
+
+        pago = Pago.objects.get(pk=pago.pk)
+        pago.importe = 25
+        pago.save()
+        self.assertEqual(self.resumen(), {(self.hoy, 'matricula', 'tarjeta', 'pagado'): (1, 25)})
+
+        Pago.objects.only('id').get(pk=pago.pk).save()  # sin los campos cargados: no descuadra
+        self.assertEqual(ResumenDiarioPagos.total(estado='pagado'), 25)
+
+        pago.delete()
+        self.assertEqual(self.resumen(), {})
+
+    def test_operaciones_en_bloque(self):
+        CuotaService.emitir('mensual', 40, fecha=self.hoy - timedelta(days=20))
+        self.assertEqual(ResumenDiarioPagos.total(estado='pendiente'), 120)
+
+        Pago.objects.filter(socio=self.socios[0]).get().marcar_pagado('efectivo')
+        CuotaService.marcar_vencidos()
+        self.assertEqual(ResumenDiarioPagos.total(estado='vencido'), 80)
+        self.assertEqual(ResumenDiarioPagos.total(estado='pendiente'), 0)
+
+        self.socios[1].delete()  # borra sus pagos en cascada
+        self.assertEqual(ResumenDiarioPagos.total(estado='vencido'), 40)
+        self.assertCoincideConReconstruido()
+
+    def test_vistas_leen_del_resumen(self):
+        admin = User.objects.create_superuser(username="admin.resumen", password="test1234")
+        self.client.force_login(admin)
+        Pago.objects.create(socio=self.socios[0], tipo_pago='otro', importe=12, concepto="Toalla",
+                            fecha_vencimiento=self.hoy, estado='pagado', fecha_pago=self.hoy)
+        Pago.objects.create(socio=self.socios[1], tipo_pago='otro', importe=7, concepto="Candado",
+                            fecha_vencimiento=self.hoy)
+
+        response = self.client.get(reverse('gimnasio:gestion_pagos'))
+        self.assertEqual(response.context['total_pendiente'], 7)
+        self.assertEqual(response.context['total_mes'], 12)
+        self.assertCoincideConReconstruido()
+
+
+# ===============================
+# EXPORTACIÓN CSV / XLSX
+# ===============================
+class ExportacionesTestCase(BaseReservasTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser(username="admin.exporta", password="test1234")
+        self.client.force_login(self.admin)
+        self.otro = crear_socio("socio.otro", first_name="Íñigo")
+
+    def descargar(self, nombre_url, **parametros):
+        response = self.client.get(reverse(f'gimnasio:{nombre_url}'), parametros)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_pagos_csv_con_filtros_y_sin_instanciar_modelos(self):
+        hoy = timezone.now().date()
+        for socio, estado in [(self.socio, 'pendiente'), (self.otro, 'pendiente'), (self.otro, 'pagado')]:
+            Pago.objects.create(socio=socio, tipo_pago='mensual', importe=40, concepto="Cuota",
+                                fecha_vencimiento=hoy, estado=estado)
+
+        with mock.patch.object(Pago, 'from_db', side_effect=AssertionError('no debe crear instancias')):
+            response, contenido = self.descargar('exportar_pagos', estado='pendiente', socio=self.otro.id)
+
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        filas = list(csv.reader(StringIO(contenido.decode('utf-8-sig'))))
+        self.assertEqual(filas[0][:3], ['ID', 'Usuario', 'Nombre'])
+        self.assertEqual(len(filas), 2)
+        self.assertEqual(filas[1][1:3], ['socio.otro', 'Íñigo'])
+        self.assertEqual((filas[1][5], filas[1][11]), ('Cuota Mensual', 'Pendiente'))
+
+    def test_reservas_xlsx(self):
+        ReservaService.reservar(self.socio, self.sesion)
+        ReservaService.reservar(self.otro, self.sesion)
+
+        response, contenido = self.descargar('exportar_reservas', clase=self.clase.id, formato='xlsx')
+
+        self.assertIn('reservas_', response['Content-Disposition'])
+        hoja = load_workbook(BytesIO(contenido), read_only=True).active
+        filas = list(hoja.iter_rows(values_only=True))
+        self.assertEqual(filas[0][:3], ('ID', 'Fecha', 'Clase'))
+        self.assertEqual(sorted(fila[5] for fila in filas[1:]), ['socio.otro', 'socio.test'])
+        self.assertEqual(filas[1][2], 'Spinning')
+
+    def test_socios_con_busqueda(self):
+        response, contenido = self.descargar('exportar_socios', search='Íñigo')
+        filas = list(csv.reader(StringIO(contenido.decode('utf-8-sig'))))
+        self.assertEqual([fila[0] for fila in filas[1:]], ['socio.otro'])
+
+
+# ===============================
+# CONCILIACIÓN DE REMESAS
+# ===============================
+class ConciliacionTestCase(TestCase):
+
+    def setUp(self):
+        self.ana = crear_socio("ana")
+        self.luis = crear_socio("luis")
+        self.hoy = timezone.now().date()
+
+    def pago(self, socio, concepto, importe=40, **extra):
+        return Pago.objects.create(socio=socio, tipo_pago='mensual', importe=importe, concepto=concepto,
+                                   fecha_emision=self.hoy, fecha_vencimiento=self.hoy, **extra)
+
+    def conciliar(self, contenido, nombre='remesa.csv'):
+        return ConciliacionService.conciliar(ConciliacionService.leer(BytesIO(contenido.encode()), nombre))
+
+    def test_cobros_devoluciones_y_descuadres(self):
+        cobrar = self.pago(self.ana, "Cuota Mensual 2026-10")
+        devolver = self.pago(self.luis, "Cuota Mensual 2026-10", estado='vencido')
+        ya_cobrado = self.pago(self.ana, "Matrícula", importe=25, estado='pagado', metodo_pago='domiciliacion',
+                               fecha_pago=self.hoy - timedelta(days=10))
+        hoy = self.hoy.isoformat()
+
+        resultado = self.conciliar(
+            "referencia;importe;concepto;resultado;fecha;motivo\n"
+            f"ANA;40,00;cuota mensual  2026-10;ACSC;{hoy};\n"
+            f"luis;40.00;Cuota Mensual 2026-10;devuelto;{hoy};AM04\n"
+            f"ana;25,00;Matrícula;RJCT;{hoy};MD06\n"
+            f"ana;40,00;Cuota Mensual 2026-10;ACSC;{hoy};\n"  # repetida: ya no queda pendiente
+            f"nadie;40,00;Cuota Mensual 2026-10;ACSC;{hoy};\n"
+            "luis;cuarenta;Cuota;ACSC;ayer;\n"
+        )
+
+        self.assertEqual((resultado.lineas, resultado.pagados, resultado.devueltos), (6, 1, 2))
+        self.assertEqual([d.numero for d in resultado.descuadres], [5, 6, 7])
+
+        cobrar.refresh_from_db()
+        self.assertEqual((cobrar.estado, cobrar.metodo_pago, cobrar.fecha_pago), ('pagado', 'domiciliacion', self.hoy))
+        devolver.refresh_from_db()
+        ya_cobrado.refresh_from_db()
+        self.assertEqual((devolver.estado, ya_cobrado.estado), ('devuelto', 'devuelto'))
+        self.assertIn('MD06', ya_cobrado.observaciones)
+        self.assertIsNone(ya_cobrado.fecha_pago)
+
+        # El resumen diario queda igual que si se reconstruyera
+        incremental = set(ResumenDiarioPagos.objects.exclude(pagos=0).values_list(
+            'fecha', 'tipo_pago', 'metodo_pago', 'estado', 'pagos', 'importe'))
+        ResumenDiarioPagos.reconstruir()
+        self.assertEqual(incremental, set(ResumenDiarioPagos.objects.values_list(
+            'fecha', 'tipo_pago', 'metodo_pago', 'estado', 'pagos', 'importe')))
+        self.assertEqual(ResumenDiarioPagos.total(estado__in=Pago.ESTADOS_PENDIENTES), 65)
+
+        informe = StringIO()
+        resultado.escribir_informe(informe)
+        self.assertIn('nadie;40.00', informe.getvalue())
+
+    def test_pain002(self):
+        pago = self.pago(self.ana, "Cuota Mensual 2026-10")
+        xml = f"""<?xml version="1.0" encoding="UTF-8"?>
+<Document xmlns="urn:iso:std:iso:20022:tech:xsd:pain.002.001.03"><CstmrPmtStsRpt>
+  <OrgnlPmtInfAndSts><TxInfAndSts>
+    <OrgnlEndToEndId>E2E-1</OrgnlEndToEndId><TxSts>RJCT</TxSts>
+    <StsRsnInf><Rsn><Cd>AM04</Cd></Rsn></StsRsnInf>
+    <OrgnlTxRef>
+      <Amt><InstdAmt Ccy="EUR">40.00</InstdAmt></Amt><ReqdColltnDt>{self.hoy.isoformat()}</ReqdColltnDt>
+      <PmtTpInf><LclInstrm><Cd>CORE</Cd></LclInstrm></PmtTpInf>
+      <MndtRltdInf><MndtId>ana</MndtId></MndtRltdInf>
+      <RmtInf><Ustrd>Cuota Mensual 2026-10</Ustrd></RmtInf>
+    </OrgnlTxRef>
+  </TxInfAndSts></OrgnlPmtInfAndSts>
+</CstmrPmtStsRpt></Document>"""
+
+        resultado = self.conciliar(xml, 'pain002.xml')
+
+        self.assertEqual(resultado.devueltos, 1)
+        pago.refresh_from_db()
+        self.assertEqual(pago.estado, 'devuelto')
+        self.assertIn('AM04', pago.observaciones)
+
+    def test_vista_sube_el_fichero_y_descarga_los_descuadres(self):
+        pago = self.pago(self.ana, "Cuota Mensual 2026-10")
+        admin = User.objects.create_superuser(username="admin.remesa", password="test1234")
+        self.client.force_login(admin)
+        contenido = (
+            "referencia,importe,concepto,resultado,fecha\n"
+            f"ana,40.00,Cuota Mensual 2026-10,cobrado,{self.hoy.isoformat()}\n"
+            f"luis,12.00,Otra cosa,cobrado,{self.hoy.isoformat()}\n"
+        ).encode()
+
+        response = self.client.post(reverse('gimnasio:conciliar_remesa'), {
+            'fichero': SimpleUploadedFile('remesa.csv', contenido), 'informe': 'on',
+        })
+
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('sin pago pendiente', response.content.decode())
+        pago.refresh_from_db()
+        self.assertEqual(pago.estado, 'pagado')
+
+        response = self.client.post(reverse('gimnasio:conciliar_remesa'), {
+            'fichero': SimpleUploadedFile('remesa.csv', b'socio;importe\n'),
+        }, follow=True)
+        self.assertContains(response, 'Faltan columnas')
+
+    def test_descarta_las_facturas_guardadas_de_los_pagos_conciliados(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        cobrar = self.pago(self.ana, "Cuota Mensual 2026-10")
+        otro = self.pago(self.luis, "Cuota Mensual 2026-10")
+        guardadas = Path(directorio.name) / facturas.DIRECTORIO
+        guardadas.mkdir()
+        for pago in (cobrar, otro):
+            (guardadas / f'{pago.pk}-antigua.pdf').write_bytes(b'%PDF')
+
+        with override_settings(MEDIA_ROOT=directorio.name), self.captureOnCommitCallbacks(execute=True):
+            self.conciliar(
+                "referencia;importe;concepto;resultado;fecha;motivo\n"
+                f"ana;40,00;Cuota Mensual 2026-10;ACSC;{self.hoy.isoformat()};\n"
+            )
+
+        self.assertEqual([p.name for p in guardadas.iterdir()], [f'{otro.pk}-antigua.pdf'])
+
+    @tag('lento')
+    def test_fichero_sintetico_de_100k_lineas(self):
+        socios = [crear_socio(f"remesa{i}") for i in range(100)]
+        Pago.objects.bulk_create([
+            Pago(socio=socio, tipo_pago='mensual', importe=40, concepto=f"Cuota {n}",
+                 fecha_emision=self.hoy, fecha_vencimiento=self.hoy)
+            for socio in socios for n in range(1000)
+        ], batch_size=5000)
+        ResumenDiarioPagos.reconstruir()
+
+        hoy = self.hoy.isoformat()
+        lineas = ["referencia;importe;concepto;resultado;fecha;motivo"]
+        for i in range(100_000):
+            socio, n = socios[i % 100].username, i // 100
+            if i % 50 == 0:
+                lineas.append(f"{socio};41,00;Cuota {n};ACSC;{hoy};")  # importe que no cuadra
+            else:
+                lineas.append(f"{socio};40,00;Cuota {n};{'RJCT' if i % 10 == 1 else 'ACSC'};{hoy};AC04")
+
+        inicio = time.perf_counter()
+        with CaptureQueriesContext(connection) as consultas:
+            resultado = self.conciliar("\n".join(lineas))
+        segundos = time.perf_counter() - inicio
+
+        self.assertEqual(resultado.lineas, 100_000)
+        self.assertEqual(len(resultado.descuadres), 2_000)
+        self.assertEqual(resultado.devueltos, 10_000)
+        self.assertEqual(resultado.pagados, 88_000)
+        # Consultas por lote de 1000, no por línea
+        self.assertLess(len(consultas), 100 * 15)
+        self.assertEqual(Pago.objects.filter(estado='pagado').count(), 88_000)
+        self.assertEqual(ResumenDiarioPagos.total(estado='pagado'), 88_000 * 40)
+        logger.info("100k líneas conciliadas en %.1fs (%d consultas)", segundos, len(consultas))
+
+
+# ===============================
+# ESTADÍSTICAS DEL PANEL
+# ===============================
+class EstadisticasServiceTestCase(BaseReservasTestCase):
+
+    def setUp(self):
+        super().setUp()
+        EstadisticasService.invalidar()
+        self.addCleanup(EstadisticasService.invalidar)
+        self.admin = User.objects.create_superuser(username="admin.kpi", password="test1234")
+        self.client.force_login(self.admin)
+        hoy = timezone.now().date()
+        for i in range(3):
+            Reserva.objects.create(socio=crear_socio(f"kpi{i}"), clase=self.clase, fecha=hoy + timedelta(days=i))
+        Pago.objects.create(socio=self.socio, tipo_pago='mensual', importe=40, concepto="Cuota",
+                            fecha_emision=hoy, fecha_vencimiento=hoy)
+        Pago.objects.create(socio=self.socio, tipo_pago='matricula', importe=25, concepto="Matrícula",
+                            fecha_emision=hoy, fecha_vencimiento=hoy, estado='pagado', fecha_pago=hoy)
+
+    def test_calcula_los_indicadores_con_consultas_agregadas(self):
+        with self.assertNumQueries(5):
+            datos = EstadisticasService.calcular()
+
+        self.assertEqual(datos['total_socios'], 4)
+        self.assertEqual((datos['total_monitores'], datos['total_clases']), (1, 1))
+        self.assertEqual((datos['reservas_hoy'], datos['reservas_semana']), (1, 3))
+        self.assertEqual((datos['pagos_pendientes'], datos['ingresos_mes']), (1, 25))
+        self.assertEqual(datos['clases_populares'][0].num_reservas, 3)
+
+    def test_pendientes_incluyen_vencidos_y_devueltos(self):
+        hoy = timezone.now().date()
+        for estado in ('vencido', 'devuelto'):
+            Pago.objects.create(socio=self.socio, tipo_pago='mensual', importe=40, concepto=f"Cuota {estado}",
+                                fecha_emision=hoy, fecha_vencimiento=hoy, estado=estado)
+
+        self.assertEqual(EstadisticasService.calcular()['pagos_pendientes'], 3)
+
+    def test_las_vistas_reutilizan_la_cache(self):
+        with CaptureQueriesContext(connection) as primera:
+            response = self.client.get(reverse('gimnasio:estadisticas'))
+        self.assertContains(response, "Carlos")  # monitor de la clase popular, sin consulta extra
+        with CaptureQueriesContext(connection) as segunda:
+            self.client.get(reverse('gimnasio:estadisticas'))
+        self.assertEqual(len(primera) - len(segunda), 5)
+
+        with CaptureQueriesContext(connection) as inicio:
+            response = self.client.get(reverse('gimnasio:inicio'))
+        self.assertEqual(response.context['total_socios'], 4)
+        self.assertFalse(any('gimnasio_monitor' in q['sql'] for q in inicio.captured_queries))
+
+    def test_se_invalida_al_cambiar_reservas_y_pagos(self):
+        self.assertEqual(EstadisticasService.obtener()['reservas_hoy'], 1)
+
+        reserva = ReservaService.reservar(crear_socio("kpi.nuevo"), self.sesion).reserva
+        self.assertEqual(EstadisticasService.obtener()['reservas_semana'], 4)
+
+        ReservaService.cancelar(reserva)
+        self.assertEqual(EstadisticasService.obtener()['reservas_semana'], 3)
+
+        pago = Pago.objects.get(estado='pendiente')
+        pago.estado = 'pagado'
+        pago.fecha_pago = timezone.now().date()
+        pago.save()
+        self.assertEqual(EstadisticasService.obtener()['ingresos_mes'], 65)
+
+        Monitor.objects.filter(pk=self.monitor.pk).update(activo=False)  # sin señal: queda la cache
+        self.assertEqual(EstadisticasService.obtener()['total_monitores'], 1)
+        pasado_el_ttl = time.monotonic() + settings.ESTADISTICAS_TTL + 1
+        with mock.patch('gimnasio.estadisticas_service.time.monotonic', return_value=pasado_el_ttl):
+            self.assertEqual(EstadisticasService.obtener()['total_monitores'], 0)
+
+
+# ===============================
+# CONTADORES DE ASISTENCIA POR SESIÓN
+# ===============================
+class AsistenciaSesionesTestCase(BaseReservasTestCase):
+
+    def contadores(self, sesion):
+        sesion.refresh_from_db()
+        return sesion.reservas_activas, sesion.reservadas, sesion.canceladas, sesion.asistencias
+
+    def test_se_mantienen_al_reservar_cancelar_y_pasar_lista(self):
+        socios = [self.socio] + [crear_socio(f"asiste{i}") for i in range(4)]
+        reservas = [ReservaService.reservar(socio, self.sesion).reserva for socio in socios[:3]]
+        ReservaService.apuntar_lista_espera(socios[3], self.sesion)
+        self.assertEqual(self.contadores(self.sesion), (3, 3, 0, 0))
+
+        ReservaService.cancelar(reservas[0])  # la plaza pasa al primero de la lista de espera
+        self.assertEqual(self.contadores(self.sesion), (3, 3, 1, 0))
+        ReservaService.cancelar(reservas[1])
+        self.assertEqual(self.contadores(self.sesion), (2, 2, 2, 0))
+        ReservaService.reservar(socios[1], self.sesion)  # reactiva la cancelada
+        self.assertEqual(self.contadores(self.sesion), (3, 3, 1, 0))
+
+        activas = Reserva.objects.filter(sesion=self.sesion, cancelada=False)
+        ReservaService.registrar_asistencia(self.sesion, list(activas.values_list('pk', flat=True)[:2]))
+        self.assertEqual(self.contadores(self.sesion), (3, 3, 1, 2))
+        ReservaService.registrar_asistencia(self.sesion, [activas.first().pk])
+        self.assertEqual(self.contadores(self.sesion), (3, 3, 1, 1))
+
+        activas.filter(asistio=True).delete()
+        Reserva.objects.filter(sesion=self.sesion, cancelada=True).delete()
+        self.assertEqual(self.contadores(self.sesion), (2, 2, 0, 0))
+
+        ReservaService.reservar_serie(socios[4], self.sesion, 3)
+        self.assertEqual(SesionClase.asistencia_desincronizada(), [])
+
+    def test_reconstruir_corrige_los_contadores(self):
+        reserva = ReservaService.reservar(self.socio, self.sesion).reserva
+        Reserva.objects.filter(pk=reserva.pk).update(asistio=True)  # sin pasar por el servicio
+        salida = StringIO()
+        call_command('ocupacion_sesiones', '--verificar', stdout=salida)
+        self.assertIn('1 sesiones desincronizadas', salida.getvalue())
+
+        call_command('ocupacion_sesiones', stdout=StringIO())
+        self.assertEqual(self.contadores(self.sesion), (1, 1, 0, 1))
+
+    def test_editar_la_asistencia_desde_el_admin_actualiza_el_reporte(self):
+        reserva = ReservaService.reservar(self.socio, self.sesion).reserva
+        admin = User.objects.create_superuser(username="admin.lista", password="test1234")
+        self.client.force_login(admin)
+        formulario = {
+            'socio': self.socio.pk, 'clase': self.clase.pk, 'fecha': self.fecha.isoformat(),
+            'asistio': 'on', 'cancelada': '',
+        }
+
+        url = reverse('admin:gimnasio_reserva_change', args=[reserva.pk])
+        self.assertEqual(self.client.post(url, formulario).status_code, 302)
+        self.assertEqual(self.contadores(self.sesion), (1, 1, 0, 1))
+        informe = self.client.get(reverse('gimnasio:reporte_asistencia'), {'historico': 1})
+        clase = informe.context['clases_con_asistencia'][0]
+        self.assertEqual((clase.total_asistencias, clase.tasa_asistencia), (1, 100.0))
+
+        self.client.post(url, dict(formulario, asistio='', cancelada='on'))
+        self.assertEqual(self.contadores(self.sesion), (0, 0, 1, 0))
+        self.assertEqual(SesionClase.asistencia_desincronizada(), [])
+
+    def test_reporte_por_rango_de_fechas(self):
+        otra = SesionClase.obtener(self.clase, self.fecha + timedelta(weeks=1))
+        socios = [self.socio] + [crear_socio(f"rango{i}") for i in range(2)]
+        reservas = [ReservaService.reservar(socio, self.sesion).reserva for socio in socios]
+        ReservaService.cancelar(reservas[2])
+        ReservaService.registrar_asistencia(self.sesion, [reservas[0].pk])
+        ReservaService.reservar(self.socio, otra)
+
+        with self.assertNumQueries(2):
+            clase, = InformeService.asistencia_por_clase(self.fecha, self.fecha)
+        self.assertEqual((clase.total_sesiones, clase.total_reservas, clase.total_canceladas), (1, 2, 1))
+        self.assertEqual((clase.ocupacion, clase.tasa_asistencia, clase.tasa_cancelacion), (66.7, 50.0, 33.3))
+
+        admin = User.objects.create_superuser(username="admin.asistencia", password="test1234")
+        self.client.force_login(admin)
+        url = reverse('gimnasio:reporte_asistencia')
+        clase = self.client.get(url, {'desde': self.fecha.isoformat(), 'hasta': otra.fecha.isoformat()}).context[
+            'clases_con_asistencia'][0]
+        self.assertEqual((clase.total_sesiones, clase.total_reservas), (2, 3))
+        clase = self.client.get(url, {'hasta': (self.fecha - timedelta(days=1)).isoformat()}).context[
+            'clases_con_asistencia'][0]
+        self.assertEqual((clase.total_reservas, clase.ocupacion), (0, None))
+        self.assertRedirects(self.client.get(url, {'desde': 'ayer'}), url)
+
+
+# ===============================
+# CATÁLOGO DE EJERCICIOS (wger)
+# ===============================
+class SesionGrabada:
+    """Sustituye a requests.Session: responde con los JSON grabados de gimnasio/test_data/wger"""
+    CARPETA = Path(__file__).parent / 'test_data' / 'wger'
+
+    def __init__(self, cambios=None):
+        self.cambios = cambios or {}
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        partes = urlsplit(url)
+        recurso = partes.path.rstrip('/').rsplit('/', 1)[-1]
+        offset = str((params or {}).get('offset', 0))
+        nombre = recurso if offset == '0' else f'{recurso}_{offset}'  # exerciseimage_2.json = offset 2
+        datos = json.loads((self.CARPETA / f'{nombre}.json').read_text())
+        if recurso in self.cambios:
+            datos['results'] = self.cambios[recurso](datos['results'])
+
+        respuesta = requests.Response()
+        respuesta.status_code = 200
+        respuesta.url = url
+        respuesta._content = json.dumps(datos).encode()
+        return respuesta
+
+
+class CatalogoWgerTestCase(TestCase):
+
+    def sincronizar(self, **opciones):
+        return WgerService.sincronizar(Descargador(SesionGrabada(**opciones)))
+
+    def test_sincroniza_y_fusiona_con_el_respaldo(self):
+        resultado = self.sincronizar()
+
+        self.assertEqual((resultado.ejercicios, resultado.imagenes, resultado.categorias), (5, 3, 4))
+        self.assertEqual((resultado.origen['nombre_respaldo'], resultado.origen['imagen_api']), (1, 2))
+
+        axe, curl, crunch, gemelos, estiramiento = Ejercicio.objects.select_related('categoria')
+        self.assertTrue(axe.imagen.endswith('Axe-hold-1.png'))  # la principal
+        self.assertEqual(curl.nombre, 'Curl de bíceps con mancuerna')
+        self.assertTrue(curl.imagen.endswith('Dumbbell-curl.png'))
+        self.assertEqual(crunch.descripcion, 'Ejercicio de abs. Consulta con tu entrenador.')
+        self.assertEqual((crunch.imagen, crunch.imagen_respaldo), ('/static/images/ejercicios/abdominales.jpg', True))
+        self.assertEqual(gemelos.categoria.nombre, 'Pantorrillas')
+        self.assertEqual(list(gemelos.musculos.values_list('nombre', flat=True)), ['Soleus'])
+        self.assertIsNone(estiramiento.categoria)
+
+        # Resincronizar actualiza y quita lo que ya no está en wger
+        self.sincronizar(cambios={'exercise': lambda ejercicios: [
+            dict(e, name='Axe Hold (static)') if e['id'] == 31 else e for e in ejercicios if e['id'] != 200
+        ]})
+        self.assertEqual(Ejercicio.objects.count(), 4)
+        self.assertEqual(Ejercicio.objects.get(pk=31).nombre, 'Axe Hold (static)')
+        self.assertEqual(Ejercicio.objects.get(pk=31).musculos.count(), 1)
+
+    def test_la_api_sirve_el_catalogo_sin_llamar_a_wger(self):
+        self.sincronizar()
+        self.client.force_login(crear_socio("socio.rutinas"))
+
+        with mock.patch('requests.Session.send', side_effect=AssertionError('llamada a la red')):
+            response = self.client.get(reverse('gimnasio:api_rutinas'))
+
+        rutinas = {rutina['id']: rutina for rutina in response.json()['results']}
+        self.assertEqual(len(rutinas), 5)
+        self.assertEqual(rutinas[31]['category'], 'Arms')
+        self.assertEqual(rutinas[31]['muscles'], ['Anterior deltoid'])
+        self.assertEqual(rutinas[105]['equipment'], ['Sin equipo'])
+        self.assertEqual(rutinas[200]['category'], 'General')
+        self.assertTrue(rutinas[200]['is_fallback_image'])
+
+    def test_un_fallo_de_red_conserva_el_catalogo(self):
+        self.sincronizar()
+        with mock.patch.object(requests.Session, 'get', side_effect=requests.ConnectionError('wger.de no responde')), \
+                mock.patch.object(Descargador, 'ESPERA', 0):
+            with self.assertRaises(CommandError):
+                call_command('sync_wger', stdout=StringIO())
+        self.assertEqual(Ejercicio.objects.count(), 5)
+
+
+class BusquedaRutinasTestCase(TestCase):
+
+    def setUp(self):
+        WgerService.sincronizar(Descargador(SesionGrabada()))
+        self.client.force_login(crear_socio("socio.busqueda"))
+
+    def buscar(self, **parametros):
+        response = self.client.get(reverse('gimnasio:api_rutinas'), parametros)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_filtra_por_facetas_y_texto_con_contadores(self):
+        datos = self.buscar(category='8')
+        self.assertEqual((datos['count'], [r['id'] for r in datos['results']]), (2, [31, 74]))
+        # La faceta filtrada cuenta sin su propio filtro; las demás, dentro de la selección
+        categorias = {valor['id']: (valor['count'], valor['selected']) for valor in datos['facets']['category']}
+        self.assertEqual(categorias, {'8': (2, True), '10': (1, False), '14': (1, False), '0': (1, False)})
+        self.assertEqual({valor['name']: valor['count'] for valor in datos['facets']['muscle']},
+                         {'Anterior deltoid': 1, 'Biceps brachii': 1})
+
+        # OR dentro de una faceta, AND entre facetas
+        self.assertEqual([r['id'] for r in self.buscar(category='8,10', equipment='3')['results']], [31, 74])
+        self.assertEqual([r['id'] for r in self.buscar(category=['8', '10'], equipment='7')['results']], [91])
+        self.assertEqual([r['id'] for r in self.buscar(equipment='0')['results']], [105, 200])
+        # Por prefijo y sin tildes (el 74 tiene el nombre del respaldo: 'Curl de bíceps con mancuerna')
+        self.assertEqual([r['id'] for r in self.buscar(q='BICEP')['results']], [74])
+        self.assertEqual(self.buscar(q='curl', category='10')['count'], 0)
+
+    def test_pagina_por_numero_y_por_cursor(self):
+        primera = self.buscar(limit=2)
+        self.assertEqual(([r['id'] for r in primera['results']], primera['next']), ([31, 74], 91))
+        self.assertEqual([r['id'] for r in self.buscar(limit=2, page=3)['results']], [200])
+        siguiente = self.buscar(limit=2, cursor=primera['next'])
+        self.assertEqual(([r['id'] for r in siguiente['results']], siguiente['next']), ([91, 105], 200))
+        self.assertIsNone(self.buscar(limit=2, cursor=200)['next'])
+
+        for parametros in ({'limit': 0}, {'page': 'dos'}, {'limit': BuscadorEjercicios.MAXIMO_POR_PAGINA + 1}):
+            self.assertEqual(self.client.get(reverse('gimnasio:api_rutinas'), parametros).status_code, 400)
+
+    def test_los_indices_se_rehacen_al_sincronizar(self):
+        self.assertEqual(self.buscar(q='stretching')['count'], 1)
+        # Con el índice ya en memoria: sesión y usuario, fecha del índice, la página (con sus M2M) e imágenes
+        with self.assertNumQueries(7):
+            self.buscar(category='8', limit=1)
+
+        WgerService.sincronizar(Descargador(SesionGrabada(cambios={'exercise': lambda ejercicios: [
+            dict(e, name='Stretching routine') if e['id'] == 200 else e for e in ejercicios if e['id'] != 31
+        ]})))
+        self.assertEqual(self.buscar(q='routine')['count'], 1)
+        self.assertEqual([r['id'] for r in self.buscar(category='8')['results']], [74])
+
+
+class ServidorPaginado(BaseHTTPRequestHandler):
+    """API paginada de prueba: 1000 registros, como mucho 20 por página, 20 ms por respuesta"""
+    TOTAL = 1000
+    MAXIMO_POR_PAGINA = 20
+
+    def do_GET(self):
+        estado = self.server.estado
+        partes = urlsplit(self.path)
+        consulta = {clave: valor[0] for clave, valor in parse_qs(partes.query).items()}
+        offset, limit = int(consulta.get('offset', 0)), min(int(consulta.get('limit', 20)), self.MAXIMO_POR_PAGINA)
+        with estado['cerrojo']:
+            estado['peticiones'] += 1
+            estado['en_curso'] += 1
+            estado['maximo'] = max(estado['maximo'], estado['en_curso'])
+            fallar = offset in estado['fallar']
+            estado['fallar'].discard(offset)
+        try:
+            time.sleep(estado['retardo'])
+            if partes.path.endswith('/no-existe/'):
+                return self.responder(404, {'detail': 'Not found.'})
+            if fallar:
+                return self.responder(503, {'detail': 'Service unavailable'})
+            siguiente = offset + limit < self.TOTAL
+            self.responder(200, {
+                'count': self.TOTAL,
+                'next': f'http://{self.headers["Host"]}{partes.path}?limit={limit}&offset={offset + limit}' if siguiente else None,
+                'previous': None,
+                'results': [{'id': i} for i in range(offset, min(offset + limit, self.TOTAL))],
+            })
+        finally:
+            with estado['cerrojo']:
+                estado['en_curso'] -= 1
+
+    def responder(self, codigo, datos):
+        cuerpo = json.dumps(datos).encode()
+        self.send_response(codigo)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        try:
+            self.wfile.write(cuerpo)
+        except BrokenPipeError:
+            pass  # el cliente ya se fue por timeout
+
+    def log_message(self, *args):
+        pass
+
+
+def arrancar_servidor(test, manejador, **estado):
+    """Levanta `manejador` en un puerto libre mientras dura el test; devuelve (servidor, url de la API)"""
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), manejador)
+    servidor.daemon_threads = True
+    servidor.estado = {'cerrojo': threading.Lock(), 'peticiones': 0, **estado}
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    test.addCleanup(servidor.server_close)
+    test.addCleanup(servidor.shutdown)
+    return servidor, f'http://127.0.0.1:{servidor.server_port}/api/v2/'
+
+
+class DescargadorTestCase(TestCase):
+
+    def setUp(self):
+        self.servidor, self.url = arrancar_servidor(
+            self, ServidorPaginado, en_curso=0, maximo=0, fallar=set(), retardo=0.02
+        )
+        sin_espera = mock.patch.object(Descargador, 'ESPERA', 0)
+        sin_espera.start()
+        self.addCleanup(sin_espera.stop)
+
+    def test_pide_las_paginas_a_la_vez_respetando_el_limite_por_host(self):
+        self.servidor.estado['fallar'] = {100, 500}  # un 503 en dos páginas: se reintentan
+        descargador = Descargador(hilos=8, por_host=3)
+
+        resultados = descargador.listados({'items': (f'{self.url}items/', {'limit': 200})})
+
+        self.assertEqual([fila['id'] for fila in resultados['items']], list(range(1000)))
+        self.assertEqual(descargador.paginas, 50)
+        self.assertEqual(self.servidor.estado['peticiones'], 52)
+        self.assertGreater(self.servidor.estado['maximo'], 1)
+        self.assertLessEqual(self.servidor.estado['maximo'], 3)
+        self.assertGreater(descargador.paginas_por_segundo, 0)
+
+    def test_errores_que_no_se_reintentan_y_timeouts(self):
+        descargador = Descargador(reintentos=2)
+        with self.assertRaises(requests.HTTPError):
+            descargador.listados({'nada': (f'{self.url}no-existe/', {})})
+        self.assertEqual(self.servidor.estado['peticiones'], 1)
+
+        self.servidor.estado['retardo'] = 0.5
+        with self.assertRaises(requests.Timeout):
+            Descargador(reintentos=1, timeout=0.1).pedir(f'{self.url}items/')
+        self.assertEqual(self.servidor.estado['peticiones'], 3)
+
+
+class ServidorWger(BaseHTTPRequestHandler):
+    """
+    wger de prueba: sirve los JSON grabados con ETag y responde 304 a
+    If-None-Match si no han cambiado. Las imágenes apuntan a este servidor,
+    que las dibuja al vuelo (o devuelve estado['imagenes'][nombre] si está).
+    """
+
+    def do_GET(self):
+        estado = self.server.estado
+        partes = urlsplit(self.path)
+        if partes.path.startswith('/media/'):
+            return self.imagen(partes.path.rsplit('/', 1)[-1])
+        recurso = partes.path.rstrip('/').rsplit('/', 1)[-1]
+        offset = parse_qs(partes.query).get('offset', ['0'])[0]
+        nombre = recurso if offset == '0' else f'{recurso}_{offset}'
+        texto = (SesionGrabada.CARPETA / f'{nombre}.json').read_text()
+        datos = json.loads(texto.replace('https://wger.de/', f'http://{self.headers["Host"]}/'))
+        if recurso in estado['cambios']:
+            datos['results'] = estado['cambios'][recurso](datos['results'])
+        cuerpo = json.dumps(datos).encode()
+        etag = f'"{hashlib.md5(cuerpo).hexdigest()}"'
+
+        with estado['cerrojo']:
+            estado['peticiones'] += 1
+            no_modificada = estado['etags'] and self.headers.get('If-None-Match') == etag
+            estado['no_modificadas'] += no_modificada
+        if no_modificada:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        if estado['etags']:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def imagen(self, nombre):
+        estado = self.server.estado
+        with estado['cerrojo']:
+            estado['descargas'] += 1
+        cuerpo = estado['imagenes'].get(nombre)
+        if cuerpo is None:
+            salida = BytesIO()
+            Image.new('RGB', (800, 600), tuple(hashlib.md5(nombre.encode()).digest()[:3])).save(salida, 'PNG')
+            cuerpo = salida.getvalue()
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+
+def servidor_wger(test):
+    """Arranca ServidorWger y apunta WgerService a él mientras dura el test"""
+    servidor, url = arrancar_servidor(
+        test, ServidorWger, etags=True, no_modificadas=0, cambios={}, descargas=0, imagenes={}
+    )
+    otra_api = mock.patch.object(WgerService, 'URL_API', url)
+    otra_api.start()
+    test.addCleanup(otra_api.stop)
+    return servidor
+
+
+class SincronizacionIncrementalTestCase(TestCase):
+
+    def setUp(self):
+        self.servidor = servidor_wger(self)
+
+    def sincronizar_sin_escrituras(self):
+        with CaptureQueriesContext(connection) as consultas:
+            resultado = WgerService.sincronizar()
+        escrituras = [
+            consulta['sql'] for consulta in consultas.captured_queries
+            if consulta['sql'].lstrip().split(None, 1)[0].upper() in ('INSERT', 'UPDATE', 'DELETE')
+        ]
+        self.assertEqual(escrituras, [])
+        return resultado
+
+    def test_sin_cambios_en_wger_no_se_escribe_nada(self):
+        resultado = WgerService.sincronizar()
+        self.assertEqual((resultado.anadidos, resultado.cambiados, resultado.no_modificadas), (5, 0, 0))
+        self.assertEqual(PaginaWger.objects.count(), 6)  # exerciseimage tiene dos páginas
+
+        resultado = self.sincronizar_sin_escrituras()
+
+        self.assertEqual(self.servidor.estado['no_modificadas'], 6)
+        self.assertEqual((resultado.paginas, resultado.no_modificadas), (6, 6))
+        self.assertEqual((resultado.anadidos, resultado.cambiados, resultado.eliminados), (0, 0, 0))
+        self.assertEqual(Ejercicio.objects.count(), 5)
+        self.assertEqual(Ejercicio.objects.get(pk=74).musculos.count(), 1)
+
+    def test_sin_etag_la_huella_evita_las_escrituras(self):
+        self.servidor.estado['etags'] = False
+        WgerService.sincronizar()
+        self.assertFalse(PaginaWger.objects.exists())
+
+        resultado = self.sincronizar_sin_escrituras()
+
+        self.assertEqual((resultado.no_modificadas, resultado.cambiados), (0, 0))
+
+    def test_solo_se_escribe_lo_que_cambia(self):
+        WgerService.sincronizar()
+        antes = Ejercicio.objects.get(pk=74).sincronizado
+        self.servidor.estado['cambios'] = {'exercise': lambda ejercicios: [
+            dict(e, name='Axe Hold (static)', muscles=[]) if e['id'] == 31 else e for e in ejercicios if e['id'] != 200
+        ]}
+
+        salida = StringIO()
+        call_command('sync_wger', '--sin-imagenes', stdout=salida)
+
+        self.assertIn('0 añadidos, 1 cambiados, 1 eliminados', salida.getvalue())
+        self.assertEqual(self.servidor.estado['no_modificadas'], 5)  # solo cambió la página de ejercicios
+        axe = Ejercicio.objects.get(pk=31)
+        self.assertEqual((axe.nombre, axe.musculos.count()), ('Axe Hold (static)', 0))
+        self.assertEqual(Ejercicio.objects.get(pk=74).sincronizado, antes)
+        self.assertEqual(Ejercicio.objects.get(pk=74).musculos.count(), 1)
+        self.assertFalse(Ejercicio.objects.filter(pk=200).exists())
+
+
+class EspejoImagenesTestCase(TestCase):
+
+    def setUp(self):
+        self.servidor = servidor_wger(self)
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(MEDIA_ROOT=Path(directorio.name))
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.raiz = Path(directorio.name)
+        WgerService.sincronizar()
+
+    def test_copia_las_imagenes_en_webp_y_la_api_las_sirve(self):
+        salida = StringIO()
+        call_command('sync_wger', '--procesos', '1', stdout=salida)
+        self.assertIn('2 descargadas, 2 convertidas a WebP', salida.getvalue())
+
+        # Solo las que usan los ejercicios (la principal de cada uno): completa y dos miniaturas
+        self.assertEqual(len(list((self.raiz / miniaturas.DIRECTORIO).glob('*.webp'))), 6)
+        huella = ImagenEjercicio.objects.get(url__endswith='Axe-hold-1.png').huella
+        with Image.open(self.raiz / miniaturas.rutas(huella)[320]) as miniatura:
+            self.assertEqual((miniatura.format, miniatura.size), ('WEBP', (320, 200)))
+        with Image.open(self.raiz / miniaturas.rutas(huella)[None]) as completa:
+            self.assertEqual(completa.size, (800, 600))
+        self.assertEqual(ImagenEjercicio.objects.get(url__endswith='Axe-hold-2.png').huella, '')
+
+        self.client.force_login(crear_socio("socio.imagenes"))
+        rutinas = {rutina['id']: rutina for rutina in self.client.get(reverse('gimnasio:api_rutinas')).json()['results']}
+        self.assertEqual(rutinas[31]['image'], f'/media/ejercicios/{huella[:16]}-640.webp')
+        self.assertEqual(rutinas[31]['image_full'], f'/media/ejercicios/{huella[:16]}.webp')
+        self.assertIn(f'/media/ejercicios/{huella[:16]}-320.webp 320w', rutinas[31]['srcset'])
+        self.assertEqual((rutinas[91]['srcset'], rutinas[91]['is_fallback_image']), ('', True))
+
+        # Lo ya copiado no se vuelve a descargar
+        descargas = self.servidor.estado['descargas']
+        resultado = WgerService.espejar_imagenes(procesos=1)
+        self.assertEqual((resultado.imagenes, resultado.descargadas), (2, 0))
+        self.assertEqual(self.servidor.estado['descargas'], descargas)
+
+    def test_el_contenido_ya_copiado_se_salta_por_huella_y_los_errores_no_cortan(self):
+        WgerService.espejar_imagenes(procesos=1)
+        ImagenEjercicio.objects.update(huella='')  # p. ej. wger cambia la URL pero no el fichero
+
+        with mock.patch('gimnasio.wger_service.ProcessPoolExecutor') as pool:
+            resultado = WgerService.espejar_imagenes()
+        pool.assert_not_called()
+        self.assertEqual((resultado.descargadas, resultado.generadas), (2, 0))
+        self.assertEqual(ImagenEjercicio.objects.exclude(huella='').count(), 2)
+
+        ImagenEjercicio.objects.update(huella='')
+        self.servidor.estado['imagenes']['Dumbbell-curl.png'] = b'no es una imagen'
+        resultado = WgerService.espejar_imagenes(procesos=1)
+        self.assertEqual((resultado.generadas, resultado.fallidas), (0, 1))
+        curl = ImagenEjercicio.objects.get(url__endswith='Dumbbell-curl.png')
+        self.assertEqual(curl.huella, '')
@@ -40,6 +40,7 @@ urlpatterns = [
     # ===== RESERVAS =====
     path('reservas/', views.MisReservasView.as_view(), name='mis_reservas'),
     path('reservas/<int:pk>/cancelar/', views.CancelarReservaView.as_view(), name='cancelar_reserva'),
+    path('reservas/espera/<int:pk>/salir/', views.SalirListaEsperaView.as_view(), name='salir_lista_espera'),
 
     # ===== PAGOS =====
     path('pagos/', views.MisPagosView.as_view(), name='mis_pagos'),
@@ -47,22 +48,28 @@ urlpatterns = [
 
     # ===== GESTIÓN SOCIOS (ADMIN) =====
     path('usuarios/', views.GestionSocioView.as_view(), name='gestion_socios'),
+    path('usuarios/exportar/', views.ExportarSociosView.as_view(), name='exportar_socios'),
     path('usuarios/nuevo/', views.NuevoSocioView.as_view(), name='nuevo_socio'),
     path('usuarios/<int:pk>/', views.DetalleSocioView.as_view(), name='detalle_socio'),
     path('usuarios/<int:pk>/desactivar/', views.DesactivarSocioView.as_view(), name='desactivar_usuario'),
 
     # ===== GESTIÓN PAGOS (ADMIN) =====
     path('gestion-pagos/', views.GestionPagosView.as_view(), name='gestion_pagos'),
+    path('gestion-pagos/exportar/', views.ExportarPagosView.as_view(), name='exportar_pagos'),
     path('gestion-pagos/nuevo/', views.NuevoPagoView.as_view(), name='nuevo_pago'),
     path('gestion-pagos/<int:pk>/marcar-pagado/', views.MarcarPagadoView.as_view(), name='marcar_pagado'),
+    path('gestion-pagos/facturas/', views.ExportarFacturasView.as_view(), name='exportar_facturas'),
+    path('gestion-pagos/conciliar/', views.ConciliarRemesaView.as_view(), name='conciliar_remesa'),
 
     # ===== ADMIN - ASIGNAR CLASES A MONITORES =====
     path('gestion/asignar-clases/', views.AsignarClasesMonitorView.as_view(), name='asignar_clases_monitor'),
     path('gestion/clases-reservadas/', views.ClasesReservadasAdminView.as_view(), name='clases_reservadas'),
+    path('gestion/clases-reservadas/exportar/', views.ExportarReservasView.as_view(), name='exportar_reservas'),
 
     # ===== MONITOR - SUS CLASES =====
     path('monitor/mis-clases/', views.MisClasesMonitorView.as_view(), name='mis_clases_monitor'),
     path('monitor/socios-apuntados/', views.SociosApuntadosView.as_view(), name='socios_apuntados'),
+    path('monitor/sesiones/<int:pk>/asistencia/', views.PasarListaView.as_view(), name='pasar_lista'),
 
     # ===== ESTADÍSTICAS (ADMIN) =====
     path('estadisticas/', views.EstadisticasView.as_view(), name='estadisticas'),
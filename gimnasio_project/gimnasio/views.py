@@ -1,5 +1,8 @@
+import logging
+
 from django.db import models
-from django.http import HttpResponse
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views import View
 from django.views.generic import ListView, DetailView
@@ -10,24 +13,21 @@ from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
 from django.contrib import messages
 from django.utils import timezone
-from django.db.models import Q, Count, Sum
+from django.db.models import Q, Sum
 from datetime import datetime, timedelta
 from django.db import IntegrityError, transaction
 
-# Importaciones para PDF
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_CENTER
-from io import BytesIO
-
-from .models import PerfilUsuario, Monitor, Clase, Reserva, Pago
+from .models import PerfilUsuario, Monitor, Clase, Reserva, Pago, SesionClase, ListaEspera, ResumenDiarioPagos
 from .decorators import admin_required, socio_required
 from .email_service import EmailService
+from .reservas_service import ReservaService, EstadoAdmision
+from .archivo_service import ArchivoService
+from .informes_service import InformeService
+from .estadisticas_service import EstadisticasService, rango_mes
+from .conciliacion_service import ConciliacionService, FormatoNoValido
+from . import exportaciones, facturas
 
-from reportlab.lib.enums import TA_RIGHT, TA_CENTER
+logger = logging.getLogger(__name__)
 
 
 # ============================================
@@ -79,15 +79,14 @@ class InicioView(View):
             perfil = getattr(request.user, 'perfil', None)
 
             # Clases próximas
-            clases_activas = Clase.objects.filter(activa=True).order_by('dia_semana', 'hora_inicio')[:6]
+            clases_activas = Clase.objects.filter(activa=True).with_availability().order_by(
+                'dia_semana', 'hora_inicio'
+            )[:6]
 
             if perfil and perfil.rol == 'admin':
                 # Dashboard admin
+                context.update(EstadisticasService.obtener())
                 context['es_admin'] = True
-                context['total_socios'] = PerfilUsuario.objects.filter(rol='socio', activo=True).count()
-                context['total_monitores'] = Monitor.objects.filter(activo=True).count()
-                context['total_clases'] = Clase.objects.filter(activa=True).count()
-                context['pagos_pendientes'] = Pago.objects.filter(estado='pendiente').count()
             else:
                 # Dashboard socio
                 context['es_admin'] = False
@@ -119,11 +118,19 @@ class PerfilView(View):
         reservas_asistidas = Reserva.objects.filter(socio=request.user, asistio=True).count()
         pagos_realizados = Pago.objects.filter(socio=request.user, estado='pagado').count()
 
+        # Histórico archivado solo si se pide (?historico=1)
+        incluir_archivo = request.GET.get('historico') == '1'
+        if incluir_archivo:
+            archivo = ArchivoService.resumen_socio(request.user)
+            total_reservas += archivo['total']
+            reservas_asistidas += archivo['asistidas']
+
         context = {
             'perfil': perfil,
             'total_reservas': total_reservas,
             'reservas_asistidas': reservas_asistidas,
             'pagos_realizados': pagos_realizados,
+            'incluir_archivo': incluir_archivo,
         }
 
         return render(request, 'gimnasio/perfil.html', context)
@@ -320,7 +327,9 @@ class ListadoClasesView(ListView):
 
     def get_queryset(self):
         # Solo mostrar clases activas con monitores activos
-        queryset = Clase.objects.filter(activa=True, monitor__activo=True).select_related('monitor')
+        queryset = Clase.objects.filter(
+            activa=True, monitor__activo=True
+        ).select_related('monitor').with_availability()
 
         # Filtros
         dia = self.request.GET.get('dia')
@@ -438,6 +447,7 @@ class EliminarClaseView(View):
 @method_decorator([login_required, socio_required], name='dispatch')
 class MisReservasView(View):
     template_name = 'gimnasio/mis_reservas.html'
+    MAX_SEMANAS_SERIE = 12
 
     def get(self, request):
         # Listar reservas actuales
@@ -446,87 +456,82 @@ class MisReservasView(View):
             cancelada=False
         ).select_related('clase', 'clase__monitor').order_by('-fecha')
 
-        # Preparar próximas clases disponibles
-        proximas_clases = []
+        # Próximas sesiones de las 4 semanas siguientes en una sola consulta.
+        # Solo clases activas con monitores activos.
         hoy = timezone.now().date()
-        # Solo mostrar clases con monitores activos
-        clases_activas = Clase.objects.filter(
+        sesiones = SesionClase.objects.filter(
             activa=True,
-            monitor__activo=True
-        ).order_by('dia_semana', 'hora_inicio')
-
-        dias = ['L', 'M', 'X', 'J', 'V', 'S', 'D']
-        for clase in clases_activas:
-            fechas_disponibles = []
-            for i in range(28):  # Próximas 4 semanas
-                fecha = hoy + timedelta(days=i)
-                if dias[fecha.weekday()] == clase.dia_semana:
-                    reservas_fecha = Reserva.objects.filter(
-                        clase=clase,
-                        fecha=fecha,
-                        cancelada=False
-                    ).count()
-                    if reservas_fecha < clase.capacidad_maxima:
-                        fechas_disponibles.append({
-                            'fecha': fecha,
-                            'disponibles': clase.capacidad_maxima - reservas_fecha
-                        })
-            if fechas_disponibles:
-                proximas_clases.append({'clase': clase, 'fechas': fechas_disponibles[:10]})
+            clase__activa=True,
+            clase__monitor__activo=True,
+            fecha__range=(hoy, hoy + timedelta(days=27))
+        ).select_related('clase').order_by('clase__dia_semana', 'clase__hora_inicio', 'clase_id', 'fecha')
+
+        proximas_clases = []
+        for sesion in sesiones:
+            if not proximas_clases or proximas_clases[-1]['clase'].id != sesion.clase_id:
+                proximas_clases.append({'clase': sesion.clase, 'fechas': []})
+            proximas_clases[-1]['fechas'].append({
+                'sesion': sesion,
+                'fecha': sesion.fecha,
+                'disponibles': sesion.plazas_libres
+            })
+
+        # Posición en las listas de espera (una consulta por el índice de socio)
+        listas_espera = ListaEspera.objects.filter(
+            socio=request.user,
+            sesion__fecha__gte=hoy
+        ).select_related('sesion__clase').order_by('sesion__fecha')
 
         context = {
             'reservas': reservas,
+            'listas_espera': listas_espera,
             'proximas_clases': proximas_clases,
             'today': timezone.now().date(),
+            'opciones_semanas': range(1, self.MAX_SEMANAS_SERIE + 1),
         }
         return render(request, self.template_name, context)
 
     def post(self, request):
-        clase_id = request.POST.get('clase_id')
-        fecha_str = request.POST.get('fecha')
-
-        clase = get_object_or_404(Clase, pk=clase_id, activa=True)
-        fecha = datetime.strptime(fecha_str, '%Y-%m-%d').date()
-
-        # Verificar si ya existe una reserva activa para este socio, clase y fecha
-        reserva_existente = Reserva.objects.filter(
-            socio=request.user,
-            clase=clase,
-            fecha=fecha,
-            cancelada=False
-        ).first()
+        sesion = get_object_or_404(
+            SesionClase.objects.select_related('clase'),
+            pk=request.POST.get('sesion_id'),
+            activa=True,
+            clase__activa=True
+        )
+        clase = sesion.clase
+        fecha = sesion.fecha
 
-        if reserva_existente:
-            messages.error(request, 'Ya tienes una reserva para esta clase en esa fecha.')
+        # Reserva recurrente: misma clase cada semana durante N semanas
+        try:
+            semanas = int(request.POST.get('semanas', 1))
+        except ValueError:
+            semanas = 1
+        semanas = max(1, min(semanas, self.MAX_SEMANAS_SERIE))
+
+        if semanas > 1:
+            resultados = ReservaService.reservar_serie(request.user, sesion, semanas)
+            reservadas = [r.fecha.strftime('%d/%m') for r in resultados if r.reservada]
+            rechazadas = [r.fecha.strftime('%d/%m') for r in resultados if not r.reservada]
+            if reservadas:
+                messages.success(request, f'Reservas confirmadas para {clase.nombre}: {", ".join(reservadas)}.')
+            if rechazadas:
+                messages.warning(request, f'Sin plaza o ya reservadas: {", ".join(rechazadas)}.')
             return redirect('gimnasio:mis_reservas')
 
-        # Verificar si hay plazas disponibles (solo contando reservas activas)
-        reservas_activas = Reserva.objects.filter(
-            clase=clase,
-            fecha=fecha,
-            cancelada=False
-        ).count()
+        resultado = ReservaService.reservar(request.user, sesion)
 
-        if reservas_activas >= clase.capacidad_maxima:
-            messages.error(request, 'No hay plazas disponibles para esta fecha.')
-            return redirect('gimnasio:mis_reservas')
-
-        # Verificar si existe una reserva cancelada para reutilizarla
-        reserva_cancelada = Reserva.objects.filter(
-            socio=request.user,
-            clase=clase,
-            fecha=fecha,
-            cancelada=True
-        ).first()
-
-        if reserva_cancelada:
-            # Reactivar la reserva cancelada
-            reserva_cancelada.cancelada = False
-            reserva_cancelada.save()
+        if resultado.estado is EstadoAdmision.DUPLICADA:
+            messages.error(request, 'Ya tienes una reserva para esta clase en esa fecha.')
+        elif resultado.estado is EstadoAdmision.COMPLETA:
+            espera = ReservaService.apuntar_lista_espera(request.user, sesion).espera
+            messages.warning(
+                request,
+                f'No hay plazas disponibles para esta fecha. Estás en la lista de espera '
+                f'(posición {espera.posicion}); te avisaremos con una reserva si se libera una plaza.'
+            )
+        elif resultado.reactivada:
             messages.success(request, f'Reserva reactivada para {clase.nombre} el {fecha.strftime("%d/%m/%Y")}.')
         else:
-            # Crear nueva reserva
-            Reserva.objects.create(socio=request.user, clase=clase, fecha=fecha)
             messages.success(request, f'Reserva confirmada para {clase.nombre} el {fecha.strftime("%d/%m/%Y")}.')
 
         return redirect('gimnasio:mis_reservas')
@@ -548,6 +553,16 @@ class CancelarReservaView(View):
         return redirect('gimnasio:mis_reservas')
 
 
+@method_decorator([login_required, socio_required], name='dispatch')
+class SalirListaEsperaView(View):
+    def post(self, request, pk):
+        espera = get_object_or_404(ListaEspera, pk=pk, socio=request.user)
+        ReservaService.salir_lista_espera(espera)
+
+        messages.success(request, 'Has salido de la lista de espera.')
+        return redirect('gimnasio:mis_reservas')
+
+
 # PAGOS Y GESTIÓN DE USUARIOS
 
 # ============================================
@@ -566,7 +581,7 @@ class MisPagosView(ListView):
         context = super().get_context_data(**kwargs)
         context['total_pendiente'] = Pago.objects.filter(
             socio=self.request.user,
-            estado='pendiente'
+            estado__in=Pago.ESTADOS_PENDIENTES
         ).aggregate(total=models.Sum('importe'))['total'] or 0
         return context
 
@@ -586,221 +601,22 @@ class GenerarFacturaView(View):
     """Vista para generar y descargar factura en PDF de un pago"""
 
     def get(self, request, pk):
-        from reportlab.platypus import Image
-        from django.conf import settings
-        import os
-
         # Obtener el pago y verificar que pertenece al usuario
-        pago = get_object_or_404(Pago, pk=pk, socio=request.user)
+        pago = get_object_or_404(Pago.objects.select_related('socio'), pk=pk, socio=request.user)
 
         # Verificar que el pago esté pagado
         if pago.estado != 'pagado':
             messages.error(request, 'Este pago aún no ha sido procesado.')
             return redirect('gimnasio:mis_pagos')
 
-        # Crear el PDF en memoria
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(
-            buffer,
-            pagesize=letter,
-            rightMargin=40,
-            leftMargin=40,
-            topMargin=40,
-            bottomMargin=40
-        )
-        elements = []
-
-        # Estilos personalizados
-        styles = getSampleStyleSheet()
-
-        # Encabezado con logo y título
-        logo_path = os.path.join(settings.BASE_DIR, 'gimnasio', 'static', 'gimnasio', 'imagenes', 'logo.png')
-
-        # Crear tabla de encabezado con logo
-        if os.path.exists(logo_path):
-            logo = Image(logo_path, width=2.5 * inch, height=1 * inch, kind='proportional')
-            titulo = Paragraph("<b><font size=28 color='#004B23'>FACTURA</font></b>",
-                               ParagraphStyle('header', alignment=TA_RIGHT, parent=styles['Normal']))
-            header_data = [[logo, titulo]]
+        # El PDF se genera una sola vez y se reutiliza en las siguientes descargas
+        ruta = facturas.obtener(pago)
+        if settings.FACTURAS_X_ACCEL:
+            # nginx envía el fichero desde su location interna; el worker no lo lee
+            response = HttpResponse(content_type='application/pdf')
+            response['X-Accel-Redirect'] = f'{settings.FACTURAS_X_ACCEL_PREFIJO}{ruta.name}'
         else:
-            # Fallback si no encuentra el logo
-            logo_text = Paragraph(
-                "<b><font size=18 color='#004B23'>TrainUp Gym</font></b><br/><font size=9 color='#38B000'>Entrena para superarte</font>",
-                styles['Normal'])
-            titulo = Paragraph("<b><font size=28 color='#004B23'>FACTURA</font></b>",
-                               ParagraphStyle('header', alignment=TA_RIGHT, parent=styles['Normal']))
-            header_data = [[logo_text, titulo]]
-
-        header_table = Table(header_data, colWidths=[3.5 * inch, 3 * inch])
-        header_table.setStyle(TableStyle([
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 20),
-        ]))
-        elements.append(header_table)
-
-        # Línea decorativa verde
-        line = Table([['']], colWidths=[6.5 * inch])
-        line.setStyle(TableStyle([
-            ('LINEABOVE', (0, 0), (-1, 0), 3, colors.HexColor('#70E000')),
-        ]))
-        elements.append(line)
-        elements.append(Spacer(1, 0.3 * inch))
-
-        # Sección de información en dos columnas
-        info_izq_header = Paragraph("<b><font color='#004B23'>INFORMACIÓN DEL GIMNASIO</font></b>", styles['Normal'])
-        info_izq_data = [
-            ['TrainUp Gym'],
-            ['Calle Fitness, 123'],
-            ['11403 Jerez de la Frontera'],
-            ['Cádiz, España'],
-            [''],
-            [Paragraph('<b>CIF:</b> B12345678', styles['Normal'])],
-            [Paragraph('<b>Tel:</b> +34 123 456 789', styles['Normal'])],
-            [Paragraph('<b>Email:</b> info@trainupgym.es', styles['Normal'])]
-        ]
-
-        info_izq_table = Table([[info_izq_header]] + info_izq_data, colWidths=[3 * inch])
-        info_izq_table.setStyle(TableStyle([
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ('TOPPADDING', (0, 0), (-1, -1), 3),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
-        ]))
-
-        info_der_header = Paragraph("<b><font color='#004B23'>DETALLES DE FACTURA</font></b>", styles['Normal'])
-        info_der_data = [
-            [''],
-            [Paragraph(f"<b>Nº Factura:</b> FAC-{pago.id:05d}", styles['Normal'])],
-            [Paragraph(f"<b>Fecha Emisión:</b> {pago.fecha_emision.strftime('%d/%m/%Y')}", styles['Normal'])],
-            [Paragraph(f"<b>Fecha Pago:</b> {pago.fecha_pago.strftime('%d/%m/%Y') if pago.fecha_pago else 'Pendiente'}",
-                       styles['Normal'])],
-            [Paragraph("<b>Estado:</b> <font color='#38B000'>PAGADO</font>", styles['Normal'])],
-        ]
-
-        info_der_table = Table([[info_der_header]] + info_der_data, colWidths=[3 * inch])
-        info_der_table.setStyle(TableStyle([
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ('TOPPADDING', (0, 0), (-1, -1), 3),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
-        ]))
-
-        info_container = Table([[info_izq_table, info_der_table]], colWidths=[3.2 * inch, 3.3 * inch])
-        info_container.setStyle(TableStyle([
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('LEFTPADDING', (0, 0), (0, 0), 10),
-            ('RIGHTPADDING', (1, 0), (1, 0), 10),
-            ('BACKGROUND', (0, 0), (0, 0), colors.HexColor('#F8FFF8')),
-            ('BACKGROUND', (1, 0), (1, 0), colors.HexColor('#F8FFF8')),
-            ('BOX', (0, 0), (0, 0), 1, colors.HexColor('#9EF01A')),
-            ('BOX', (1, 0), (1, 0), 1, colors.HexColor('#9EF01A')),
-        ]))
-
-        elements.append(info_container)
-        elements.append(Spacer(1, 0.4 * inch))
-
-        # Información del cliente con estilo mejorado
-        cliente_header = Paragraph("<b><font color='white' size=11>FACTURADO A</font></b>", styles['Normal'])
-        cliente_header_table = Table([[cliente_header]], colWidths=[6.5 * inch])
-        cliente_header_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#38B000')),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('LEFTPADDING', (0, 0), (-1, -1), 15),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ]))
-        elements.append(cliente_header_table)
-
-        cliente_body = [
-            [Paragraph(f"<b>{pago.socio.get_full_name() or pago.socio.username}</b>", styles['Normal'])],
-            [Paragraph(f"Email: {pago.socio.email}", styles['Normal'])],
-            [Paragraph(f"Usuario: {pago.socio.username}", styles['Normal'])],
-        ]
-        cliente_table = Table(cliente_body, colWidths=[6.5 * inch])
-        cliente_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('LEFTPADDING', (0, 0), (-1, -1), 15),
-            ('TOPPADDING', (0, 0), (-1, -1), 5),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-            ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#FAFFFE')),
-            ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#9EF01A')),
-        ]))
-        elements.append(cliente_table)
-        elements.append(Spacer(1, 0.4 * inch))
-
-        # Tabla de conceptos mejorada
-        detalle_data = [
-            [
-                Paragraph("<b><font color='white'>CONCEPTO</font></b>", styles['Normal']),
-                Paragraph("<b><font color='white'>IMPORTE</font></b>",
-                          ParagraphStyle('right', alignment=TA_RIGHT, parent=styles['Normal']))
-            ],
-            [
-                Paragraph(f"<font size=11>{pago.concepto}</font>", styles['Normal']),
-                Paragraph(f"<font size=11><b>{pago.importe:.2f}€</b></font>",
-                          ParagraphStyle('right', alignment=TA_RIGHT, parent=styles['Normal']))
-            ],
-        ]
-
-        detalle_table = Table(detalle_data, colWidths=[5 * inch, 1.5 * inch])
-        detalle_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#004B23')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 11),
-            ('TOPPADDING', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('LEFTPADDING', (0, 0), (0, -1), 15),
-            ('RIGHTPADDING', (1, 0), (1, -1), 15),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-            ('TOPPADDING', (0, 1), (-1, -1), 15),
-            ('BOTTOMPADDING', (0, 1), (-1, -1), 15),
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#9EF01A')),
-        ]))
-        elements.append(detalle_table)
-        elements.append(Spacer(1, 0.2 * inch))
-
-        # Total con diseño destacado
-        total_data = [
-            [
-                Paragraph("<b><font size=13 color='#004B23'>TOTAL A PAGAR</font></b>",
-                          ParagraphStyle('right', alignment=TA_RIGHT, parent=styles['Normal'])),
-                Paragraph(f"<b><font size=16 color='#38B000'>{pago.importe:.2f}€</font></b>",
-                          ParagraphStyle('right', alignment=TA_RIGHT, parent=styles['Normal']))
-            ],
-        ]
-        total_table = Table(total_data, colWidths=[5 * inch, 1.5 * inch])
-        total_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 15),
-            ('TOPPADDING', (0, 0), (-1, -1), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-            ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#F0FFF0')),
-            ('BOX', (0, 0), (-1, -1), 2, colors.HexColor('#70E000')),
-        ]))
-        elements.append(total_table)
-        elements.append(Spacer(1, 0.6 * inch))
-
-        # Pie de página mejorado
-        footer_text = """
-        <para alignment='center'>
-            <font size=10 color='#38B000'><b>¡Gracias por confiar en TrainUp Gym!</b></font><br/>
-            <font size=8 color='#666666'>
-                Estamos comprometidos con tu salud y bienestar.<br/>
-                Para cualquier consulta, contáctanos en info@trainupgym.es o llama al +34 123 456 789
-            </font>
-        </para>
-        """
-        nota = Paragraph(footer_text, styles['Normal'])
-        elements.append(nota)
-
-        # Construir PDF
-        doc.build(elements)
-
-        # Preparar respuesta
-        buffer.seek(0)
-        response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
+            response = FileResponse(open(settings.MEDIA_ROOT / ruta, 'rb'), content_type='application/pdf')
         response['Content-Disposition'] = f'attachment; filename="Factura_{pago.id}_{pago.socio.username}.pdf"'
 
         return response
@@ -831,6 +647,20 @@ class GestionSocioView(ListView):
         return queryset
 
 
+@method_decorator([login_required, admin_required], name='dispatch')
+class ExportarSociosView(GestionSocioView):
+    """Listado de socios con los mismos filtros que la gestión, en CSV o XLSX"""
+
+    def get(self, request, *args, **kwargs):
+        filas = self.get_queryset().values_list(
+            'user__username', 'user__first_name', 'user__last_name', 'user__email', 'dni', 'telefono',
+            'fecha_nacimiento', 'activo', 'tiene_pagos_vencidos', 'fecha_registro'
+        ).iterator(chunk_size=exportaciones.FILAS_POR_CONSULTA)
+        cabecera = ['Usuario', 'Nombre', 'Apellidos', 'Email', 'DNI', 'Teléfono',
+                    'Fecha nacimiento', 'Activo', 'Pagos vencidos', 'Fecha registro']
+        return exportaciones.respuesta(request.GET.get('formato'), 'socios', cabecera, filas)
+
+
 @method_decorator([login_required, admin_required], name='dispatch')
 class NuevoSocioView(View):
     def get(self, request):
@@ -940,21 +770,31 @@ class GestionPagosView(ListView):
         context = super().get_context_data(**kwargs)
         context['socios'] = User.objects.filter(perfil__rol='socio', perfil__activo=True)
 
-        # Totales
-        context['total_pendiente'] = Pago.objects.filter(
-            estado='pendiente'
-        ).aggregate(total=models.Sum('importe'))['total'] or 0
+        # Totales (del resumen diario, no de toda la tabla de pagos)
+        context['total_pendiente'] = ResumenDiarioPagos.total(estado__in=Pago.ESTADOS_PENDIENTES)
 
-        context['total_mes'] = Pago.objects.filter(
-            estado='pagado',
-            fecha_pago__month=timezone.now().month,
-            fecha_pago__year=timezone.now().year
-        ).aggregate(total=models.Sum('importe'))['total'] or 0
+        inicio_mes, fin_mes = rango_mes(timezone.now().date())
+        context['total_mes'] = ResumenDiarioPagos.total(estado='pagado', fecha__gte=inicio_mes, fecha__lt=fin_mes)
 
         return context
 
 
 
+
+@method_decorator([login_required, admin_required], name='dispatch')
+class ExportarPagosView(GestionPagosView):
+    """Pagos con los mismos filtros que la gestión, en CSV o XLSX"""
+
+    def get(self, request, *args, **kwargs):
+        filas = self.get_queryset().values_list(
+            'id', 'socio__username', 'socio__first_name', 'socio__last_name', 'concepto', 'tipo_pago', 'importe',
+            'fecha_emision', 'fecha_vencimiento', 'fecha_pago', 'metodo_pago', 'estado', 'periodo'
+        ).iterator(chunk_size=exportaciones.FILAS_POR_CONSULTA)
+        filas = exportaciones.etiquetar(filas, {5: Pago.TIPOS_PAGO, 10: Pago.METODOS_PAGO, 11: Pago.ESTADOS})
+        cabecera = ['ID', 'Usuario', 'Nombre', 'Apellidos', 'Concepto', 'Tipo', 'Importe',
+                    'Emisión', 'Vencimiento', 'Fecha pago', 'Método', 'Estado', 'Periodo']
+        return exportaciones.respuesta(request.GET.get('formato'), 'pagos', cabecera, filas)
+
 @method_decorator([login_required, admin_required], name='dispatch')
 class NuevoPagoView(View):
     def get(self, request):
@@ -994,58 +834,90 @@ class MarcarPagadoView(View):
         metodo_pago = request.POST.get('metodo_pago', 'efectivo')
 
         # Actualizar estado del pago
-        pago.estado = 'pagado'
-        pago.metodo_pago = metodo_pago
-        pago.fecha_pago = timezone.now()
-        pago.save()
+        pago.marcar_pagado(metodo_pago)
+
+        # Dejar la factura ya generada para la primera descarga
+        facturas.obtener(pago)
 
         messages.success(request, 'El pago ha sido marcado como pagado correctamente.')
         return redirect('gimnasio:gestion_pagos')
 
 
-# ============================================
-# ESTADÍSTICAS Y REPORTES (ADMIN)
-# ============================================
 @method_decorator([login_required, admin_required], name='dispatch')
-class EstadisticasView(View):
-    def get(self, request):
-        # Estadísticas generales
-        total_socios = PerfilUsuario.objects.filter(rol='socio', activo=True).count()
-        total_monitores = Monitor.objects.filter(activo=True).count()
-        total_clases = Clase.objects.filter(activa=True).count()
+class ConciliarRemesaView(View):
+    """Sube el fichero de resultados de una remesa de domiciliaciones y lo concilia"""
+    DESCUADRES_EN_PANTALLA = 500
 
-        # Estadísticas de reservas
-        hoy = timezone.now().date()
-        reservas_hoy = Reserva.objects.filter(fecha=hoy, cancelada=False).count()
-        reservas_semana = Reserva.objects.filter(
-            fecha__gte=hoy,
-            fecha__lte=hoy + timedelta(days=7),
-            cancelada=False
-        ).count()
-
-        # Estadísticas de pagos
-        pagos_pendientes = Pago.objects.filter(estado='pendiente').count()
-        ingresos_mes = Pago.objects.filter(
-            estado='pagado',
-            fecha_pago__month=hoy.month,
-            fecha_pago__year=hoy.year
-        ).aggregate(total=models.Sum('importe'))['total'] or 0
+    def get(self, request):
+        return render(request, 'gimnasio/conciliar_remesa.html')
 
-        # Clases más populares
-        clases_populares = Clase.objects.filter(activa=True).annotate(
-            num_reservas=Count('reservas')
-        ).order_by('-num_reservas')[:5]
+    def post(self, request):
+        fichero = request.FILES.get('fichero')
+        if not fichero:
+            messages.error(request, 'Selecciona el fichero del banco.')
+            return redirect('gimnasio:conciliar_remesa')
 
+        try:
+            resultado = ConciliacionService.conciliar(ConciliacionService.leer(fichero, fichero.name))
+        except FormatoNoValido as error:
+            messages.error(request, str(error))
+            return redirect('gimnasio:conciliar_remesa')
+
+        if request.POST.get('informe') and resultado.descuadres:
+            # Informe completo de descuadres en CSV
+            response = HttpResponse(content_type='text/csv; charset=utf-8')
+            response['Content-Disposition'] = f'attachment; filename="descuadres_{fichero.name}.csv"'
+            resultado.escribir_informe(response)
+            return response
+
+        messages.success(
+            request,
+            f'Remesa conciliada: {resultado.pagados} cobrados y {resultado.devueltos} devueltos '
+            f'de {resultado.lineas} líneas.'
+        )
         context = {
-            'total_socios': total_socios,
-            'total_monitores': total_monitores,
-            'total_clases': total_clases,
-            'reservas_hoy': reservas_hoy,
-            'reservas_semana': reservas_semana,
-            'pagos_pendientes': pagos_pendientes,
-            'ingresos_mes': ingresos_mes,
-            'clases_populares': clases_populares,
+            'resultado': resultado,
+            'descuadres': resultado.descuadres[:self.DESCUADRES_EN_PANTALLA],
         }
+        return render(request, 'gimnasio/conciliar_remesa.html', context)
+
+
+@method_decorator([login_required, admin_required], name='dispatch')
+class ExportarFacturasView(View):
+    """Descarga en un ZIP las facturas de los pagos cobrados entre dos fechas"""
+
+    def get(self, request):
+        try:
+            desde = datetime.strptime(request.GET['desde'], '%Y-%m-%d').date()
+            hasta = datetime.strptime(request.GET['hasta'], '%Y-%m-%d').date()
+        except (KeyError, ValueError):
+            messages.error(request, 'Indica un rango de fechas válido para exportar las facturas.')
+            return redirect('gimnasio:gestion_pagos')
+
+        pagos = Pago.objects.select_related('socio').filter(
+            estado='pagado', fecha_pago__range=(desde, hasta)
+        ).order_by('fecha_pago', 'id')
+
+        def progreso(hechas, total):
+            if hechas % 100 == 0 or hechas == total:
+                logger.info(f'📦 Facturas exportadas: {hechas}/{total}')
+
+        response = StreamingHttpResponse(
+            facturas.exportar_zip(pagos, procesos=settings.FACTURAS_PROCESOS or None, progreso=progreso),
+            content_type='application/zip'
+        )
+        response['Content-Disposition'] = f'attachment; filename="Facturas_{desde}_{hasta}.zip"'
+        return response
+
+
+# ============================================
+# ESTADÍSTICAS Y REPORTES (ADMIN)
+# ============================================
+@method_decorator([login_required, admin_required], name='dispatch')
+class EstadisticasView(View):
+    def get(self, request):
+        # Indicadores calculados en unas pocas consultas agregadas y cacheados unos segundos
+        context = dict(EstadisticasService.obtener())
 
         return render(request, 'gimnasio/estadisticas.html', context)
 
@@ -1089,7 +961,7 @@ class AsignarClasesMonitorView(View):
 # ============================================
 @method_decorator([login_required, admin_required], name='dispatch')
 class ClasesReservadasAdminView(View):
-    def get(self, request):
+    def get_queryset(self):
         # Obtener todas las reservas activas
         reservas = Reserva.objects.filter(
             cancelada=False,
@@ -1097,14 +969,17 @@ class ClasesReservadasAdminView(View):
         ).select_related('socio', 'clase', 'clase__monitor').order_by('fecha', 'clase__hora_inicio')
 
         # Filtros opcionales
-        clase_id = request.GET.get('clase')
-        fecha = request.GET.get('fecha')
+        clase_id = self.request.GET.get('clase')
+        fecha = self.request.GET.get('fecha')
 
         if clase_id:
             reservas = reservas.filter(clase_id=clase_id)
         if fecha:
             reservas = reservas.filter(fecha=fecha)
+        return reservas
 
+    def get(self, request):
+        reservas = self.get_queryset()
         clases = Clase.objects.filter(activa=True)
 
         context = {
@@ -1114,6 +989,20 @@ class ClasesReservadasAdminView(View):
         return render(request, 'gimnasio/clases_reservadas_admin.html', context)
 
 
+@method_decorator([login_required, admin_required], name='dispatch')
+class ExportarReservasView(ClasesReservadasAdminView):
+    """Reservas con los mismos filtros que el listado, en CSV o XLSX"""
+
+    def get(self, request):
+        filas = self.get_queryset().values_list(
+            'id', 'fecha', 'clase__nombre', 'clase__hora_inicio', 'clase__monitor__nombre',
+            'socio__username', 'socio__first_name', 'socio__last_name', 'socio__email', 'fecha_reserva', 'asistio'
+        ).iterator(chunk_size=exportaciones.FILAS_POR_CONSULTA)
+        cabecera = ['ID', 'Fecha', 'Clase', 'Hora', 'Monitor', 'Usuario', 'Nombre', 'Apellidos', 'Email',
+                    'Reservada el', 'Asistió']
+        return exportaciones.respuesta(request.GET.get('formato'), 'reservas', cabecera, filas)
+
+
 # ============================================
 # MONITOR - MIS CLASES ASIGNADAS
 # ============================================
@@ -1131,28 +1020,22 @@ class MisClasesMonitorView(View):
             mis_clases = Clase.objects.filter(
                 monitor=monitor,
                 activa=True
-            ).order_by('dia_semana', 'hora_inicio')
-
-            # Para cada clase, contar reservas
-            clases_con_info = []
-            hoy = timezone.now().date()
-
-            for clase in mis_clases:
-                total_reservas = Reserva.objects.filter(
-                    clase=clase,
-                    cancelada=False,
-                    fecha__gte=hoy
-                ).count()
+            ).with_availability().order_by('dia_semana', 'hora_inicio')
 
-                clases_con_info.append({
+            # Reservas y plazas de la próxima sesión, ya anotadas en la consulta
+            clases_con_info = [
+                {
                     'clase': clase,
-                    'total_reservas': total_reservas,
-                    'plazas_libres': clase.capacidad_maxima - total_reservas
-                })
+                    'total_reservas': clase.reservas_proxima,
+                    'plazas_libres': clase.plazas_libres
+                }
+                for clase in mis_clases
+            ]
 
             context = {
                 'monitor': monitor,
-                'clases_con_info': clases_con_info
+                'clases_con_info': clases_con_info,
+                'hoy': timezone.now().date()
             }
 
             return render(request, 'gimnasio/mis_clases_monitor.html', context)
@@ -1205,41 +1088,111 @@ class SociosApuntadosView(View):
             return redirect('gimnasio:inicio')
 
 
+# ============================================
+# MONITOR - PASAR LISTA DE UNA SESIÓN
+# ============================================
+@method_decorator(login_required, name='dispatch')
+class PasarListaView(View):
+    """
+    El monitor envía en un solo POST el conjunto completo de asistentes de la
+    sesión. Reenviar el mismo formulario (p. ej. al reintentar desde la
+    tablet) deja el mismo resultado.
+    """
+
+    def obtener_sesion(self, request, pk):
+        perfil = getattr(request.user, 'perfil', None)
+        if perfil is None or perfil.rol != 'monitor':
+            return None
+        monitor = Monitor.objects.filter(email=request.user.email).first()
+        if monitor is None:
+            return None
+        return get_object_or_404(SesionClase.objects.select_related('clase'), pk=pk, clase__monitor=monitor)
+
+    def get(self, request, pk):
+        sesion = self.obtener_sesion(request, pk)
+        if sesion is None:
+            messages.error(request, 'No tienes permisos para acceder a esta página.')
+            return redirect('gimnasio:inicio')
+
+        reservas = sesion.reservas.filter(cancelada=False).select_related('socio').order_by(
+            'socio__first_name', 'socio__username'
+        )
+        context = {
+            'sesion': sesion,
+            'reservas': reservas,
+            'editable': sesion.fecha <= timezone.now().date()
+        }
+        return render(request, 'gimnasio/pasar_lista.html', context)
+
+    def post(self, request, pk):
+        sesion = self.obtener_sesion(request, pk)
+        quiere_json = 'application/json' in request.headers.get('Accept', '')
+        if sesion is None:
+            if quiere_json:
+                return JsonResponse({'error': 'Sin permisos'}, status=403)
+            messages.error(request, 'No tienes permisos para acceder a esta página.')
+            return redirect('gimnasio:inicio')
+
+        if sesion.fecha > timezone.now().date():
+            if quiere_json:
+                return JsonResponse({'error': 'La sesión aún no se ha celebrado'}, status=400)
+            messages.error(request, 'No se puede pasar lista de una sesión futura.')
+            return redirect('gimnasio:pasar_lista', pk=sesion.pk)
+
+        asistentes = [valor for valor in request.POST.getlist('asistentes') if valor.isdigit()]
+        marcadas, desmarcadas = ReservaService.registrar_asistencia(sesion, asistentes)
+
+        if quiere_json:
+            return JsonResponse({'marcadas': marcadas, 'desmarcadas': desmarcadas})
+        messages.success(request, f'Asistencia guardada: {marcadas} marcadas, {desmarcadas} desmarcadas.')
+        return redirect('gimnasio:pasar_lista', pk=sesion.pk)
+
 
 # Reporte de Asistencia por Clases
 @method_decorator([login_required, admin_required], name='dispatch')
 class ReporteAsistenciaView(View):
     def get(self, request):
-        clases_con_asistencia = Clase.objects.filter(activa=True).annotate(
-            total_reservas=Count('reservas', filter=Q(reservas__cancelada=False)),
-            total_asistencias=Count('reservas', filter=Q(reservas__asistio=True))
-        )
+        try:
+            desde, hasta = (
+                datetime.strptime(request.GET[parametro], '%Y-%m-%d').date() if request.GET.get(parametro) else None
+                for parametro in ('desde', 'hasta')
+            )
+        except ValueError:
+            messages.error(request, 'Las fechas del reporte deben tener el formato AAAA-MM-DD.')
+            return redirect('gimnasio:reporte_asistencia')
+
+        # Sin rango: las sesiones de las reservas recientes; ?historico=1 incluye también las archivadas
+        incluir_archivo = request.GET.get('historico') == '1'
+        if not desde and not hasta and not incluir_archivo:
+            desde = ArchivoService.fecha_corte()
+
         context = {
-            'clases_con_asistencia': clases_con_asistencia,
+            'clases_con_asistencia': InformeService.asistencia_por_clase(desde, hasta),
+            'incluir_archivo': incluir_archivo,
+            'desde': desde,
+            'hasta': hasta,
         }
         return render(request, 'gimnasio/reporte_asistencia.html', context)
 
-# Reporte de Ingresos de los últimos 6 meses
+# Reporte de Ingresos mensuales (últimos 6/12/24/36 meses)
 @method_decorator([login_required, admin_required], name='dispatch')
 class ReporteIngresosView(View):
     def get(self, request):
-        hoy = timezone.now().date()
-        ingresos_por_mes = []
-        total_acumulado = 0
-        for i in range(6):
-            mes = hoy - timedelta(days=30 * i)
-            total = Pago.objects.filter(
-                estado='pagado',
-                fecha_pago__month=mes.month,
-                fecha_pago__year=mes.year
-            ).aggregate(total=models.Sum('importe'))['total'] or 0
-            ingresos_por_mes.append({
-                'mes': mes.strftime('%B %Y'),
-                'total': total
-            })
-            total_acumulado += total
+        try:
+            meses = int(request.GET.get('meses', 6))
+        except ValueError:
+            meses = 6
+        if meses not in InformeService.RANGOS_MESES:
+            meses = 6
+
+        informe = InformeService.ingresos_mensuales(meses)
         context = {
-            'ingresos_por_mes': ingresos_por_mes,
-            'total_acumulado': total_acumulado,
+            'ingresos_por_mes': informe['meses'],
+            'tipos': informe['tipos'],
+            'metodos': informe['metodos'],
+            'total_acumulado': informe['total'],
+            'maximo': informe['maximo'],
+            'meses': meses,
+            'rangos_meses': InformeService.RANGOS_MESES,
         }
         return render(request, 'gimnasio/reporte_ingresos.html', context)
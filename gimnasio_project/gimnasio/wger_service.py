@@ -0,0 +1,638 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from multiprocessing import get_context
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from . import miniaturas
+from .buscador_service import BuscadorEjercicios
+from .models import CategoriaEjercicio, Ejercicio, Equipamiento, ImagenEjercicio, Musculo, PaginaWger
+
+logger = logging.getLogger(__name__)
+
+# ===== DICCIONARIO DE RESPALDO (solo se usa si falta info de la API) =====
+CATEGORIAS_RESPALDO = {
+    8: {  # Arms
+        'nombre': 'Brazos',
+        'imagen': '/static/images/ejercicios/brazos.jpg',
+        'nombres_ejercicios': [
+            'Curl de bíceps con mancuerna',
+            'Extensión de tríceps',
+            'Curl martillo',
+            'Fondos en paralelas',
+            'Curl con barra',
+            'Press francés',
+        ],
+        'descripciones': [
+            'Ejercicio fundamental para desarrollo de bíceps. Mantén los codos fijos.',
+            'Trabaja los tríceps de forma aislada. Mantén una postura estable.',
+            'Variante del curl que trabaja bíceps y antebrazo.',
+            'Ejercicio compuesto para tríceps, pecho y hombros.',
+            'Ejercicio básico para masa de bíceps.',
+            'Movimiento de aislamiento para tríceps.',
+        ]
+    },
+    9: {  # Legs
+        'nombre': 'Piernas',
+        'imagen': '/static/images/ejercicios/piernas.jpg',
+        'nombres_ejercicios': [
+            'Sentadilla con barra',
+            'Prensa de piernas',
+            'Peso muerto rumano',
+            'Zancadas',
+            'Extensión de cuádriceps',
+            'Curl femoral',
+        ],
+        'descripciones': [
+            'El rey de los ejercicios de pierna. Trabaja cuádriceps y glúteos.',
+            'Ejercicio de máquina ideal para volumen.',
+            'Enfoque en isquiotibiales y glúteos.',
+            'Ejercicio unilateral excelente para equilibrio.',
+            'Aislamiento de cuádriceps en máquina.',
+            'Trabaja específicamente los isquiotibiales.',
+        ]
+    },
+    10: {  # Abs
+        'nombre': 'Abdominales',
+        'imagen': '/static/images/ejercicios/abdominales.jpg',
+        'nombres_ejercicios': [
+            'Plancha frontal',
+            'Crunch abdominal',
+            'Elevación de piernas',
+            'Plancha lateral',
+            'Russian twist',
+            'Mountain climbers',
+        ],
+        'descripciones': [
+            'Ejercicio isométrico fundamental para core.',
+            'Básico para recto abdominal.',
+            'Trabaja la parte baja del abdomen.',
+            'Fortalece oblicuos y estabilidad lateral.',
+            'Ejercicio dinámico para oblicuos.',
+            'Cardio funcional que trabaja core completo.',
+        ]
+    },
+    11: {  # Chest
+        'nombre': 'Pecho',
+        'imagen': '/static/images/ejercicios/pecho.jpg',
+        'nombres_ejercicios': [
+            'Press de banca con barra',
+            'Press con mancuernas',
+            'Aperturas con mancuernas',
+            'Press inclinado',
+            'Fondos en paralelas',
+            'Cruces en polea',
+        ],
+        'descripciones': [
+            'Ejercicio fundamental para pecho.',
+            'Permite mayor rango de movimiento.',
+            'Aislamiento perfecto para pecho.',
+            'Enfatiza pecho superior.',
+            'Excelente para pecho inferior y tríceps.',
+            'Aislamiento con tensión constante.',
+        ]
+    },
+    12: {  # Back
+        'nombre': 'Espalda',
+        'imagen': '/static/images/ejercicios/espalda.jpg',
+        'nombres_ejercicios': [
+            'Dominadas',
+            'Remo con barra',
+            'Peso muerto',
+            'Remo con mancuerna',
+            'Pull-over',
+            'Jalón al pecho',
+        ],
+        'descripciones': [
+            'Rey de ejercicios de espalda. Trabaja todo el dorsal.',
+            'Fundamental para espesor de espalda.',
+            'Ejercicio compuesto rey. Trabaja toda la cadena posterior.',
+            'Permite trabajar cada lado independientemente.',
+            'Aislamiento de dorsal.',
+            'Alternativa a dominadas.',
+        ]
+    },
+    13: {  # Shoulders
+        'nombre': 'Hombros',
+        'imagen': '/static/images/ejercicios/hombros.jpg',
+        'nombres_ejercicios': [
+            'Press militar',
+            'Elevaciones laterales',
+            'Elevaciones frontales',
+            'Press Arnold',
+            'Pájaros (deltoides posterior)',
+            'Remo al mentón',
+        ],
+        'descripciones': [
+            'Básico para desarrollo de hombros.',
+            'Aislamiento de deltoides lateral.',
+            'Trabaja deltoides anterior.',
+            'Variante con rotación.',
+            'Fundamental para deltoides posterior.',
+            'Trabaja deltoides y trapecios.',
+        ]
+    },
+    14: {  # Calves
+        'nombre': 'Pantorrillas',
+        'imagen': '/static/images/ejercicios/pantorrillas.jpg',
+        'nombres_ejercicios': [
+            'Elevación de talones de pie',
+            'Elevación de talones sentado',
+            'Elevación en prensa',
+            'Elevación unilateral',
+        ],
+        'descripciones': [
+            'Ejercicio fundamental para gemelos.',
+            'Trabaja el sóleo específicamente.',
+            'Variante en prensa de piernas.',
+            'Trabaja equilibrio y simetría.',
+        ]
+    }
+}
+
+
+IMAGEN_POR_DEFECTO = '/static/images/ejercicios/default.jpg'
+
+
+@dataclass
+class ResultadoSincronizacion:
+    ejercicios: int = 0
+    categorias: int = 0
+    musculos: int = 0
+    equipos: int = 0
+    imagenes: int = 0
+    paginas: int = 0
+    paginas_por_segundo: float = 0.0
+    no_modificadas: int = 0  # páginas que wger respondió con 304
+    # Ejercicios escritos en esta sincronización (los que no cambian no se tocan)
+    anadidos: int = 0
+    cambiados: int = 0
+    eliminados: int = 0
+    # Cuántos nombres, descripciones e imágenes vienen de la API y cuántos del respaldo
+    origen: Counter = field(default_factory=Counter)
+
+
+@dataclass
+class ResultadoEspejo:
+    imagenes: int = 0  # imágenes que usan los ejercicios del catálogo
+    descargadas: int = 0
+    generadas: int = 0  # con WebP nuevos; el resto ya estaban copiadas (misma huella)
+    fallidas: int = 0
+
+
+def fusionar(ejercicios, categorias, musculos, equipos, imagenes):
+    """
+    Completa los ejercicios de wger con CATEGORIAS_RESPALDO cuando les falta
+    nombre, descripción, imagen o categoría. `categorias`, `musculos` y
+    `equipos` son {id: nombre}; `imagenes` es {exercise_base: url}.
+    Devuelve (lista de dicts listos para guardar, Counter con el origen de cada dato).
+    """
+    fusionados = []
+    contador_respaldo = defaultdict(int)
+    origen = Counter()
+
+    for ejercicio_api in ejercicios:
+        categoria_id = ejercicio_api.get('category')
+        exercise_base = ejercicio_api.get('exercise_base')
+        categoria_respaldo = CATEGORIAS_RESPALDO.get(categoria_id)
+
+        # ===== NOMBRE: Prioridad a API, respaldo si falta =====
+        nombre = (ejercicio_api.get('name') or '').strip()
+        if nombre:
+            origen['nombre_api'] += 1
+        else:
+            if categoria_respaldo:
+                indice = contador_respaldo[categoria_id] % len(categoria_respaldo['nombres_ejercicios'])
+                nombre = categoria_respaldo['nombres_ejercicios'][indice]
+                contador_respaldo[categoria_id] += 1
+            else:
+                nombre = f"Ejercicio #{ejercicio_api.get('id', '?')}"
+            origen['nombre_respaldo'] += 1
+
+        # ===== DESCRIPCIÓN: Prioridad a API, respaldo si falta =====
+        descripcion = (ejercicio_api.get('description') or '').strip()
+        if descripcion:
+            origen['descripcion_api'] += 1
+        else:
+            if categoria_respaldo and contador_respaldo[categoria_id] > 0:
+                indice = (contador_respaldo[categoria_id] - 1) % len(categoria_respaldo['descripciones'])
+                descripcion = categoria_respaldo['descripciones'][indice]
+            else:
+                cat_nombre = categorias.get(categoria_id, 'gimnasio')
+                descripcion = f"Ejercicio de {cat_nombre.lower()}. Consulta con tu entrenador."
+            origen['descripcion_respaldo'] += 1
+
+        # ===== IMAGEN: Prioridad a API, respaldo si falta =====
+        imagen = imagenes.get(exercise_base)
+        es_imagen_respaldo = not imagen
+        if es_imagen_respaldo:
+            imagen = categoria_respaldo['imagen'] if categoria_respaldo else IMAGEN_POR_DEFECTO
+            origen['imagen_respaldo'] += 1
+        else:
+            origen['imagen_api'] += 1
+
+        fusionados.append({
+            'id': ejercicio_api['id'],
+            'exercise_base': exercise_base,
+            'nombre': nombre[:200],
+            'descripcion': descripcion,
+            'categoria_id': categoria_id if categoria_id in categorias or categoria_respaldo else None,
+            'musculos': [m_id for m_id in ejercicio_api.get('muscles', []) if m_id in musculos],
+            'equipamiento': [e_id for e_id in ejercicio_api.get('equipment', []) if e_id in equipos],
+            'imagen': imagen,
+            'imagen_respaldo': es_imagen_respaldo,
+        })
+
+    return fusionados, origen
+
+
+def huella(ejercicio):
+    """sha256 del ejercicio fusionado: si coincide con la guardada, no hay nada que escribir"""
+    return hashlib.sha256(json.dumps(ejercicio, sort_keys=True).encode()).hexdigest()
+
+
+def imagen_principal(imagenes):
+    """{exercise_base: url} con la imagen principal de cada ejercicio (o la primera si no hay principal)"""
+    por_base = defaultdict(list)
+    for img in imagenes:
+        if img.get('exercise_base') and img.get('image'):
+            por_base[img['exercise_base']].append(img)
+    return {
+        base: next((img['image'] for img in imgs if img.get('is_main')), imgs[0]['image'])
+        for base, imgs in por_base.items()
+    }
+
+
+class Descargador:
+    """
+    Descarga listados paginados de la API reutilizando las conexiones de una
+    requests.Session. De cada listado se pide la primera página; con su
+    `count` se calculan los offsets del resto y se piden todas a la vez en un
+    pool de hilos acotado, con un máximo de peticiones simultáneas por host.
+    Los errores de red, timeouts y respuestas 429/5xx se reintentan con
+    espera exponencial.
+
+    Si `cache` ({url: (etag, last_modified, datos)}) tiene la página, la
+    petición es condicional (If-None-Match / If-Modified-Since) y un 304
+    devuelve los datos guardados. `respuestas` acumula los validadores y el
+    contenido de cada página descargada, para guardarlos después.
+    """
+    HILOS = 8
+    POR_HOST = 4
+    REINTENTOS = 3
+    ESPERA = 0.5  # segundos antes del primer reintento; se duplica en cada uno
+    TIMEOUT = 15
+    REINTENTABLES = {429, 500, 502, 503, 504}
+
+    def __init__(self, sesion=None, hilos=HILOS, por_host=POR_HOST, reintentos=REINTENTOS, timeout=TIMEOUT):
+        if sesion is None:
+            sesion = requests.Session()
+            adaptador = HTTPAdapter(pool_maxsize=hilos)
+            sesion.mount('http://', adaptador)
+            sesion.mount('https://', adaptador)
+        self.sesion = sesion
+        self.hilos = hilos
+        self.por_host = por_host
+        self.reintentos = reintentos
+        self.timeout = timeout
+        self.paginas = 0
+        self.no_modificadas = 0
+        self.segundos = 0.0
+        self.cache = {}
+        self.respuestas = {}
+        self._cerrojo = threading.Lock()
+        self._semaforos = {}
+
+    @property
+    def paginas_por_segundo(self):
+        return self.paginas / self.segundos if self.segundos else 0.0
+
+    def _semaforo(self, url):
+        host = urlsplit(url).netloc
+        with self._cerrojo:
+            if host not in self._semaforos:
+                self._semaforos[host] = threading.BoundedSemaphore(self.por_host)
+            return self._semaforos[host]
+
+    def pedir(self, url, params=None):
+        """JSON de una página, con reintentos"""
+        clave = requests.Request('GET', url, params=params).prepare().url
+        guardada = self.cache.get(clave)
+        cabeceras = {}
+        if guardada:
+            etag, ultima_modificacion, _ = guardada
+            if etag:
+                cabeceras['If-None-Match'] = etag
+            if ultima_modificacion:
+                cabeceras['If-Modified-Since'] = ultima_modificacion
+
+        respuesta = self._get(url, params, cabeceras)
+        if respuesta.status_code == 304 and guardada:
+            with self._cerrojo:
+                self.paginas += 1
+                self.no_modificadas += 1
+                self.respuestas[clave] = guardada
+            return guardada[2]
+        respuesta.raise_for_status()
+        datos = respuesta.json()
+        etag = respuesta.headers.get('ETag', '')
+        ultima_modificacion = respuesta.headers.get('Last-Modified', '')
+        with self._cerrojo:
+            self.paginas += 1
+            if etag or ultima_modificacion:
+                self.respuestas[clave] = (etag, ultima_modificacion, datos)
+        return datos
+
+    def contenido(self, url):
+        """Bytes de un fichero (las imágenes de los ejercicios), con reintentos"""
+        respuesta = self._get(url)
+        respuesta.raise_for_status()
+        return respuesta.content
+
+    def _get(self, url, params=None, cabeceras=None):
+        """Primera respuesta que no sea un error de red, timeout, 429 o 5xx"""
+        for intento in range(self.reintentos + 1):
+            try:
+                with self._semaforo(url):
+                    respuesta = self.sesion.get(url, params=params, headers=cabeceras or {}, timeout=self.timeout)
+                if respuesta.status_code not in self.REINTENTABLES:
+                    return respuesta
+                error = requests.HTTPError(f'{respuesta.status_code} en {url}', response=respuesta)
+            except (requests.ConnectionError, requests.Timeout) as fallo:
+                error = fallo
+            if intento < self.reintentos:
+                logger.warning(f'⚠️ {error}: reintento {intento + 1} de {self.reintentos}')
+                time.sleep(self.ESPERA * 2 ** intento)
+        raise error
+
+    def listados(self, peticiones):
+        """{nombre: (url, params)} -> {nombre: resultados de todas las páginas, en orden}"""
+        inicio = time.perf_counter()
+        pool = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix='wger')
+        try:
+            primeras = {nombre: pool.submit(self.pedir, url, params) for nombre, (url, params) in peticiones.items()}
+            paginas = {}
+            for nombre, futuro in primeras.items():
+                datos = futuro.result()
+                url, params = peticiones[nombre]
+                tamano = len(datos.get('results', []))
+                resto = []
+                if datos.get('next') and tamano:
+                    # El servidor puede devolver menos filas que el `limit` pedido: manda el tamaño real
+                    resto = [
+                        pool.submit(self.pedir, url, {**params, 'limit': tamano, 'offset': offset})
+                        for offset in range(tamano, datos['count'], tamano)
+                    ]
+                paginas[nombre] = (datos, resto)
+
+            resultados = {}
+            for nombre, (primera, resto) in paginas.items():
+                # Si el listado cambia entre páginas, un registro puede salir dos veces
+                unicos = {}
+                for datos in [primera] + [futuro.result() for futuro in resto]:
+                    for fila in datos.get('results', []):
+                        unicos.setdefault(fila['id'], fila)
+                resultados[nombre] = list(unicos.values())
+        finally:
+            pool.shutdown(cancel_futures=True)
+            self.segundos += time.perf_counter() - inicio
+        return resultados
+
+
+class WgerService:
+    """
+    Sincroniza el catálogo de ejercicios de wger.de con las tablas locales.
+    Primero se descarga todo; solo si no ha fallado nada se actualiza el
+    catálogo, en una transacción, así que un wger lento o caído nunca deja
+    el catálogo a medias.
+
+    La sincronización es incremental: las páginas se piden con los
+    validadores de la anterior (PaginaWger) y cada ejercicio lleva la huella
+    de su contenido, así que solo se insertan, actualizan o borran las filas
+    que han cambiado. Si nada cambia en wger no se escribe nada.
+    """
+    URL_API = 'https://wger.de/api/v2/'
+    IDIOMA = 2  # inglés
+    POR_PAGINA = 200
+
+    @classmethod
+    def descargar(cls, descargador):
+        """Los cinco listados del catálogo, descargados a la vez"""
+        return descargador.listados({
+            recurso: (f'{cls.URL_API}{recurso}/', {'limit': cls.POR_PAGINA, **parametros})
+            for recurso, parametros in (
+                ('exerciseimage', {}),
+                ('exercisecategory', {}),
+                ('muscle', {}),
+                ('equipment', {}),
+                ('exercise', {'language': cls.IDIOMA}),
+            )
+        })
+
+    @classmethod
+    def sincronizar(cls, descargador=None):
+        """Descarga el catálogo y lo guarda. Lanza requests.RequestException si wger falla"""
+        descargador = descargador or Descargador()
+        descargador.cache = PaginaWger.guardadas()
+        listados = cls.descargar(descargador)
+        imagenes = listados['exerciseimage']
+        categorias = {cat['id']: cat['name'] for cat in listados['exercisecategory']}
+        musculos = {musc['id']: musc['name'] for musc in listados['muscle']}
+        equipos = {equip['id']: equip['name'] for equip in listados['equipment']}
+        ejercicios = listados['exercise']
+
+        fusionados, origen = fusionar(ejercicios, categorias, musculos, equipos, imagen_principal(imagenes))
+
+        # Las categorías que wger no devuelve pero tienen respaldo se guardan con el nombre en español
+        for ejercicio in fusionados:
+            categoria_id = ejercicio['categoria_id']
+            if categoria_id is not None and categoria_id not in categorias:
+                categorias[categoria_id] = CATEGORIAS_RESPALDO[categoria_id]['nombre']
+
+        anadidos, cambiados, eliminados = cls._guardar(categorias, musculos, equipos, fusionados, imagenes,
+                                                       descargador)
+        resultado = ResultadoSincronizacion(
+            ejercicios=len(fusionados),
+            categorias=len(categorias),
+            musculos=len(musculos),
+            equipos=len(equipos),
+            imagenes=len(imagenes),
+            paginas=descargador.paginas,
+            paginas_por_segundo=descargador.paginas_por_segundo,
+            no_modificadas=descargador.no_modificadas,
+            anadidos=anadidos,
+            cambiados=cambiados,
+            eliminados=eliminados,
+            origen=origen,
+        )
+        logger.info(
+            f'🏋️ Catálogo wger sincronizado: {resultado.ejercicios} ejercicios '
+            f'({resultado.anadidos} añadidos, {resultado.cambiados} cambiados, {resultado.eliminados} eliminados), '
+            f'{resultado.imagenes} imágenes ({resultado.paginas} páginas, {resultado.no_modificadas} sin cambios, '
+            f'{resultado.paginas_por_segundo:.1f} páginas/s)'
+        )
+        return resultado
+
+    @staticmethod
+    def _aplicar_cambios(modelo, objetos, comparar, campos=None):
+        """
+        Deja la tabla igual que `objetos` escribiendo solo las diferencias: crea
+        los ids nuevos, actualiza (`campos`) aquellos cuyos valores de `comparar`
+        no coinciden con los guardados y borra lo que ya no está en wger.
+        Devuelve (ids creados, ids actualizados, ids borrados).
+        """
+        actuales = {fila[0]: fila[1:] for fila in modelo.objects.values_list('id', *comparar).iterator()}
+        nuevos, cambiados = [], []
+        for objeto in objetos:
+            if objeto.pk not in actuales:
+                nuevos.append(objeto)
+            elif actuales[objeto.pk] != tuple(getattr(objeto, campo) for campo in comparar):
+                cambiados.append(objeto)
+        eliminados = actuales.keys() - {objeto.pk for objeto in objetos}
+
+        if nuevos:
+            modelo.objects.bulk_create(nuevos, batch_size=500)
+        if cambiados:
+            modelo.objects.bulk_update(cambiados, campos or comparar, batch_size=500)
+        if eliminados:
+            modelo.objects.filter(pk__in=eliminados).delete()
+        return {objeto.pk for objeto in nuevos}, {objeto.pk for objeto in cambiados}, eliminados
+
+    @classmethod
+    def _guardar(cls, categorias, musculos, equipos, ejercicios, imagenes, descargador):
+        with transaction.atomic():
+            cls._aplicar_cambios(CategoriaEjercicio, [
+                CategoriaEjercicio(id=i, nombre=n[:100]) for i, n in categorias.items()
+            ], ['nombre'])
+            cls._aplicar_cambios(Musculo, [Musculo(id=i, nombre=n[:100]) for i, n in musculos.items()], ['nombre'])
+            cls._aplicar_cambios(Equipamiento, [
+                Equipamiento(id=i, nombre=n[:100]) for i, n in equipos.items()
+            ], ['nombre'])
+
+            # bulk_update no pasa por auto_now: la fecha de sincronización se pone a mano
+            ahora = timezone.now()
+            campos = ['exercise_base', 'nombre', 'descripcion', 'categoria_id', 'imagen', 'imagen_respaldo']
+            anadidos, cambiados, eliminados = cls._aplicar_cambios(Ejercicio, [
+                Ejercicio(huella=huella(ejercicio), sincronizado=ahora,
+                          **{campo: ejercicio[campo] for campo in ['id'] + campos})
+                for ejercicio in ejercicios
+            ], ['huella'], campos + ['huella', 'sincronizado'])
+
+            # Relaciones M2M: se rehacen solo las de los ejercicios nuevos o cambiados
+            # (las de los borrados se van en cascada)
+            escritos = anadidos | cambiados
+            reescribir = [ejercicio for ejercicio in ejercicios if ejercicio['id'] in escritos]
+            for relacion, columna in ((Ejercicio.musculos, 'musculo_id'), (Ejercicio.equipamiento, 'equipamiento_id')):
+                tabla = relacion.through
+                if cambiados:
+                    tabla.objects.filter(ejercicio_id__in=cambiados).delete()
+                if not reescribir:
+                    continue
+                tabla.objects.bulk_create([
+                    tabla(ejercicio_id=ejercicio['id'], **{columna: relacionado})
+                    for ejercicio in reescribir
+                    for relacionado in dict.fromkeys(ejercicio[relacion.field.name])
+                ], batch_size=1000)
+
+            # Si cambia una imagen se vacía su huella: espejar_imagenes la volverá a copiar
+            cls._aplicar_cambios(ImagenEjercicio, [
+                ImagenEjercicio(id=img['id'], exercise_base=img['exercise_base'], url=img['image'],
+                                es_principal=bool(img.get('is_main')))
+                for img in imagenes if img.get('exercise_base') and img.get('image')
+            ], ['exercise_base', 'url', 'es_principal'], ['exercise_base', 'url', 'es_principal', 'huella'])
+
+            cls._guardar_paginas(descargador)
+            # Índices de la búsqueda de rutinas (solo se reescriben si algo ha cambiado)
+            BuscadorEjercicios.construir()
+        return len(anadidos), len(cambiados), len(eliminados)
+
+    @staticmethod
+    def _guardar_paginas(descargador):
+        """Guarda los validadores de las páginas nuevas o cambiadas y olvida las que ya no se piden"""
+        guardadas = descargador.cache
+        for url, (etag, ultima_modificacion, datos) in descargador.respuestas.items():
+            if guardadas.get(url) != (etag, ultima_modificacion, datos):
+                PaginaWger.objects.update_or_create(url=url, defaults={
+                    'etag': etag, 'ultima_modificacion': ultima_modificacion, 'datos': datos,
+                })
+        sobrantes = guardadas.keys() - descargador.respuestas.keys()
+        if sobrantes:
+            PaginaWger.objects.filter(url__in=sobrantes).delete()
+
+    # ===== COPIA LOCAL DE LAS IMÁGENES =====
+    @classmethod
+    def espejar_imagenes(cls, descargador=None, procesos=None):
+        """
+        Copia a MEDIA_ROOT las imágenes de wger que usan los ejercicios, en WebP
+        (completa y miniaturas, ver miniaturas.py). Las que ya tienen copia se
+        saltan sin descargarlas; de las demás se calcula la huella del fichero
+        y solo se procesan las que no estaban ya en disco con ese contenido.
+        Las descargas van en hilos y el redimensionado en un ProcessPoolExecutor
+        (Pillow es CPU puro). Una imagen que falla se queda con la URL de wger.
+        """
+        descargador = descargador or Descargador()
+        raiz = Path(settings.MEDIA_ROOT)
+        usadas = Ejercicio.objects.filter(imagen_respaldo=False).values('imagen')
+        imagenes = list(ImagenEjercicio.objects.filter(url__in=usadas).only('id', 'url', 'huella'))
+        pendientes = [img for img in imagenes if not (img.huella and miniaturas.existen(raiz, img.huella))]
+        resultado = ResultadoEspejo(imagenes=len(imagenes))
+        if not pendientes:
+            return resultado
+
+        por_huella = defaultdict(list)
+        trabajos = {}
+        hilos = ThreadPoolExecutor(max_workers=descargador.hilos, thread_name_prefix='wger')
+        pool = None
+        try:
+            descargas = {hilos.submit(descargador.contenido, img.url): img for img in pendientes}
+            for futuro in as_completed(descargas):
+                img = descargas[futuro]
+                try:
+                    contenido = futuro.result()
+                except requests.RequestException as error:
+                    logger.warning(f'⚠️ No se pudo descargar {img.url}: {error}')
+                    img.huella = ''
+                    resultado.fallidas += 1
+                    continue
+                resultado.descargadas += 1
+                img.huella = miniaturas.huella(contenido)
+                por_huella[img.huella].append(img)
+                if img.huella in trabajos or miniaturas.existen(raiz, img.huella):
+                    continue
+                if pool is None:
+                    # spawn y no fork: el servidor puede tener hilos en marcha
+                    pool = ProcessPoolExecutor(max_workers=procesos, mp_context=get_context('spawn'))
+                trabajos[img.huella] = pool.submit(miniaturas.generar, contenido, raiz, img.huella)
+
+            for huella_imagen, futuro in trabajos.items():
+                try:
+                    futuro.result()
+                    resultado.generadas += 1
+                except Exception as error:
+                    logger.warning(f'⚠️ No se pudo convertir {por_huella[huella_imagen][0].url}: {error}')
+                    for img in por_huella[huella_imagen]:
+                        img.huella = ''
+                    resultado.fallidas += len(por_huella[huella_imagen])
+        finally:
+            hilos.shutdown(cancel_futures=True)
+            if pool:
+                pool.shutdown(cancel_futures=True)
+
+        ImagenEjercicio.objects.bulk_update(pendientes, ['huella'], batch_size=500)
+        logger.info(
+            f'🖼️ Imágenes de ejercicios: {resultado.imagenes} en el catálogo, {resultado.descargadas} descargadas, '
+            f'{resultado.generadas} convertidas, {resultado.fallidas} con error'
+        )
+        return resultado
@@ -171,3 +171,23 @@ SPECTACULAR_SETTINGS = {
     'DESCRIPTION': 'Documentación de la API de TrainUp Gym',
     'VERSION': '1.0.0',
 }
+
+# Importe por defecto de las cuotas periódicas (manage.py emitir_cuotas)
+CUOTA_MENSUAL_IMPORTE = config('CUOTA_MENSUAL_IMPORTE', default='40.00')
+
+# Tareas diarias (marcar_vencidos, generar_sesiones) en un hilo del proceso web (arranca en wsgi.py).
+# Alternativa: cron diario con manage.py marcar_vencidos y manage.py generar_sesiones
+PROGRAMAR_TAREAS = config('PROGRAMAR_TAREAS', default=False, cast=bool)
+
+# Descarga de facturas: con nginx delante, Django solo responde con X-Accel-Redirect
+# a la location interna de nginx.conf y nginx envía el PDF guardado en MEDIA_ROOT/facturas
+FACTURAS_X_ACCEL = config('FACTURAS_X_ACCEL', default=False, cast=bool)
+FACTURAS_X_ACCEL_PREFIJO = '/facturas-internas/'
+# Procesos para renderizar facturas en la exportación en bloque (0 = uno por CPU)
+FACTURAS_PROCESOS = config('FACTURAS_PROCESOS', default=0, cast=int)
+
+# Segundos que se reutilizan en memoria las estadísticas del panel de administración
+ESTADISTICAS_TTL = config('ESTADISTICAS_TTL', default=60, cast=int)
+
+# Procesos para convertir a WebP las imágenes de ejercicios en sync_wger (0 = uno por CPU)
+IMAGENES_PROCESOS = config('IMAGENES_PROCESOS', default=0, cast=int)
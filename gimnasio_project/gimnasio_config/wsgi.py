@@ -14,3 +14,13 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gimnasio_config.settings')
 
 application = get_wsgi_application()
+
+# Programador de tareas diarias (desactivado por defecto). Se arranca aquí y no en
+# AppConfig.ready para que solo corra en los procesos que sirven peticiones (gunicorn,
+# el hijo de runserver) y no en migrate, test, shell u otros comandos.
+from django.conf import settings  # noqa: E402
+
+if settings.PROGRAMAR_TAREAS:
+    from gimnasio import tareas  # noqa: E402
+
+    tareas.iniciar_programador()